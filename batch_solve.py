@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import maze_format
+from maze_core import build_open_masks, solve_bfs, solve_turn_aware, generate_commands, compress_commands
+
+"""
+BATCH SOLVER (Headless)
+แก้ maze ทีละหลายพันไฟล์แบบขนาน ไม่มี pygame / MQTT -> ใช้ทำ Regression Test ของ Route Planning
+
+รับ: โฟลเดอร์ที่มีไฟล์ .mzb (และ/หรือ โฟลเดอร์ย่อยที่มี horizontal_walls.csv + vertical_walls.csv)
+ส่งออก: JSON lines ทีละบรรทัดตามที่แก้เสร็จ (path length, จำนวนคำสั่ง, เวลาที่ใช้)
+
+ตัวอย่าง:
+    python batch_solve.py corpus/ --route 0,0:-1,-1:S --route 0,-1:-1,0:E --jobs 8 --solver fastest
+    (ค่าติดลบ = นับจากขอบขวา/ล่าง เช่น -1 = ช่องสุดท้าย)
+"""
+
+DIR_NAMES = {"N": 0, "E": 1, "S": 2, "W": 3}
+DEFAULT_ROUTE = "0,0:-1,-1:S"
+
+# --- 1. Input ---
+
+def find_mazes(folder):
+    """ หาไฟล์ .mzb และโฟลเดอร์ที่มี CSV ครบ (เรียงชื่อเพื่อให้ผลซ้ำได้) """
+    found = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(".mzb"): found.append(os.path.join(root, name))
+        if maze_format.FILE_H_WALLS in files and maze_format.FILE_V_WALLS in files:
+            found.append(root)
+    return found
+
+def load_walls(source):
+    """ .mzb หรือ โฟลเดอร์ CSV -> (h_walls, v_walls) """
+    if os.path.isdir(source):
+        return (maze_format.read_csv(os.path.join(source, maze_format.FILE_H_WALLS)),
+                maze_format.read_csv(os.path.join(source, maze_format.FILE_V_WALLS)))
+    _, h_walls, v_walls = maze_format.load_maze_bin(source)
+    return h_walls, v_walls
+
+def parse_route(spec):
+    """ "x1,y1:x2,y2:DIR" -> ((x1, y1), (x2, y2), dir) """
+    start, end, heading = spec.split(":")
+    sx, sy = (int(v) for v in start.split(","))
+    ex, ey = (int(v) for v in end.split(","))
+    return (sx, sy), (ex, ey), DIR_NAMES[heading.upper()]
+
+def _resolve(cell, width, height):
+    x, y = cell
+    return (x + width if x < 0 else x, y + height if y < 0 else y)
+
+# --- 2. Worker (รันใน process แยก) ---
+
+def solve_file(source, routes, solver="bfs", compress=False):
+    results = []
+    t0 = time.perf_counter()
+    try:
+        h_walls, v_walls = load_walls(source)
+    except Exception as e:
+        return [{"file": source, "ok": False, "error": str(e)}]
+    width, height = len(h_walls[0]), len(v_walls)
+    masks = build_open_masks(h_walls, v_walls)
+    load_ms = (time.perf_counter() - t0) * 1000
+
+    for start, end, heading in routes:
+        start = _resolve(start, width, height)
+        end = _resolve(end, width, height)
+        t1 = time.perf_counter()
+        if solver == "fastest":
+            path, commands = solve_turn_aware(start, heading, end, h_walls, v_walls, masks)
+        else:
+            path = solve_bfs(start, end, h_walls, v_walls, masks)
+            commands = generate_commands(path, heading)
+        if compress: commands = compress_commands(commands)
+        solve_ms = (time.perf_counter() - t1) * 1000
+        results.append({
+            "file": source, "width": width, "height": height,
+            "start": list(start), "end": list(end), "dir": "NESW"[heading], "solver": solver,
+            "ok": bool(path), "path_len": len(path), "commands": len(commands),
+            "load_ms": round(load_ms, 3), "solve_ms": round(solve_ms, 3),
+        })
+    return results
+
+# --- 3. Main ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless batch maze solver (JSON lines output)")
+    parser.add_argument("folder", help="folder with .mzb files / CSV maze folders")
+    parser.add_argument("--route", action="append", help=f"start:end:dir, e.g. {DEFAULT_ROUTE} (repeatable)")
+    parser.add_argument("--solver", choices=["bfs", "fastest"], default="bfs")
+    parser.add_argument("--compress", action="store_true", help="merge FORWARD runs / strafes")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--out", help="write JSON lines here instead of stdout")
+    args = parser.parse_args(argv)
+
+    routes = [parse_route(spec) for spec in (args.route or [DEFAULT_ROUTE])]
+    mazes = find_mazes(args.folder)
+    if not mazes:
+        print(f"!!! No maze files in '{args.folder}'", file=sys.stderr)
+        return 1
+
+    out = open(args.out, "w") if args.out else sys.stdout
+    failed = 0
+    t0 = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            futures = [pool.submit(solve_file, m, routes, args.solver, args.compress) for m in mazes]
+            for future in as_completed(futures):
+                for row in future.result():
+                    if not row["ok"]: failed += 1
+                    out.write(json.dumps(row) + "\n")
+                out.flush()
+    finally:
+        if args.out: out.close()
+    print(f">>> {len(mazes)} mazes x {len(routes)} routes in {time.perf_counter() - t0:.2f}s "
+          f"({failed} unsolved)", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,360 @@
+import argparse
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+from maze_core import (build_open_masks, is_move_valid, solve_bfs, solve_bfs_legacy, solve_turn_aware,
+                       generate_commands, compress_commands, RouteCache)
+from maze_planner import DStarLite, flood_fill
+
+try:
+    import maze_model # ต้องมี numpy
+    import genmap     # maze แบบ perfect / braided
+except ImportError:
+    maze_model = genmap = None
+
+"""
+BENCHMARK: ทุก solver entry point บน maze ที่สร้างจาก seed (ผลซ้ำได้ทุกครั้ง)
+
+Corpus:
+- sparse  : กำแพงสุ่ม WALL_DENSITY (ทางเปิดเยอะ)
+- perfect : genmap backtracker (ทางเดียว ยาว คดเคี้ยว = กรณีแย่สุดของ BFS)
+- braided : genmap braided (มี loop หลายเส้นทาง)
+แต่ละ case วัด: เวลา (median ของ --repeat, ms) | node ที่ถูกขยาย | peak memory (tracemalloc, รันแยก) | ความยาว path | จำนวนคำสั่ง
+route = (0,0) -> มุมขวาล่าง หันหน้า S (แบบ batch_solve)
+
+Baseline:
+    python bench_solver.py --save bench_baseline.json             (เก็บผลไว้เทียบ)
+    python bench_solver.py --check bench_baseline.json            (exit 1 ถ้า expanded เพิ่ม, path / จำนวนคำสั่งเปลี่ยน
+                                                                    หรือเวลา / memory เกิน --fail-tolerance
+                                                                    เกิน --warn-tolerance = แค่เตือน)
+    python bench_solver.py 64 128 256 --case bfs --corpus perfect (เลือกขนาด / case / corpus)
+เวลาขึ้นกับเครื่องและภาระของเครื่องตอนรัน -> ทุกครั้งวัด loop อ้างอิง (calibrate) ด้วย แล้วปรับเวลาของ baseline
+ตามอัตราส่วน ก่อนเทียบ (เครื่องช้าลงทั้งเครื่อง 30% ไม่นับเป็น regression)
+"""
+
+DEFAULT_SIZES = [8, 16, 32, 64, 128, 256, 512, 1024]
+CORPORA = ("sparse", "perfect", "braided")
+WALL_DENSITY = 0.25   # โอกาสที่กำแพงด้านในจะถูกสร้าง (sparse)
+SEED = 2025
+HEADING = 2           # S
+REPEAT = 5            # median ของกี่รอบ
+WARN_TOLERANCE = 0.5  # ช้าลง / memory เพิ่ม เกิน 50% (หลังปรับด้วย calibration) = เตือน (ระดับ noise ของเครื่อง)
+FAIL_TOLERANCE = 2.0  # เกิน 3 เท่า = regression (exit 1) เช่น list.pop(0) ในคิว / copy ทั้ง array ทุก node
+CALIBRATION_SIZE = 96 # grid ของ loop อ้างอิง (~ms ต่อรอบ)
+MIN_DELTA_MS = 0.05   # ต่างกันน้อยกว่านี้ = noise ของ timer
+MIN_DELTA_KB = 16
+MAX_CASE_S = 2.0      # case ที่ช้ามาก ไม่ต้องรันซ้ำครบ --repeat
+MIN_BATCH_S = 0.05    # case ที่เร็วมาก -> วนหลายรอบต่อ 1 การวัด (แบบ timeit.autorange) ลด noise ของ timer
+MEMORY_MAX_SIZE = 256 # tracemalloc ทำให้ช้าลง 10-30 เท่า -> วัด peak memory ถึงขนาดนี้ (ใหญ่กว่านี้ memory โตตาม N)
+
+# case ที่โตเร็วกว่า O(N) -> จำกัดขนาด (ขนาดที่เกินแสดงเป็น skip)
+SIZE_LIMITS = {"bfs_legacy": 128, "frontier": 256, "is_move_valid": 512, "dstar": 512}
+
+def make_random_maze(width, height, density=WALL_DENSITY, seed=SEED):
+    """ สร้างกำแพงแบบสุ่ม (มีขอบรอบนอก) ในรูปแบบเดียวกับไฟล์ CSV """
+    rng = random.Random(seed)
+    h_walls = [[1 if rng.random() < density else 2 for _ in range(width)] for _ in range(height + 1)]
+    v_walls = [[1 if rng.random() < density else 2 for _ in range(width + 1)] for _ in range(height)]
+    for x in range(width):
+        h_walls[0][x] = 1; h_walls[height][x] = 1
+    for y in range(height):
+        v_walls[y][0] = 1; v_walls[y][width] = 1
+    return h_walls, v_walls
+
+def make_maze(corpus, size, seed=SEED):
+    """ corpus + ขนาด + seed -> (h_walls, v_walls) เป็น list แบบที่ load_csv ให้ """
+    if corpus == "sparse": return make_random_maze(size, size, seed=seed)
+    if genmap is None: raise RuntimeError(f"corpus '{corpus}' needs numpy")
+    h_walls, v_walls = genmap.generate_maze(size, size, "backtracker" if corpus == "perfect" else "braided", seed)
+    return h_walls.tolist(), v_walls.tolist()
+
+# --- 1. Cases ---
+# แต่ละ case: fn(m) -> (path, commands, expanded) ; m = dict ของ maze + ของที่สร้างไว้ก่อน (masks, path อ้างอิง)
+
+def _case_masks(m):
+    build_open_masks(m["h_walls"], m["v_walls"])
+    return None, None, m["width"] * m["height"]
+
+def _case_is_move_valid(m):
+    h_walls, v_walls, calls = m["h_walls"], m["v_walls"], 0
+    for y in range(m["height"]):
+        for x in range(m["width"]):
+            for nx, ny in ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)):
+                is_move_valid(x, y, nx, ny, h_walls, v_walls)
+                calls += 1
+    return None, None, calls
+
+def _case_bfs(m):
+    stats = {}
+    path = solve_bfs(m["start"], m["end"], m["h_walls"], m["v_walls"], m["masks"], stats=stats)
+    return path, None, stats["expanded"]
+
+def _case_bfs_legacy(m):
+    stats = {}
+    path = solve_bfs_legacy(m["start"], m["end"], m["h_walls"], m["v_walls"], stats=stats)
+    return path, None, stats["expanded"]
+
+def _case_turn_aware(m):
+    stats = {}
+    path, commands = solve_turn_aware(m["start"], HEADING, m["end"], m["h_walls"], m["v_walls"], m["masks"], stats=stats)
+    return path, commands, stats["expanded"]
+
+def _case_route_cache(m):
+    cache = RouteCache(m["h_walls"], m["v_walls"], m["masks"])
+    path = cache.route(m["start"], m["end"])
+    return path, None, sum(1 for d in cache.distances(m["start"]) if d >= 0) * len(cache.trees)
+
+def _case_frontier(m):
+    path = maze_model.frontier_path(m["np_masks"], m["start"], m["end"])
+    return path, None, None
+
+def _case_flood_fill(m):
+    dist = flood_fill(m["masks"], m["width"], m["height"], [m["end"]])
+    return None, None, sum(1 for d in dist if d >= 0)
+
+def _case_dstar(m):
+    planner = DStarLite(m["masks"], m["width"], m["height"], m["start"], m["end"])
+    planner.compute()
+    return planner.path(), None, planner.expanded
+
+def _case_commands(m):
+    return None, generate_commands(m["path"], HEADING), len(m["path"])
+
+def _case_compress(m):
+    return None, compress_commands(m["commands"]), len(m["commands"])
+
+CASES = {
+    "masks": _case_masks,
+    "is_move_valid": _case_is_move_valid,
+    "bfs": _case_bfs,
+    "bfs_legacy": _case_bfs_legacy,
+    "turn_aware": _case_turn_aware,
+    "route_cache": _case_route_cache,
+    "frontier": _case_frontier,
+    "flood_fill": _case_flood_fill,
+    "dstar": _case_dstar,
+    "commands": _case_commands,
+    "compress": _case_compress,
+}
+
+# --- 2. Measure ---
+
+def time_case(fn, m, repeat):
+    """ median ของ repeat รอบ (ms ต่อ 1 ครั้ง, ปิด gc ระหว่างจับเวลาแบบ timeit) คืนค่า (ms, ผล) """
+    gc.collect()
+    gc.disable()
+    try:
+        t0 = time.perf_counter()
+        result = fn(m)
+        first = spent = time.perf_counter() - t0
+        loops = max(1, int(MIN_BATCH_S / first)) if first > 0 else 1
+        samples = [] if loops > 1 else [first] # วนหลายรอบ -> รอบแรกเป็น warm-up
+        while len(samples) < repeat and spent <= MAX_CASE_S:
+            t0 = time.perf_counter()
+            for _ in range(loops): fn(m)
+            elapsed = time.perf_counter() - t0
+            samples.append(elapsed / loops)
+            spent += elapsed
+    finally:
+        gc.enable()
+    return statistics.median(samples) * 1000, result
+
+def _calibration_loop(m):
+    """ BFS แบบ pure Python บน grid โล่ง (ไม่เรียก code ของ repo -> เวลาเปลี่ยนตามเครื่องเท่านั้น ไม่ใช่ตาม solver) """
+    size = m["size"]
+    dist = [-1] * (size * size)
+    dist[0] = 0
+    queue = deque([0])
+    while queue:
+        i = queue.popleft()
+        x, y = i % size, i // size
+        for nx, ny in ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)):
+            if 0 <= nx < size and 0 <= ny < size and dist[ny * size + nx] < 0:
+                dist[ny * size + nx] = dist[i] + 1
+                queue.append(ny * size + nx)
+    return None, None, size * size
+
+def calibrate(repeat=REPEAT):
+    """ เวลา (ms) ของ loop อ้างอิง -> อัตราส่วนกับค่าใน baseline = เครื่องตอนนี้เร็ว / ช้ากว่าตอนสร้าง baseline เท่าไร """
+    ms, _ = time_case(_calibration_loop, {"size": CALIBRATION_SIZE}, repeat)
+    return ms
+
+def peak_memory(fn, m):
+    """ peak (KB) ที่ case จองเพิ่มระหว่างรัน (รันแยกจากการจับเวลา เพราะ tracemalloc ทำให้ช้าลง) """
+    gc.collect()
+    gc.disable()
+    tracemalloc.start()
+    try:
+        fn(m)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        gc.enable()
+    return peak / 1024
+
+def prepare(corpus, size, seed):
+    """ maze + masks + path อ้างอิง (สร้างนอกการจับเวลา) """
+    h_walls, v_walls = make_maze(corpus, size, seed)
+    masks = build_open_masks(h_walls, v_walls)
+    m = {"h_walls": h_walls, "v_walls": v_walls, "width": size, "height": size, "masks": masks,
+         "start": (0, 0), "end": (size - 1, size - 1)}
+    m["path"] = solve_bfs(m["start"], m["end"], h_walls, v_walls, masks)
+    m["commands"] = generate_commands(m["path"], HEADING)
+    if maze_model is not None:
+        m["np_masks"] = maze_model.open_masks(maze_model.from_lists(h_walls), maze_model.from_lists(v_walls))
+    return m
+
+def run_suite(sizes, corpora, cases, repeat=REPEAT, seed=SEED, memory_max=MEMORY_MAX_SIZE, progress=None):
+    """ คืนค่า dict "corpus/size/case" -> ผล (เรียงตามลำดับที่รัน) """
+    results = {}
+    for corpus in corpora:
+        for size in sizes:
+            m = prepare(corpus, size, seed)
+            for name in cases:
+                if size > SIZE_LIMITS.get(name, size): continue
+                if name == "frontier" and maze_model is None: continue
+                fn = CASES[name]
+                ms, (path, commands, expanded) = time_case(fn, m, repeat)
+                row = {"corpus": corpus, "size": size, "case": name, "ms": round(ms, 4), "expanded": expanded,
+                       "peak_kb": round(peak_memory(fn, m), 1) if size <= memory_max else None,
+                       "path": len(path) if path is not None else None,
+                       "commands": len(commands) if commands is not None else None}
+                results[f"{corpus}/{size}/{name}"] = row
+                if progress: progress(row)
+    return results
+
+# --- 3. Baseline / Regression ---
+
+def machine_info():
+    return {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine(),
+            "processor": platform.processor()}
+
+def save_baseline(filename, results, seed, calibration_ms=None):
+    with open(filename, "w") as f:
+        json.dump({"created": time.time(), "seed": seed, "machine": machine_info(), "calibration_ms": calibration_ms,
+                   "results": results}, f, indent=1)
+
+def load_baseline(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+def time_scale(baseline, calibration_ms):
+    """ เวลา baseline x scale = เวลาที่ควรได้บนเครื่อง (และภาระ) ตอนนี้ (baseline เก่าที่ไม่มี calibration -> 1) """
+    base_ms = baseline.get("calibration_ms")
+    return calibration_ms / base_ms if base_ms and calibration_ms else 1.0
+
+def _slower(row, base, tolerance, scale=1.0):
+    expected = base["ms"] * scale
+    return row["ms"] > expected * (1 + tolerance) and row["ms"] - expected > MIN_DELTA_MS
+
+def _bigger(row, base, tolerance):
+    if row["peak_kb"] is None or base.get("peak_kb") is None: return False
+    return row["peak_kb"] > base["peak_kb"] * (1 + tolerance) and row["peak_kb"] - base["peak_kb"] > MIN_DELTA_KB
+
+def retime_slow(results, baseline, tolerance=WARN_TOLERANCE, repeat=REPEAT, seed=SEED, rounds=2, scale=1.0):
+    """ case ที่ช้ากว่า baseline -> จับเวลาซ้ำ (เก็บค่าดีสุด) ก่อนเตือน กันเครื่องกระตุกชั่วคราว """
+    mazes = {}
+    for _ in range(rounds):
+        slow = [key for key, row in results.items()
+                if key in baseline["results"] and _slower(row, baseline["results"][key], tolerance, scale)]
+        for key in slow:
+            row = results[key]
+            maze_key = (row["corpus"], row["size"])
+            if maze_key not in mazes: mazes[maze_key] = prepare(row["corpus"], row["size"], seed)
+            ms, _ = time_case(CASES[row["case"]], mazes[maze_key], repeat)
+            row["ms"] = round(min(row["ms"], ms), 4)
+
+def compare(results, baseline, warn_tolerance=WARN_TOLERANCE, fail_tolerance=FAIL_TOLERANCE, scale=1.0):
+    """
+    คืนค่า (problems, warnings)
+    problems : expanded เพิ่ม, path / จำนวนคำสั่งเปลี่ยน (seed เดิม = ต้องเหมือนเดิม)
+               หรือเวลา (หลังคูณ scale ของ calibration) / peak memory เกิน fail_tolerance
+    warnings : เวลา / peak memory เกิน warn_tolerance แต่ไม่ถึง fail_tolerance (อาจเป็น noise ของเครื่อง)
+    ทั้ง 2 ระดับนับเฉพาะเมื่อต่างเกิน MIN_DELTA_MS / MIN_DELTA_KB
+    """
+    problems, warnings = [], []
+    for key, row in results.items():
+        base = baseline["results"].get(key)
+        if base is None: continue
+        if _slower(row, base, warn_tolerance, scale):
+            expected = base["ms"] * scale
+            target = problems if _slower(row, base, fail_tolerance, scale) else warnings
+            target.append(f"{key}: time {expected:.3f} -> {row['ms']:.3f} ms (+{(row['ms'] / expected - 1) * 100:.0f}%)")
+        if _bigger(row, base, warn_tolerance):
+            target = problems if _bigger(row, base, fail_tolerance) else warnings
+            target.append(f"{key}: peak memory {base['peak_kb']:.1f} -> {row['peak_kb']:.1f} KB")
+        if row["expanded"] is not None and base.get("expanded") is not None and row["expanded"] > base["expanded"]:
+            problems.append(f"{key}: expanded {base['expanded']} -> {row['expanded']}")
+        for field in ("path", "commands"): # corpus เดิม -> ผลต้องเหมือนเดิมเป๊ะ
+            if row[field] != base.get(field):
+                problems.append(f"{key}: {field} changed {base.get(field)} -> {row[field]}")
+    return problems, warnings
+
+# --- 4. Main ---
+
+def _fmt(value, spec):
+    return "-" if value is None else format(value, spec)
+
+def print_row(row):
+    print(f"{row['corpus']:>8} | {row['size']:>4}x{row['size']:<4} | {row['case']:>13} | {row['ms']:>10.3f} | "
+          f"{_fmt(row['expanded'], 'd'):>9} | {_fmt(row['peak_kb'], '.1f'):>10} | {_fmt(row['path'], 'd'):>7} | "
+          f"{_fmt(row['commands'], 'd'):>8}", flush=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solver benchmark on seeded maze corpora")
+    parser.add_argument("sizes", nargs="*", type=int, help=f"maze sizes (default: {' '.join(map(str, DEFAULT_SIZES))})")
+    parser.add_argument("--corpus", action="append", choices=CORPORA, help="repeatable (default: all)")
+    parser.add_argument("--case", action="append", choices=list(CASES), help="repeatable (default: all)")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="median of N runs")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--memory-max", type=int, default=MEMORY_MAX_SIZE, help="largest size measured with tracemalloc (0 = off)")
+    parser.add_argument("--save", metavar="FILE", help="write results as a JSON baseline")
+    parser.add_argument("--check", metavar="FILE", help="compare against a baseline, exit 1 on regression")
+    parser.add_argument("--warn-tolerance", "--tolerance", type=float, default=WARN_TOLERANCE,
+                        help="slowdown / memory growth before a warning, after calibration (0.5 = 50%%)")
+    parser.add_argument("--fail-tolerance", type=float, default=FAIL_TOLERANCE,
+                        help="slowdown / memory growth that fails --check, after calibration (2.0 = 3x)")
+    args = parser.parse_args(argv)
+
+    corpora = args.corpus or [c for c in CORPORA if c == "sparse" or genmap is not None]
+    baseline = load_baseline(args.check) if args.check else None
+    if baseline and baseline.get("seed") != args.seed:
+        print(f"!!! Baseline seed {baseline.get('seed')} != {args.seed}", file=sys.stderr)
+    if baseline and baseline.get("machine") != machine_info():
+        print("!!! Baseline was recorded on a different machine / Python -> timings may not compare", file=sys.stderr)
+    calibration_ms = calibrate(args.repeat)
+
+    print(f"{'corpus':>8} | {'size':>9} | {'case':>13} | {'time (ms)':>10} | {'expanded':>9} | {'peak (KB)':>10} | {'path':>7} | {'commands':>8}")
+    print("-" * 96)
+    results = run_suite(args.sizes or DEFAULT_SIZES, corpora, args.case or list(CASES),
+                        args.repeat, args.seed, args.memory_max, print_row)
+    # วัด calibration อีกครั้งหลังรันทั้งชุด (เครื่องอาจเปลี่ยนความเร็วระหว่างทาง) แล้วใช้ค่าเฉลี่ย
+    calibration_ms = 0.5 * (calibration_ms + calibrate(args.repeat))
+
+    if args.save:
+        save_baseline(args.save, results, args.seed, calibration_ms)
+        print(f">>> Baseline saved: {args.save} ({len(results)} cases)", file=sys.stderr)
+    if baseline:
+        scale = time_scale(baseline, calibration_ms)
+        if baseline.get("calibration_ms"):
+            print(f">>> Calibration {calibration_ms:.3f} ms (baseline {baseline['calibration_ms']:.3f} ms) "
+                  f"-> baseline times x{scale:.2f}", file=sys.stderr)
+        retime_slow(results, baseline, args.warn_tolerance, args.repeat, args.seed, scale=scale)
+        problems, warnings = compare(results, baseline, args.warn_tolerance, args.fail_tolerance, scale)
+        missing = len(set(results) - set(baseline["results"]))
+        for line in warnings: print(f"??? SLOWER {line}", file=sys.stderr)
+        for line in problems: print(f"!!! REGRESSION {line}", file=sys.stderr)
+        print(f">>> {len(results) - missing} cases checked against {args.check}, {len(problems)} regressions, "
+              f"{len(warnings)} timing / memory warnings" + (f", {missing} not in baseline" if missing else ""), file=sys.stderr)
+        if problems: return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
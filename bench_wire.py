@@ -0,0 +1,43 @@
+import sys
+import time
+
+import wire_format as wf
+
+"""
+BENCHMARK: wire_format JSON vs Binary (struct)
+วัด encode / decode ต่อวินาที และขนาด payload ของ lidar / yaw / aruco / command
+รัน: python bench_wire.py [จำนวนรอบ]
+"""
+
+DEFAULT_ROUNDS = 100000
+
+CASES = [
+    # (ชื่อ, encode(binary), decode)
+    ("lidar", lambda b: wf.encode_lidar(812.4, 301.7, 295.2, 2000.0, binary=b), wf.decode_lidar),
+    ("yaw", lambda b: wf.encode_yaw(91.25, binary=b), wf.decode_yaw),
+    ("aruco", lambda b: wf.encode_aruco(3.0, 5.0, binary=b), wf.decode_aruco),
+    ("command", lambda b: wf.encode_command(0.12, 0.6, target_yaw=90.0, binary=b), wf.decode_command),
+]
+
+def rate(fn, rounds):
+    t0 = time.perf_counter()
+    for _ in range(rounds): fn()
+    return rounds / (time.perf_counter() - t0)
+
+def main(rounds):
+    print(f"{'message':>8} | {'format':>6} | {'bytes':>5} | {'encode (k/s)':>12} | {'decode (k/s)':>12}")
+    print("-" * 56)
+    for name, encode, decode in CASES:
+        results = {}
+        for binary in (False, True):
+            payload = encode(binary)
+            if not binary: payload = payload.encode("utf-8") # MQTT ส่งเป็น bytes
+            enc = rate(lambda: encode(binary), rounds)
+            dec = rate(lambda: decode(payload), rounds)
+            results[binary] = dec
+            label = "binary" if binary else "json"
+            print(f"{name:>8} | {label:>6} | {len(payload):>5} | {enc / 1000:>12.0f} | {dec / 1000:>12.0f}")
+        print(f"{'':>8}   decode speedup x{results[True] / results[False]:.1f}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROUNDS)
@@ -0,0 +1,231 @@
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+"""
+SEQUENCED COMMAND QUEUE
+ส่งคำสั่ง solver ทั้งเส้นทางแบบมีหมายเลขลำดับ (seq) -> หุ่นไม่ต้องรอ round trip ของ broker ระหว่างคำสั่ง
+
+Protocol (JSON, ทาง TOPIC_COMMAND_SEQ / TOPIC_COMMAND_ACK):
+    solver -> robot : {"seq": 7, "cmd": "FORWARD:2"}
+                      {"cancel": 9, "next": 12, "stop": true}   ทิ้งทุกคำสั่ง seq >= 9 (stop = หยุดคำสั่งที่กำลังทำด้วย)
+                                                                  คำสั่งใหม่จะเริ่มที่ seq 12
+    robot -> solver : {"ack": 7, "done": 5, "free": 2}          ได้รับครบถึง seq 7, ทำเสร็จถึง seq 5, buffer ว่าง 2
+                      (+ "cancel": 9 เมื่อรับ cancel แล้ว)
+
+- seq เพิ่มขึ้นตลอด ไม่ใช้ซ้ำ (หลัง cancel ก็ข้ามไป) -> ack เก่าที่มาช้าไม่ทำให้สับสน
+- ฝั่งหุ่นรับเฉพาะ seq ที่รออยู่ (go-back-N) แล้ว ack แบบสะสม -> ส่งซ้ำ / ข้าม / สลับลำดับ ไม่ทำให้คำสั่งเบิ้ล
+- window = จำนวนคำสั่งที่ส่งแล้วแต่ยังทำไม่เสร็จ (ไม่เกิน buffer ของหุ่น)
+- ไม่มี ack ภายใน RETRY_TIMEOUT -> ส่งซ้ำตั้งแต่ตัวที่ยังไม่ ack (cancel ก็ส่งซ้ำจนกว่าจะได้ ack)
+
+ทดสอบ (ไม่ต้องมี broker, จำลอง packet หาย):
+    python command_queue.py --loss 0.3
+"""
+
+WINDOW = 4               # คำสั่งที่ค้างได้พร้อมกัน (= ขนาด buffer ของหุ่น)
+RETRY_TIMEOUT = 0.5      # (วินาที) ไม่มี ack -> ส่งซ้ำ
+
+def encode(data):
+    return json.dumps(data, separators=(",", ":"))
+
+def decode(payload):
+    if isinstance(payload, (bytes, bytearray)): payload = payload.decode("utf-8")
+    data = json.loads(payload)
+    if not isinstance(data, dict): raise ValueError("Command queue message must be a JSON object")
+    return data
+
+# --- 1. Solver Side ---
+
+class CommandStream:
+    """ ฝั่ง solver: publish(payload) ส่งออก, on_ack() จาก topic ack, poll() เรียกเป็นระยะเพื่อส่งซ้ำ """
+    def __init__(self, publish, window=WINDOW, timeout=RETRY_TIMEOUT):
+        self.publish = publish
+        self.window = window
+        self.timeout = timeout
+        self.lock = threading.Lock() # on_ack มาจาก thread ของ MQTT
+        self.next_seq = 1
+        self.queue = deque()         # (seq, cmd) รอ window ว่าง
+        self.sent = {}               # seq -> cmd ที่ส่งแล้ว ยังไม่เสร็จ
+        self.acked = 0               # หุ่นได้รับครบถึง seq นี้
+        self.done = 0                # หุ่นทำเสร็จถึง seq นี้
+        self.last_tx = 0.0           # เวลาที่ส่ง (หรือได้ ack ที่คืบหน้า) ล่าสุด -> จับ timeout
+        self.cancel_msg = None       # cancel ที่ยังไม่ได้ ack
+        self.fast_ack = None         # ack ที่ส่งซ้ำแบบเร็วไปแล้ว (ครั้งเดียวต่อค่า)
+        self.retransmits = 0
+
+    # --- คำสั่ง ---
+    def extend(self, commands, now=None):
+        """ ต่อท้ายคิว คืนค่า seq ของคำสั่งแรก """
+        with self.lock:
+            first = self.next_seq
+            for cmd in commands:
+                self.queue.append((self.next_seq, cmd))
+                self.next_seq += 1
+            self._fill(time.time() if now is None else now)
+            return first
+
+    def cancel(self, stop=True, now=None):
+        """ ทิ้งคำสั่งที่ค้างทั้งหมด (ทั้งในคิวและใน buffer ของหุ่น) -> หุ่นหยุดทันทีถ้า stop """
+        with self.lock:
+            if not self.sent and not self.queue: return
+            first = min(self.sent) if self.sent else self.next_seq
+            self.cancel_msg = {"cancel": first, "next": self.next_seq, "stop": stop}
+            self.queue.clear(); self.sent.clear()
+            self._send(self.cancel_msg, time.time() if now is None else now)
+
+    def replace(self, commands, now=None):
+        """ เปลี่ยนเส้นทาง: cancel ของเดิม แล้วส่งชุดใหม่ต่อ """
+        now = time.time() if now is None else now
+        self.cancel(stop=True, now=now)
+        return self.extend(commands, now)
+
+    # --- ack / ส่งซ้ำ ---
+    def on_ack(self, payload, now=None):
+        data = decode(payload)
+        now = time.time() if now is None else now
+        with self.lock:
+            if self.cancel_msg and data.get("cancel") == self.cancel_msg["cancel"]: self.cancel_msg = None
+            if self.cancel_msg: return # ack ก่อนหุ่นเห็น cancel -> ไม่สนใจ
+            ack, done = int(data.get("ack", 0)), int(data.get("done", 0))
+            if ack > self.acked or done > self.done: self.last_tx = now
+            self.acked = max(self.acked, ack)
+            self.done = max(self.done, done)
+            for seq in [seq for seq in self.sent if seq <= self.done]: del self.sent[seq]
+            if self.done >= self.acked and self.fast_ack != self.acked and any(seq > self.acked for seq in self.sent):
+                # หุ่นทำหมด buffer แล้วแต่ seq ถัดไปยังมาไม่ถึง -> น่าจะหาย ส่งซ้ำเลยไม่ต้องรอ timeout
+                self.fast_ack = self.acked
+                self._retransmit(now)
+            self._fill(now)
+
+    def poll(self, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            if now - self.last_tx < self.timeout: return
+            if self.cancel_msg:
+                self.retransmits += 1
+                self._send(self.cancel_msg, now)
+                return
+            self._retransmit(now)
+            self._fill(now)
+
+    def settled(self):
+        """ หุ่นรับ cancel ล่าสุดแล้ว (done ที่ได้หลังจากนี้ = คำสั่งที่ทำจริงก่อนหยุด) """
+        with self.lock: return self.cancel_msg is None
+
+    def pending(self):
+        with self.lock: return len(self.sent) + len(self.queue)
+
+    def in_flight(self):
+        with self.lock: return len(self.sent)
+
+    def _fill(self, now):
+        """ ส่งคำสั่งจากคิวจนเต็ม window (ระหว่างรอ ack ของ cancel ยังไม่ส่ง -> หุ่นยังไม่รับ seq ใหม่) """
+        if self.cancel_msg: return
+        while self.queue and len(self.sent) < self.window:
+            seq, cmd = self.queue.popleft()
+            self.sent[seq] = cmd
+            self._send({"seq": seq, "cmd": cmd}, now)
+
+    def _retransmit(self, now):
+        """ go-back-N: ส่งซ้ำทุกตัวที่หุ่นยังไม่ ack (ack ครบแล้ว -> ส่งตัวท้ายซ้ำเพื่อขอ ack ใหม่ เผื่อ ack "done" หาย) """
+        lost = sorted(seq for seq in self.sent if seq > self.acked) or ([max(self.sent)] if self.sent else [])
+        for seq in lost: self._send({"seq": seq, "cmd": self.sent[seq]}, now)
+        self.retransmits += len(lost)
+
+    def _send(self, data, now):
+        self.last_tx = now
+        self.publish(encode(data))
+
+# --- 2. Robot Side (stand-in) ---
+
+class RobotQueue:
+    """
+    ฝั่งหุ่น (ใช้ใน maze_sim / ทดสอบ): buffer คำสั่งตาม seq แล้ว ack กลับ
+    ตัวทำงาน (executor) เรียก next_command() ตอนว่าง และ complete() เมื่อคำสั่งเสร็จ
+    on_abort() ถูกเรียกเมื่อ cancel แบบ stop ตัดคำสั่งที่กำลังทำ
+    """
+    def __init__(self, publish, capacity=WINDOW, on_abort=None):
+        self.publish = publish
+        self.capacity = capacity
+        self.on_abort = on_abort
+        self.lock = threading.Lock()
+        self.expected = 1            # seq ถัดไปที่รับ
+        self.buffer = deque()        # (seq, cmd)
+        self.current = None          # seq ที่กำลังทำ
+        self.done = 0
+        self.last_cancel = None
+
+    def on_message(self, payload):
+        data = decode(payload)
+        with self.lock:
+            if "cancel" in data: self._cancel(data)
+            elif "seq" in data:
+                seq = int(data["seq"])
+                # seq ที่รอ + buffer ยังว่าง -> รับ | ซ้ำ / ข้าม -> ไม่รับ แต่ ack ซ้ำให้ฝั่งส่งรู้ว่าถึงไหน
+                if seq == self.expected and len(self.buffer) < self.capacity:
+                    self.buffer.append((seq, data["cmd"]))
+                    self.expected += 1
+            self._ack()
+
+    def next_command(self):
+        """ (seq, cmd) ถัดไป หรือ None """
+        with self.lock:
+            if not self.buffer: return None
+            seq, cmd = self.buffer.popleft()
+            self.current = seq
+            return seq, cmd
+
+    def complete(self):
+        with self.lock:
+            if self.current is None: return
+            self.done = self.current
+            self.current = None
+            self._ack()
+
+    def _cancel(self, data):
+        first = int(data["cancel"])
+        self.buffer = deque(item for item in self.buffer if item[0] < first)
+        self.expected = max(self.expected, int(data.get("next", first)))
+        self.last_cancel = first
+        if self.current is not None and self.current >= first and data.get("stop", True):
+            self.current = None
+            if self.on_abort: self.on_abort()
+
+    def _ack(self):
+        data = {"ack": self.expected - 1, "done": self.done, "free": self.capacity - len(self.buffer)}
+        if self.last_cancel is not None: data["cancel"] = self.last_cancel
+        self.publish(encode(data))
+
+# --- 3. Self Test (lossy link) ---
+
+def self_test(count=200, loss=0.2, window=WINDOW, seed=1, duration=120.0):
+    """ ส่ง count คำสั่งผ่านลิงก์ที่ทำ packet หาย (ทั้งไปและกลับ) -> หุ่นต้องได้ครบตามลำดับ ไม่เบิ้ล """
+    rng = random.Random(seed)
+    to_robot, to_solver = deque(), deque()
+    lossy = lambda box: (lambda payload: None if rng.random() < loss else box.append(payload))
+    stream = CommandStream(lossy(to_robot), window)
+    robot = RobotQueue(lossy(to_solver), window)
+    executed = []
+    commands = [f"FORWARD:{i}" for i in range(count)]
+    t = 0.0
+    stream.extend(["LEFT"] * window, now=t)
+    stream.replace(commands, now=t) # cancel กลางทาง (ถ้า cancel หาย หุ่นอาจทำ LEFT ไปก่อนบ้าง)
+    while t < duration and len(executed) < count:
+        t += 0.01
+        while to_robot: robot.on_message(to_robot.popleft())
+        while to_solver: stream.on_ack(to_solver.popleft(), now=t)
+        if robot.current is not None: robot.complete()
+        item = robot.next_command()
+        if item and item[1] != "LEFT": executed.append(item[1])
+        stream.poll(now=t)
+    ok = executed == commands
+    print(f">>> executed {len(executed)}/{count} in order={ok} | loss {loss:.0%} | "
+          f"retransmits {stream.retransmits} | sim time {t:.2f} s")
+    return ok
+
+if __name__ == "__main__":
+    loss = float(sys.argv[sys.argv.index("--loss") + 1]) if "--loss" in sys.argv else 0.2
+    sys.exit(0 if self_test(loss=loss) else 1)
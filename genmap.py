@@ -1,6 +1,23 @@
-import pygame
+try:
+    import pygame
+except ImportError: # สร้าง maze แบบ headless (python genmap.py generate ...) ไม่ต้องมี pygame
+    pygame = None
+import argparse
 import csv
+import io
+import os
+import random
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import maze_edit
+import maze_model
+import maze_format
+import ui_render
+from maze_core import OPEN_N, OPEN_E, OPEN_S, OPEN_W
 
 # --- 1. การตั้งค่า ---
 MAZE_WIDTH = 8
@@ -15,11 +32,27 @@ C_WALL_EXIST = (0, 0, 0)    # กำแพงจริง (สีดำ)
 C_WALL_HOVER = (200, 0, 0)  # (Optional)
 C_TEXT = (0, 0, 0)
 
+# Procedural Generation
+ALGORITHMS = ("backtracker", "kruskal", "wilson", "braided")
+BRAID = 0.5          # braided: โอกาสที่ทางตันแต่ละจุดจะถูกเจาะเป็น loop (1.0 = ไม่มีทางตันเลย)
+gen_algo = "backtracker" # algorithm ที่ปุ่ม [G] ใช้ ([A] = สลับ)
+
+# Editor Tools ([1]-[4])
+# wall   : คลิก = สลับกำแพง / ลาก = ระบายค่าเดียวกับเส้นแรก
+# fill   : ลากสี่เหลี่ยม -> ปิดทุกเส้น | clear : ลากสี่เหลี่ยม -> เปิดเส้นภายใน (ขอบนอกคงเดิม)
+# select : ลากเลือกช่วง -> Ctrl+C คัดลอก / Ctrl+V วางที่ช่องใต้เมาส์
+TOOLS = ("wall", "fill", "clear", "select")
+AUTOSAVE_FILE = "genmap_autosave.mzedit" # op log เขียนเฉพาะเส้นที่เปลี่ยน -> เปิด editor ใหม่ทำต่อจากเดิม
+C_RECT = (230, 120, 0)      # สี่เหลี่ยมที่กำลังลาก
+C_SELECT = (0, 120, 230)    # ช่วงที่เลือก
+
 # --- 2. ตัวแปรเก็บข้อมูล (Data Model) ---
 # 1 = มีกำแพง, 2 = ไม่มีกำแพง (ใช้ 2 เพื่อให้ตรงกับ Logic Solver เดิมของคุณ)
-horizontal_walls = [[2 for _ in range(MAZE_WIDTH)] for _ in range(MAZE_HEIGHT + 1)]
-vertical_walls = [[2 for _ in range(MAZE_WIDTH + 1)] for _ in range(MAZE_HEIGHT)]
+# เก็บเป็น numpy uint8 (maze_model) -> index [y][x] ได้เหมือนเดิม
+horizontal_walls, vertical_walls = maze_model.reset_walls(MAZE_WIDTH, MAZE_HEIGHT)
 maze_grid = [[2 for _ in range(MAZE_WIDTH)] for _ in range(MAZE_HEIGHT)] # Grid พื้นหลัง (ไม่ได้ใช้แก้ไข แต่ต้องมีเพื่อ save)
+editor = None       # MazeEditor (undo / redo / autosave) สร้างตอนเปิด UI
+saved_text = {}     # ไฟล์ -> เนื้อหา CSV ที่เขียนล่าสุด (save ซ้ำ = เขียนเฉพาะไฟล์ที่เปลี่ยน, maze.mzb = None หลังเขียนแล้ว)
 
 # --- 3. ฟังก์ชันจัดการข้อมูล ---
 
@@ -27,112 +60,362 @@ def reset_map(add_border=False):
     """ ล้างค่าทั้งหมดให้เป็น 2 (ว่าง) """
     global horizontal_walls, vertical_walls
     
-    # Reset เป็น 2 (ว่าง)
-    horizontal_walls = [[2 for _ in range(MAZE_WIDTH)] for _ in range(MAZE_HEIGHT + 1)]
-    vertical_walls = [[2 for _ in range(MAZE_WIDTH + 1)] for _ in range(MAZE_HEIGHT)]
-    
-    if add_border:
-        # สร้างกำแพงรอบนอก (เป็น 1)
-        for x in range(MAZE_WIDTH):
-            horizontal_walls[0][x] = 1            # ขอบบน
-            horizontal_walls[MAZE_HEIGHT][x] = 1  # ขอบล่าง
-        for y in range(MAZE_HEIGHT):
-            vertical_walls[y][0] = 1           # ขอบซ้าย
-            vertical_walls[y][MAZE_WIDTH] = 1  # ขอบขวา
+    # Reset เป็น 2 (ว่าง) + สร้างกำแพงรอบนอก (เป็น 1) ทีเดียวทั้งแถว
+    h_walls, v_walls = maze_model.reset_walls(MAZE_WIDTH, MAZE_HEIGHT, add_border)
+    if editor: editor.replace("Border" if add_border else "Clear", h_walls, v_walls) # undo ได้
+    else: horizontal_walls, vertical_walls = h_walls, v_walls
 
 def save_to_csv():
-    """ บันทึกไฟล์ CSV 3 ไฟล์ """
+    """ บันทึกไฟล์ CSV 3 ไฟล์ + ไฟล์ binary (maze.mzb) ให้ตรงกันเสมอ (ไฟล์ที่เนื้อหาไม่เปลี่ยนไม่เขียนซ้ำ) """
     try:
-        with open('maze_grid.csv', 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerows(maze_grid)
-        
-        with open('horizontal_walls.csv', 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerows(horizontal_walls)
-            
-        with open('vertical_walls.csv', 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerows(vertical_walls)
-            
-        print(">>> บันทึกไฟล์ CSV สำเร็จ! พร้อมรัน Solver <<<")
+        written = 0
+        for filename, rows in (('maze_grid.csv', maze_grid), ('horizontal_walls.csv', horizontal_walls),
+                               ('vertical_walls.csv', vertical_walls)):
+            text = io.StringIO(newline='')
+            csv.writer(text).writerows(rows)
+            text = text.getvalue()
+            if filename not in saved_text and os.path.exists(filename): # save ครั้งแรก -> เทียบกับไฟล์เดิม
+                with open(filename, newline='') as f: saved_text[filename] = f.read()
+            if saved_text.get(filename) == text and os.path.exists(filename): continue
+            with open(filename, 'w', newline='') as f:
+                f.write(text)
+            saved_text[filename] = text
+            written += 1
+
+        # .mzb สร้างจากข้อมูลชุดเดียวกับ CSV -> เขียนเมื่อ CSV เปลี่ยน (หรือยังไม่เคยเขียนในรอบนี้ / ไฟล์หาย)
+        mzb = maze_format.FILE_MAZE_BIN
+        if written or mzb not in saved_text or not os.path.exists(mzb):
+            maze_model.save_maze_file(mzb, horizontal_walls, vertical_walls, maze_grid)
+            saved_text[mzb] = None
+            written += 1
+
+        print(f">>> บันทึกไฟล์ CSV สำเร็จ! ({written} ไฟล์เปลี่ยน) พร้อมรัน Solver <<<")
     except Exception as e:
         print(f"Error saving CSV: {e}")
 
+def edge_at(mx, my):
+    """ เส้นกำแพงใกล้พิกัดเมาส์ -> (plane, y, x) plane 0 = horizontal, 1 = vertical / None """
+    gx, gy = mx // CELL_SIZE, my // CELL_SIZE
+    ox, oy = mx % CELL_SIZE, my % CELL_SIZE
+    if ox < CLICK_TOLERANCE and 0 <= gy < MAZE_HEIGHT and 0 <= gx <= MAZE_WIDTH: return 1, gy, gx
+    if ox > CELL_SIZE - CLICK_TOLERANCE and 0 <= gy < MAZE_HEIGHT and 0 <= gx + 1 <= MAZE_WIDTH: return 1, gy, gx + 1
+    if oy < CLICK_TOLERANCE and 0 <= gy <= MAZE_HEIGHT and 0 <= gx < MAZE_WIDTH: return 0, gy, gx
+    if oy > CELL_SIZE - CLICK_TOLERANCE and 0 <= gy + 1 <= MAZE_HEIGHT and 0 <= gx < MAZE_WIDTH: return 0, gy + 1, gx
+    return None
+
+def cell_at(mx, my):
+    """ ช่องใต้เมาส์ (ลากออกนอกตาราง = ช่องขอบ) """
+    return min(max(mx // CELL_SIZE, 0), MAZE_WIDTH - 1), min(max(my // CELL_SIZE, 0), MAZE_HEIGHT - 1)
+
 def toggle_wall(mx, my):
     """ ตรวจสอบพิกัดเมาส์และสลับสถานะกำแพง """
-    # แปลงพิกัดเมาส์เป็น Grid
-    gx = mx // CELL_SIZE
-    gy = my // CELL_SIZE
-    
-    # หาตำแหน่งสัมพัทธ์ในช่อง (0-80)
-    ox = mx % CELL_SIZE
-    oy = my % CELL_SIZE
-    
-    # 1. เช็คเส้นแนวตั้ง (Vertical) : อยู่ใกล้ขอบซ้ายหรือขวา?
-    if ox < CLICK_TOLERANCE: # ใกล้ขอบซ้ายของช่องนี้
-        if 0 <= gy < MAZE_HEIGHT and 0 <= gx <= MAZE_WIDTH:
-            current = vertical_walls[gy][gx]
-            vertical_walls[gy][gx] = 1 if current == 2 else 2
-            return True
-            
-    elif ox > CELL_SIZE - CLICK_TOLERANCE: # ใกล้ขอบขวาของช่องนี้ (คือขอบซ้ายของช่องถัดไป gx+1)
-        if 0 <= gy < MAZE_HEIGHT and 0 <= gx + 1 <= MAZE_WIDTH:
-            current = vertical_walls[gy][gx + 1]
-            vertical_walls[gy][gx + 1] = 1 if current == 2 else 2
-            return True
-
-    # 2. เช็คเส้นแนวนอน (Horizontal) : อยู่ใกล้ขอบบนหรือล่าง?
-    if oy < CLICK_TOLERANCE: # ใกล้ขอบบน
-        if 0 <= gy <= MAZE_HEIGHT and 0 <= gx < MAZE_WIDTH:
-            current = horizontal_walls[gy][gx]
-            horizontal_walls[gy][gx] = 1 if current == 2 else 2
-            return True
-            
-    elif oy > CELL_SIZE - CLICK_TOLERANCE: # ใกล้ขอบล่าง
-        if 0 <= gy + 1 <= MAZE_HEIGHT and 0 <= gx < MAZE_WIDTH:
-            current = horizontal_walls[gy + 1][gx]
-            horizontal_walls[gy + 1][gx] = 1 if current == 2 else 2
-            return True
-            
-    return False
+    edge = edge_at(mx, my)
+    if edge is None: return False
+    plane, y, x = edge
+    if editor: editor.toggle(plane, y, x) # ผ่าน editor -> undo ได้ + autosave
+    else:
+        walls = vertical_walls if plane else horizontal_walls
+        walls[y][x] = 1 if walls[y][x] == 2 else 2
+    return True
+
+# --- 4. Procedural Generation (headless) ---
+# ทุก algorithm เจาะทางลง open-mask (N/E/S/W แบบ maze_core, index y*W + x) เป็น bytearray
+# แล้วแปลงเป็น h/v walls ทีเดียวด้วย numpy -> ไม่แตะ numpy ทีละช่อง (1024x1024 ได้ในไม่กี่วินาที)
+# ใช้ random.Random(seed) ของตัวเอง -> seed + ขนาด + algorithm เดิม = maze เดิมทุกครั้ง
 
-# --- 4. Main UI Loop ---
+DEAD_ENDS = (OPEN_N, OPEN_E, OPEN_S, OPEN_W) # mask ที่เปิดทางเดียว
+
+def _carve(masks, a, b, width):
+    """ เปิดทางระหว่างช่อง a กับ b (ช่องติดกัน) """
+    if b == a + width: masks[a] |= OPEN_S; masks[b] |= OPEN_N
+    elif b == a - width: masks[a] |= OPEN_N; masks[b] |= OPEN_S
+    elif b == a + 1: masks[a] |= OPEN_E; masks[b] |= OPEN_W
+    else: masks[a] |= OPEN_W; masks[b] |= OPEN_E
+
+def _backtracker(width, height, rng):
+    """ Recursive backtracker (DFS แบบใช้ stack เอง ไม่ชน recursion limit) -> ทางยาว คดเคี้ยว """
+    n = width * height
+    masks = bytearray(n)
+    visited = bytearray(n)
+    start = rng.randrange(n)
+    visited[start] = 1
+    stack = [start]
+    while stack:
+        c = stack[-1]
+        x = c % width
+        options = []
+        if c >= width and not visited[c - width]: options.append(c - width)
+        if x < width - 1 and not visited[c + 1]: options.append(c + 1)
+        if c + width < n and not visited[c + width]: options.append(c + width)
+        if x > 0 and not visited[c - 1]: options.append(c - 1)
+        if not options:
+            stack.pop()
+            continue
+        nxt = options[rng.randrange(len(options))] if len(options) > 1 else options[0]
+        _carve(masks, c, nxt, width)
+        visited[nxt] = 1
+        stack.append(nxt)
+    return masks
+
+def _kruskal(width, height, rng):
+    """ Kruskal: สุ่มลำดับทุกผนังภายใน แล้วเจาะถ้าสองฝั่งยังไม่เชื่อมกัน (union-find) -> ทางตันสั้นๆ เยอะ """
+    n = width * height
+    cells = np.arange(n).reshape(height, width)
+    east = cells[:, :-1].ravel(); south = cells[:-1, :].ravel()
+    a = np.concatenate((east, south)); b = np.concatenate((east + 1, south + width))
+    order = np.random.default_rng(rng.getrandbits(64)).permutation(a.size)
+    parent = list(range(n))
+    masks = bytearray(n)
+    need = n - 1
+    for ca, cb in zip(a[order].tolist(), b[order].tolist()):
+        if not need: break
+        ra = ca
+        while parent[ra] != ra: # path halving
+            parent[ra] = parent[parent[ra]]; ra = parent[ra]
+        rb = cb
+        while parent[rb] != rb:
+            parent[rb] = parent[parent[rb]]; rb = parent[rb]
+        if ra == rb: continue
+        parent[ra] = rb
+        _carve(masks, ca, cb, width)
+        need -= 1
+    return masks
+
+def _wilson(width, height, rng):
+    """
+    Wilson: random walk จนชน tree แล้วเจาะตามทางเดิน (loop-erased) -> สุ่มจาก maze ที่เป็นไปได้ทั้งหมดเท่าๆ กัน
+    nxt[c] เก็บทางออกล่าสุดของแต่ละช่อง -> เดินวนกลับมาทับ = loop ถูกลบเอง
+    """
+    n = width * height
+    masks = bytearray(n)
+    in_tree = bytearray(n)
+    nxt = [0] * n
+    in_tree[rng.randrange(n)] = 1
+    bits = rng.getrandbits
+    for start in range(n):
+        if in_tree[start]: continue
+        c = start
+        while not in_tree[c]:
+            d = bits(2)
+            if d == 0:
+                if c < width: continue
+                b = c - width
+            elif d == 1:
+                if c % width == width - 1: continue
+                b = c + 1
+            elif d == 2:
+                b = c + width
+                if b >= n: continue
+            else:
+                if c % width == 0: continue
+                b = c - 1
+            nxt[c] = b
+            c = b
+        c = start
+        while not in_tree[c]:
+            in_tree[c] = 1
+            _carve(masks, c, nxt[c], width)
+            c = nxt[c]
+    return masks
+
+def _braid(masks, width, rng, braid):
+    """ เจาะทางตัน (สุ่มตามโอกาส braid) ให้กลายเป็น loop -> มีหลายเส้นทาง """
+    n = len(masks)
+    order = list(range(n))
+    rng.shuffle(order)
+    for c in order:
+        m = masks[c]
+        if m not in DEAD_ENDS or rng.random() >= braid: continue
+        x = c % width
+        options = []
+        if c >= width and not m & OPEN_N: options.append(c - width)
+        if x < width - 1 and not m & OPEN_E: options.append(c + 1)
+        if c + width < n and not m & OPEN_S: options.append(c + width)
+        if x > 0 and not m & OPEN_W: options.append(c - 1)
+        dead = [b for b in options if masks[b] in DEAD_ENDS] # เจาะเข้าทางตันอีกอัน -> แก้ได้ 2 จุดในรูเดียว
+        options = dead or options
+        if options: _carve(masks, c, options[rng.randrange(len(options))], width)
+    return masks
+
+_GENERATORS = {"backtracker": _backtracker, "kruskal": _kruskal, "wilson": _wilson}
+
+def generate_maze(width, height, algorithm="backtracker", seed=None, braid=BRAID):
+    """ สร้าง maze -> (h_walls, v_walls) numpy uint8 (1 = กำแพง, 2 = ว่าง) มีขอบรอบนอก """
+    if algorithm not in ALGORITHMS: raise ValueError(f"Unknown algorithm '{algorithm}'")
+    if width < 1 or height < 1: raise ValueError(f"Invalid maze size {width}x{height}")
+    rng = random.Random(seed)
+    masks = _GENERATORS.get(algorithm, _backtracker)(width, height, rng)
+    if algorithm == "braided": _braid(masks, width, rng, braid)
+    return maze_model.walls_from_masks(np.frombuffer(masks, dtype=np.uint8).reshape(height, width))
+
+def load_generated(algorithm, seed):
+    """ ปุ่ม [G]: แทนแผนที่ใน editor ด้วย maze ที่สร้าง """
+    global horizontal_walls, vertical_walls
+    h_walls, v_walls = generate_maze(MAZE_WIDTH, MAZE_HEIGHT, algorithm, seed)
+    if editor: editor.replace(algorithm, h_walls, v_walls)
+    else: horizontal_walls, vertical_walls = h_walls, v_walls
+
+def _generate_file(job):
+    """ Worker (process แยก): สร้าง 1 maze แล้วเขียน .mzb """
+    algorithm, width, height, seed, braid, out_dir = job
+    h_walls, v_walls = generate_maze(width, height, algorithm, seed, braid)
+    filename = os.path.join(out_dir, f"{algorithm}_{width}x{height}_{seed:06d}.mzb")
+    maze_model.save_maze_file(filename, h_walls, v_walls)
+    return filename
+
+def generate_batch(out_dir, algorithms, width, height, count, seed=0, braid=BRAID, jobs=None):
+    """ สร้าง count maze ต่อ algorithm (seed, seed+1, ...) แบบขนาน คืนค่า list ชื่อไฟล์ """
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = [(algo, width, height, seed + i, braid, out_dir) for algo in algorithms for i in range(count)]
+    if jobs == 1: return [_generate_file(task) for task in tasks]
+    workers = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool: # maze เล็กๆ -> ส่งเป็นก้อน ลด overhead ต่อ task
+        return list(pool.map(_generate_file, tasks, chunksize=max(1, len(tasks) // (workers * 8))))
+
+def parse_size(text):
+    """ "16" หรือ "32x16" -> (W, H) """
+    w, _, h = text.lower().partition("x")
+    return int(w), int(h or w)
+
+def generate_main(argv=None):
+    parser = argparse.ArgumentParser(prog="genmap.py generate", description="Headless procedural maze generator (.mzb output)")
+    parser.add_argument("out", help="output folder")
+    parser.add_argument("--algo", action="append", choices=ALGORITHMS, help="algorithm (repeatable, default: all)")
+    parser.add_argument("--size", type=parse_size, default=(MAZE_WIDTH, MAZE_HEIGHT), help="WxH or N (max 65535)")
+    parser.add_argument("--count", type=int, default=1, help="mazes per algorithm")
+    parser.add_argument("--seed", type=int, default=0, help="first seed (maze i uses seed + i)")
+    parser.add_argument("--braid", type=float, default=BRAID, help="dead-end removal chance for braided")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes (1 = in-process)")
+    args = parser.parse_args(argv)
+
+    width, height = args.size
+    algorithms = args.algo or list(ALGORITHMS)
+    t0 = time.perf_counter()
+    files = generate_batch(args.out, algorithms, width, height, args.count, args.seed, args.braid, args.jobs)
+    elapsed = time.perf_counter() - t0
+    print(f">>> {len(files)} mazes ({width}x{height}, {', '.join(algorithms)}) -> {args.out} "
+          f"in {elapsed:.2f}s ({len(files) / elapsed * 60:.0f}/min)", file=sys.stderr)
+    return 0
+
+# --- 5. Main UI Loop ---
 
 def main():
+    global gen_algo, editor, horizontal_walls, vertical_walls
     pygame.init()
     
     SCREEN_WIDTH = MAZE_WIDTH * CELL_SIZE
     SCREEN_HEIGHT = MAZE_HEIGHT * CELL_SIZE + 50 # +50 สำหรับแถบข้อความ
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-    pygame.display.set_caption("Maze Editor | Click=Toggle Wall | B=Border | C=Clear | S=Save")
+    pygame.display.set_caption("Maze Editor | Drag=Paint | 1-4=Tool | Ctrl+Z/Y=Undo/Redo | Ctrl+C/V=Copy/Paste | S=Save")
     
     clock = pygame.time.Clock()
     font = pygame.font.SysFont("Arial", 20)
     
-    # เริ่มต้นสร้างขอบให้เลย เพื่อความสะดวก
-    reset_map(add_border=True)
+    # Autosave: เปิดงานที่ค้างจาก op log ถ้ามี (ขนาดตรงกัน) ไม่งั้นเริ่มใหม่พร้อมขอบ
+    log = maze_edit.OpLog(AUTOSAVE_FILE)
+    restored = log.load()
+    if restored and restored[0].shape == (MAZE_HEIGHT + 1, MAZE_WIDTH):
+        horizontal_walls, vertical_walls = restored[0], restored[1]
+        msg_text = f"Restored autosave ({restored[2]} ops)."
+    else:
+        reset_map(add_border=True) # เริ่มต้นสร้างขอบให้เลย เพื่อความสะดวก
+        msg_text = "Ready. Click lines to edit."
+    log.compact((horizontal_walls, vertical_walls))
+    editor = maze_edit.MazeEditor(horizontal_walls, vertical_walls, log)
     
     running = True
-    msg_text = "Ready. Click lines to edit."
+    tool = "wall"
+    drag = None         # wall: (ค่าที่ระบาย, พิกัดเมาส์ล่าสุด) | tool อื่น: (ช่องเริ่ม, ช่องปัจจุบัน)
+    selection = None    # (x0, y0, x1, y1) ของ tool select
+    clipboard = None
+
+    # Render cache: เส้น Grid วาดครั้งเดียว / กำแพงวาดใหม่เฉพาะตอนเปลี่ยน / ส่งขึ้นจอเฉพาะโซนที่เปลี่ยน
+    map_rect = pygame.Rect(0, 0, MAZE_WIDTH * CELL_SIZE, MAZE_HEIGHT * CELL_SIZE)
+    grid_surface = pygame.Surface(map_rect.size)
+    grid_surface.fill(C_BG)
+    for x in range(MAZE_WIDTH + 1):
+        pygame.draw.line(grid_surface, C_GRID_LINE, (x*CELL_SIZE, 0), (x*CELL_SIZE, MAZE_HEIGHT*CELL_SIZE), 1)
+    for y in range(MAZE_HEIGHT + 1):
+        pygame.draw.line(grid_surface, C_GRID_LINE, (0, y*CELL_SIZE), (MAZE_WIDTH*CELL_SIZE, y*CELL_SIZE), 1)
+    wall_layer = ui_render.WallLayer(MAZE_WIDTH, MAZE_HEIGHT, CELL_SIZE, C_WALL_EXIST, 6) # หนา 6px
+    zones = ui_render.DirtyZones()
     
     while running:
         # --- Event Handling ---
         for event in pygame.event.get():
+            zones.handle_event(event)
             if event.type == pygame.QUIT:
                 running = False
             
-            # คลิกเมาส์
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                mx, my = pygame.mouse.get_pos()
+            # คลิกเมาส์ (ปุ่มซ้าย)
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                mx, my = event.pos
                 if my < MAZE_HEIGHT * CELL_SIZE: # คลิกในพื้นที่ตาราง
-                    if toggle_wall(mx, my):
-                        msg_text = "Wall Updated."
+                    if tool == "wall":
+                        edge = edge_at(mx, my)
+                        if edge:
+                            editor.begin("Wall")
+                            value = editor.toggle(*edge) # เส้นแรกสลับ แล้วลากต่อ = ระบายค่าเดียวกัน
+                            drag = (value, (mx, my))
+                    else:
+                        cell = cell_at(mx, my)
+                        drag = (cell, cell)
+
+            # ลาก: ระบายทุกเส้นที่เมาส์ผ่าน (แบ่งช่วงละครึ่ง CLICK_TOLERANCE ไม่ให้ข้ามเส้นตอนลากเร็ว)
+            elif event.type == pygame.MOUSEMOTION and drag:
+                mx, my = event.pos
+                if tool == "wall":
+                    value, (px, py) = drag
+                    steps = max(1, int(max(abs(mx - px), abs(my - py)) // (CLICK_TOLERANCE // 2)))
+                    for i in range(1, steps + 1):
+                        edge = edge_at(px + (mx - px) * i // steps, py + (my - py) * i // steps)
+                        if edge: editor.set(*edge, value)
+                    drag = (value, (mx, my))
+                else:
+                    drag = (drag[0], cell_at(mx, my))
+
+            elif event.type == pygame.MOUSEBUTTONUP and event.button == 1 and drag:
+                if tool == "wall":
+                    patch = editor.commit()
+                    if patch: msg_text = f"Wall Updated ({len(patch)})."
+                else:
+                    (x0, y0), (x1, y1) = drag
+                    if tool == "select":
+                        selection = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+                        msg_text = f"Selected {selection[2] - selection[0] + 1}x{selection[3] - selection[1] + 1}."
+                    else:
+                        patch = (editor.fill_rect if tool == "fill" else editor.clear_rect)(x0, y0, x1, y1)
+                        msg_text = f"{tool.title()}: {len(patch) if patch else 0} walls."
+                drag = None
                 
             # กดคีย์บอร์ด
             elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_s:
+                ctrl = event.mod & pygame.KMOD_CTRL
+                if ctrl and event.key in (pygame.K_y, pygame.K_z): drag = None # undo ระหว่างลาก = จบ stroke นั้น
+                if ctrl and (event.key == pygame.K_y or (event.key == pygame.K_z and event.mod & pygame.KMOD_SHIFT)):
+                    patch = editor.redo()
+                    msg_text = f"Redo: {patch.label}" if patch else "Nothing to redo."
+                elif ctrl and event.key == pygame.K_z:
+                    patch = editor.undo()
+                    msg_text = f"Undo: {patch.label}" if patch else "Nothing to undo."
+                elif ctrl and event.key == pygame.K_c:
+                    if selection:
+                        clipboard = editor.copy(*selection)
+                        msg_text = "Copied."
+                    else: msg_text = "Select a region first [4]."
+                elif ctrl and event.key == pygame.K_v:
+                    if clipboard:
+                        x, y = cell_at(*pygame.mouse.get_pos()) # มุมซ้ายบนที่ช่องใต้เมาส์
+                        patch = editor.paste(clipboard, x, y)
+                        msg_text = f"Pasted at {x},{y} ({len(patch) if patch else 0})."
+                    else: msg_text = "Clipboard empty."
+                elif event.key in (pygame.K_1, pygame.K_2, pygame.K_3, pygame.K_4):
+                    tool = TOOLS[event.key - pygame.K_1]
+                    drag = None
+                    msg_text = f"Tool: {tool}"
+                elif event.key == pygame.K_s:
                     save_to_csv()
+                    log.compact(editor.planes) # บันทึกแล้ว -> เริ่ม op log ใหม่
                     msg_text = "Saved to CSV!"
                 elif event.key == pygame.K_c:
                     reset_map(add_border=False)
@@ -140,42 +423,49 @@ def main():
                 elif event.key == pygame.K_b:
                     reset_map(add_border=True)
                     msg_text = "Borders Added."
+                elif event.key == pygame.K_g:
+                    seed = random.randrange(1000000) # แสดง seed -> สร้างซ้ำได้ด้วย CLI
+                    load_generated(gen_algo, seed)
+                    msg_text = f"{gen_algo} #{seed}"
+                elif event.key == pygame.K_a:
+                    gen_algo = ALGORITHMS[(ALGORITHMS.index(gen_algo) + 1) % len(ALGORITHMS)]
+                    msg_text = f"Algorithm: {gen_algo}"
 
-        # --- Drawing ---
-        screen.fill(C_BG)
+        # --- Drawing (เฉพาะโซนที่เปลี่ยน) ---
+        if zones.full: screen.fill(C_BG)
         
-        # 1. วาดเส้น Grid จางๆ (Guide)
-        for x in range(MAZE_WIDTH + 1):
-            pygame.draw.line(screen, C_GRID_LINE, (x*CELL_SIZE, 0), (x*CELL_SIZE, MAZE_HEIGHT*CELL_SIZE), 1)
-        for y in range(MAZE_HEIGHT + 1):
-            pygame.draw.line(screen, C_GRID_LINE, (0, y*CELL_SIZE), (MAZE_WIDTH*CELL_SIZE, y*CELL_SIZE), 1)
-
-        # 2. วาดกำแพงจริง (Horizontal Walls)
-        for y in range(MAZE_HEIGHT + 1):
-            for x in range(MAZE_WIDTH):
-                if horizontal_walls[y][x] == 1:
-                    start_pos = (x * CELL_SIZE, y * CELL_SIZE)
-                    end_pos = ((x + 1) * CELL_SIZE, y * CELL_SIZE)
-                    pygame.draw.line(screen, C_WALL_EXIST, start_pos, end_pos, 6) # หนา 6px
-
-        # 3. วาดกำแพงจริง (Vertical Walls)
-        for y in range(MAZE_HEIGHT):
-            for x in range(MAZE_WIDTH + 1):
-                if vertical_walls[y][x] == 1:
-                    start_pos = (x * CELL_SIZE, y * CELL_SIZE)
-                    end_pos = (x * CELL_SIZE, (y + 1) * CELL_SIZE)
-                    pygame.draw.line(screen, C_WALL_EXIST, start_pos, end_pos, 6) # หนา 6px
+        # 1-3. Grid จางๆ (Surface ที่วาดไว้แล้ว) + กำแพงจริง (วาดใหม่เฉพาะตอนแก้กำแพง) + กรอบสี่เหลี่ยม / ช่วงที่เลือก
+        wall_layer.update(horizontal_walls, vertical_walls)
+        dragging_rect = drag if drag and tool != "wall" else None
+        if zones.begin(screen, "map", map_rect, (wall_layer.version, dragging_rect, selection, tool)):
+            screen.blit(grid_surface, (0, 0))
+            wall_layer.draw(screen)
+            rects = [(C_SELECT, selection)] if selection and tool == "select" else []
+            if dragging_rect:
+                (x0, y0), (x1, y1) = dragging_rect
+                rects.append((C_SELECT if tool == "select" else C_RECT, (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))))
+            for color, (x0, y0, x1, y1) in rects:
+                pygame.draw.rect(screen, color, (x0*CELL_SIZE, y0*CELL_SIZE, (x1-x0+1)*CELL_SIZE, (y1-y0+1)*CELL_SIZE), 3)
         
-        # 4. วาดแถบสถานะ
-        pygame.draw.rect(screen, (240, 240, 240), (0, MAZE_HEIGHT * CELL_SIZE, SCREEN_WIDTH, 50))
-        text_surface = font.render(f"[S]ave | [B]order | [C]lear | {msg_text}", True, C_TEXT)
-        screen.blit(text_surface, (10, MAZE_HEIGHT * CELL_SIZE + 15))
+        # 4. วาดแถบสถานะ (2 บรรทัด)
+        status_key = (wall_layer.version, msg_text, tool, len(editor.undo_stack), len(editor.redo_stack))
+        if zones.begin(screen, "status", (0, MAZE_HEIGHT * CELL_SIZE, SCREEN_WIDTH, 50), status_key, (240, 240, 240)):
+            open_edges = maze_model.count_open_edges(horizontal_walls, vertical_walls)
+            text_surface = font.render(f"[S]ave [B]order [C]lear [G]en | Open: {open_edges} | {msg_text}", True, C_TEXT)
+            screen.blit(text_surface, (10, MAZE_HEIGHT * CELL_SIZE + 2))
+            text_surface = font.render(f"Tool [1-4]: {tool} | Undo {len(editor.undo_stack)} / Redo {len(editor.redo_stack)}", True, C_TEXT)
+            screen.blit(text_surface, (10, MAZE_HEIGHT * CELL_SIZE + 25))
 
-        pygame.display.flip()
+        zones.flush()
         clock.tick(60)
 
+    editor.commit()
+    log.close() # ไฟล์ autosave คงไว้ -> เปิดครั้งหน้าทำต่อได้
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
+    # python genmap.py                          -> editor
+    # python genmap.py generate corpus/ --size 64 --count 1000 --algo kruskal --seed 0 --jobs 8
+    if len(sys.argv) > 1 and sys.argv[1] == "generate": sys.exit(generate_main(sys.argv[2:]))
     main()
\ No newline at end of file
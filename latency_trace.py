@@ -0,0 +1,118 @@
+import bisect
+import json
+import threading
+import time
+from collections import deque
+import numpy as np
+
+"""
+LATENCY TRACE
+จับเวลาแต่ละช่วงตั้งแต่ lidar packet เข้า จนถึงคำสั่งถูกส่งออก -> รู้ว่าหน่วงที่ไหนตอนหุ่นเลยช่อง
+
+เก็บเป็น histogram แบบ log (BINS_PER_DECADE ช่องต่อ 10 เท่า, 0.001 ms - 10 s)
+-> บันทึก 1 ค่า = bisect + บวก 1 (ไม่ allocate) ใช้เปิดไว้ตอนแข่งได้
+p50 / p95 / p99 ประมาณจากขอบบนของ bin (คลาดไม่เกิน ~12%)
+
+Mode:
+- off   : ไม่เก็บอะไร
+- light : histogram อย่างเดียว (ค่าเริ่มต้น / ตอนแข่ง)
+- full  : histogram + ค่าดิบทุกค่า (ล่าสุด RAW_LIMIT ค่า) สำหรับ export ไปวิเคราะห์ต่อ
+"""
+
+MODES = ("off", "light", "full")
+BIN_MIN_MS = 0.001
+BINS_PER_DECADE = 20
+DECADES = 7
+RAW_LIMIT = 100000
+EDGES = [BIN_MIN_MS * 10 ** (i / BINS_PER_DECADE) for i in range(DECADES * BINS_PER_DECADE + 1)]
+_EDGES_NP = np.array(EDGES)
+
+# --- 1. Histogram ---
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(EDGES) + 1) # ช่องสุดท้าย = เกิน 10 s
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_right(EDGES, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max: self.max = ms
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=float)
+        if values.size == 0: return
+        for idx, n in zip(*np.unique(np.searchsorted(_EDGES_NP, values, side="right"), return_counts=True)):
+            self.counts[idx] += int(n)
+        self.count += int(values.size)
+        self.total += float(values.sum())
+        self.max = max(self.max, float(values.max()))
+
+    def percentile(self, p):
+        if self.count == 0: return 0.0
+        target = self.count * p / 100.0
+        running = 0
+        for idx, n in enumerate(self.counts):
+            running += n
+            if running >= target: break
+        return self.max if idx >= len(EDGES) else min(EDGES[idx], self.max)
+
+    def summary(self):
+        mean = self.total / self.count if self.count else 0.0
+        return {"count": self.count, "mean": round(mean, 3), "p50": round(self.percentile(50), 3),
+                "p95": round(self.percentile(95), 3), "p99": round(self.percentile(99), 3), "max": round(self.max, 3)}
+
+# --- 2. Tracer ---
+
+class LatencyTracer:
+    def __init__(self, mode="light", stages=()):
+        if mode not in MODES: raise ValueError(f"Unknown trace mode '{mode}'")
+        self.stages = list(stages) # ลำดับที่แสดง (stage อื่นที่ถูกบันทึกจะต่อท้าย)
+        self._lock = threading.Lock() # บันทึกจากทั้ง thread ของ MQTT และ control loop
+        self.set_mode(mode)
+
+    def set_mode(self, mode):
+        self.mode = mode
+        self.enabled = mode != "off"
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hists = {stage: Histogram() for stage in self.stages}
+            self.raw = deque(maxlen=RAW_LIMIT) if self.mode == "full" else None
+            self.started = time.time()
+
+    def record(self, stage, ms):
+        if not self.enabled: return
+        with self._lock:
+            hist = self.hists.get(stage) or self.hists.setdefault(stage, Histogram())
+            hist.add(ms)
+            if self.raw is not None: self.raw.append((time.time(), stage, ms))
+
+    def record_many(self, stage, values_ms):
+        if not self.enabled: return
+        with self._lock:
+            hist = self.hists.get(stage) or self.hists.setdefault(stage, Histogram())
+            hist.add_many(values_ms)
+            if self.raw is not None:
+                now = time.time()
+                self.raw.extend((now, stage, float(ms)) for ms in values_ms)
+
+    def summary(self):
+        with self._lock:
+            return {stage: hist.summary() for stage, hist in self.hists.items()}
+
+    def export(self, filename):
+        """ JSON: summary + histogram ทุก stage (+ ค่าดิบถ้า mode full) """
+        with self._lock:
+            data = {"mode": self.mode, "started": self.started, "exported": time.time(),
+                    "summary": {stage: hist.summary() for stage, hist in self.hists.items()},
+                    "bin_edges_ms": EDGES,
+                    "histograms": {stage: hist.counts for stage, hist in self.hists.items()}}
+            if self.raw is not None: data["raw"] = [[round(t, 6), stage, round(ms, 4)] for t, stage, ms in self.raw]
+        with open(filename, "w") as f:
+            json.dump(data, f)
+        return filename
@@ -0,0 +1,122 @@
+import numpy as np
+
+"""
+LIDAR FILTER (NumPy batch)
+กรอง lidar F/L/R/B ทีละชุด (ทุก sample ที่ค้างใน ring buffer ในรอบนั้น) แทน EMA ทีละ packet
+
+- ema    : EMA แบบเดิม แต่คำนวณทั้ง batch ในครั้งเดียว (ข้าม sample ที่ถูกตัดทิ้ง)
+- median : median ของ WINDOW sample ล่าสุด (ทน spike ได้ดี)
+- kalman : Kalman 1D ต่อทิศ (ระยะคงที่ + process noise q, measurement noise r)
+
+Outlier: ค่าที่ห่างจาก median ของหน้าต่างเกิน OUTLIER_MM (หรือ <= 0 / NaN) จะไม่ถูกใช้
+         แต่ยังเก็บไว้ในหน้าต่างของ median -> ถ้าระยะเปลี่ยนจริง (เช่น เจอกำแพงใหม่) ครึ่งหน้าต่างก็รับค่าใหม่แล้ว
+Variance: ต่อทิศ จาก sample ที่ผ่านการกรองในหน้าต่าง -> ใช้ยืนยันกำแพงได้เร็วกว่ารอเวลาคงที่
+"""
+
+FILTERS = ("ema", "median", "kalman")
+DIRECTIONS = ("F", "L", "R", "B")
+WINDOW = 15          # ~0.3 วินาทีที่ 50 Hz
+OUTLIER_MM = 400.0
+MIN_SAMPLES = 5      # ก่อนจะเชื่อ median (ตัด outlier)
+CONFIRM_SAMPLES = 12 # sample ที่ผ่านการกรองขั้นต่ำก่อนยืนยันกำแพง (เกือบเต็ม WINDOW)
+CONFIDENCE_Z = 3.0
+MARGIN_MM = 50.0     # ค่าเฉลี่ยต้องต่ำกว่า threshold อย่างน้อยเท่านี้ (mm) ไม่ว่า noise จะต่ำแค่ไหน
+
+class LidarFilter:
+    def __init__(self, mode="ema", alpha=0.4, window=WINDOW, q=50.0, r=400.0, outlier_mm=OUTLIER_MM, initial=2000.0):
+        if mode not in FILTERS: raise ValueError(f"Unknown lidar filter '{mode}'")
+        self.mode = mode
+        self.alpha = alpha
+        self.window = window
+        self.q = q; self.r = r
+        self.outlier_mm = outlier_mm
+        self.estimate = np.full(4, initial)
+        self.p = np.full(4, r)                     # Kalman covariance
+        # หน้าต่างแบบวน (จองไว้ก่อน ไม่ allocate ทุกรอบ)
+        self.raw = np.zeros((window, 4))           # ทุก sample (ใช้หา median สำหรับตัด outlier)
+        self.ok = np.zeros((window, 4), dtype=bool) # sample ไหนผ่านการกรอง (ใช้หา variance / median filter)
+        self.pos = 0
+        self.filled = 0
+        self.count = np.zeros(4, dtype=int)        # สถิติของหน้าต่าง (คำนวณครั้งเดียวต่อ batch)
+        self.mean = np.full(4, np.nan)
+        self.var = np.full(4, np.nan)
+        self.rejected = 0
+        self.valid = np.zeros((0, 4), dtype=bool)
+
+    def process(self, samples):
+        """ samples: array (N, 4) ของ F/L/R/B -> ค่าประมาณล่าสุด (4,) """
+        batch = np.asarray(samples, dtype=float).reshape(-1, 4)
+        n = len(batch)
+        if n == 0: return self.estimate
+        valid = np.isfinite(batch) & (batch > 0)
+        if self.filled >= MIN_SAMPLES:
+            lo, hi = (self.filled - 1) // 2, self.filled // 2
+            part = np.partition(self.raw[:self.filled], (lo, hi), axis=0) # median โดยไม่ sort ทั้งหน้าต่าง
+            median = 0.5 * (part[lo] + part[hi])
+            valid &= np.abs(batch - median) <= self.outlier_mm
+        self.rejected += int(valid.size - valid.sum())
+        self.valid = valid                         # mask ของ batch ล่าสุด (ให้คนเรียกใช้ sample ชุดเดียวกัน)
+
+        # ลงหน้าต่าง (ถ้า batch ใหญ่กว่าหน้าต่าง เก็บแค่ท้าย)
+        tail = slice(max(0, n - self.window), n)
+        idx = (self.pos + np.arange(tail.stop - tail.start)) % self.window
+        self.raw[idx] = batch[tail]
+        self.ok[idx] = valid[tail]
+        self.pos = (self.pos + len(idx)) % self.window
+        self.filled = min(self.filled + len(idx), self.window)
+        self._window_stats()
+
+        if self.mode == "ema": self._ema(batch, valid)
+        elif self.mode == "median": self._median()
+        else: self._kalman(batch, valid)
+        return self.estimate
+
+    def _window_stats(self):
+        ok = self.ok[:self.filled]
+        vals = np.where(ok, self.raw[:self.filled], 0.0)
+        self.count = ok.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.mean = vals.sum(axis=0) / self.count
+            self.var = (np.where(ok, vals - self.mean, 0.0) ** 2).sum(axis=0) / self.count
+
+    def _ema(self, batch, valid):
+        # y = (1-a)^n * y0 + sum a(1-a)^(จำนวน sample ที่ใช้ได้หลัง k) * x_k  -> ทั้ง batch ในครั้งเดียว
+        keep = 1.0 - self.alpha
+        v = valid.astype(float)
+        after = np.cumsum(v[::-1], axis=0)[::-1] - v
+        weights = self.alpha * keep ** after * v
+        self.estimate = keep ** v.sum(axis=0) * self.estimate + (weights * np.where(valid, batch, 0.0)).sum(axis=0)
+
+    def _median(self):
+        # ค่าที่ถูกตัดทิ้ง = inf -> ไปอยู่ท้ายหลัง sort, median = ตรงกลางของส่วนที่ใช้ได้
+        ordered = np.sort(np.where(self.ok[:self.filled], self.raw[:self.filled], np.inf), axis=0)
+        has = self.count > 0
+        cols = np.arange(4)[has]
+        c = self.count[has]
+        self.estimate[has] = 0.5 * (ordered[(c - 1) // 2, cols] + ordered[c // 2, cols])
+
+    def _kalman(self, batch, valid):
+        # ขนาด batch ต่อรอบเล็ก (1-5) -> วนทีละแถว แต่คำนวณทั้ง 4 ทิศพร้อมกัน
+        for z, ok in zip(batch, valid):
+            p = self.p + self.q
+            k = np.where(ok, p / (p + self.r), 0.0)
+            self.estimate = self.estimate + k * (np.where(ok, z, self.estimate) - self.estimate)
+            self.p = (1.0 - k) * p
+
+    # --- Statistics ---
+    def variance(self):
+        """ variance (mm^2) ต่อทิศของ sample ที่ผ่านการกรองในหน้าต่าง (NaN ถ้ายังไม่พอ) """
+        return np.where(self.count >= 2, self.var, np.nan)
+
+    def confident_below(self, index, threshold, z=CONFIDENCE_Z, margin=MARGIN_MM):
+        """
+        ระยะในหน้าต่างต่ำกว่า threshold ชัดเจนหรือไม่ (ใช้ยืนยันกำแพงก่อนครบเวลา)
+        ใช้ std ของ sample แต่ละตัว (ไม่หารด้วย sqrt(n)) -> sample ส่วนใหญ่ต้องต่ำกว่า threshold จริง
+        ไม่ใช่แค่ค่าเฉลี่ยของ sample ไม่กี่ตัว และต้องห่างจาก threshold อย่างน้อย margin mm
+        """
+        if int(self.count[index]) < min(CONFIRM_SAMPLES, self.window): return False
+        std = float(self.var[index]) ** 0.5
+        return threshold - float(self.mean[index]) > max(margin, z * std)
+
+    def as_dict(self):
+        return dict(zip(DIRECTIONS, self.estimate.tolist()))
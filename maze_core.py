@@ -0,0 +1,411 @@
+import hashlib
+import heapq
+import json
+from array import array
+from collections import OrderedDict, deque
+
+"""
+MAZE CORE (Solver Engine)
+Logic ล้วนๆ ไม่มี pygame / MQTT -> ใช้ได้ทั้ง maze_solver UI และสคริปต์ Benchmark
+
+Data Format (เหมือนไฟล์ CSV):
+- h_walls[y][x] : ขนาด (H+1) x W  (กำแพงด้านบนของช่อง x,y)
+- v_walls[y][x] : ขนาด H x (W+1)  (กำแพงด้านซ้ายของช่อง x,y)
+- 1 = มีกำแพง, 2 = ว่าง
+"""
+
+WALL = 1
+OPEN = 2
+
+# Bitmask ทิศที่เดินได้ของแต่ละช่อง (1 byte ต่อช่อง, index = y*W + x)
+OPEN_N = 1
+OPEN_E = 2
+OPEN_S = 4
+OPEN_W = 8
+DIR_BITS = (OPEN_N, OPEN_E, OPEN_S, OPEN_W) # 0:N, 1:E, 2:S, 3:W
+DIR_DX = (0, 1, 0, -1)
+DIR_DY = (-1, 0, 1, 0)
+
+# เวลา (วินาที) ที่หุ่นใช้ต่อคำสั่ง -> ใช้กับ solve_turn_aware
+COST_FORWARD = 1.0
+COST_TURN_90 = 0.8
+COST_TURN_180 = 1.6   # หุ่นทำ U-turn ด้วย RIGHT + RIGHT
+COST_STRAFE = 1.2     # สไลด์ข้าง (mecanum) ต่อช่อง
+
+# Route Cache
+ALL_PAIRS_MAX_CELLS = 256   # maze เล็ก (<= 16x16) -> สร้าง BFS tree ครบทุกช่องทีเดียว
+ROUTE_CACHE_SIZE = 64       # maze ใหญ่ -> เก็บ BFS tree ต่อจุดเริ่ม แบบ LRU
+
+# --- 1. Helper ---
+
+def maze_size(h_walls, v_walls):
+    """ คืนค่า (W, H) จากขนาด Array กำแพง """
+    return len(h_walls[0]), len(v_walls)
+
+def is_move_valid(x1, y1, x2, y2, h_walls, v_walls):
+    width, height = maze_size(h_walls, v_walls)
+    if not (0 <= x2 < width and 0 <= y2 < height): return False
+    try:
+        if x1 == x2: # เดินแนวตั้ง
+            if y2 < y1: return h_walls[y1][x1] == OPEN # ขึ้น
+            else: return h_walls[y2][x1] == OPEN # ลง
+        elif y1 == y2: # เดินแนวนอน
+            if x2 < x1: return v_walls[y1][x1] == OPEN # ซ้าย
+            else: return v_walls[y1][x2] == OPEN # ขวา
+    except: return False
+    return False
+
+def build_open_masks(h_walls, v_walls, optimistic=False):
+    """
+    แปลงกำแพงเป็น array('B') ของ N/E/S/W open-mask (สร้างครั้งเดียวหลังโหลด)
+    optimistic=True : ค่าที่ยังไม่รู้ (0) ถือว่าเดินได้ (ใช้กับแผนที่ของ mapper)
+    """
+    width, height = maze_size(h_walls, v_walls)
+    masks = array('B', bytes(width * height))
+    for y in range(height):
+        top, bottom, side = h_walls[y], h_walls[y + 1], v_walls[y]
+        base = y * width
+        for x in range(width):
+            if optimistic:
+                n, s, w, e = top[x] != WALL, bottom[x] != WALL, side[x] != WALL, side[x + 1] != WALL
+            else:
+                n, s, w, e = top[x] == OPEN, bottom[x] == OPEN, side[x] == OPEN, side[x + 1] == OPEN
+            m = 0
+            if n and y > 0: m |= OPEN_N
+            if e and x < width - 1: m |= OPEN_E
+            if s and y < height - 1: m |= OPEN_S
+            if w and x > 0: m |= OPEN_W
+            masks[base + x] = m
+    return masks
+
+def set_wall_mask(masks, width, height, x, y, d, is_open):
+    """ อัปเดต mask ของช่อง (x,y) ด้าน d และช่องข้างเคียง (กำแพงเดียวกัน) """
+    nx, ny = x + DIR_DX[d], y + DIR_DY[d]
+    inside = 0 <= nx < width and 0 <= ny < height
+    bit, back = DIR_BITS[d], DIR_BITS[(d + 2) % 4]
+    idx = y * width + x
+    if is_open and inside:
+        masks[idx] |= bit
+        masks[ny * width + nx] |= back
+    else:
+        masks[idx] &= ~bit & 0xFF
+        if inside: masks[ny * width + nx] &= ~back & 0xFF
+
+# --- 2. Solver (BFS) ---
+
+def solve_bfs(start, end, h_walls, v_walls, masks=None, stats=None):
+    """
+    BFS แบบเก็บ Parent Pointer (index = y*W + x)
+    ไม่ copy path ทุกครั้งที่ enqueue -> O(N) แทน O(N*L)
+    สร้าง path ย้อนกลับครั้งเดียวตอนเจอเป้าหมาย
+    masks : ผลจาก build_open_masks (ส่งมาเพื่อไม่ต้องสร้างใหม่ทุกครั้ง)
+    stats : dict (ถ้าให้มา) -> ใส่ "expanded" = จำนวน node ที่ถูกขยาย (ใช้ใน bench_solver)
+    """
+    width, height = maze_size(h_walls, v_walls)
+    if masks is None: masks = build_open_masks(h_walls, v_walls)
+    sx, sy = start
+    ex, ey = end
+    if not (0 <= sx < width and 0 <= sy < height): return []
+    if not (0 <= ex < width and 0 <= ey < height): return []
+
+    src = sy * width + sx
+    goal = ey * width + ex
+    parent = array('i', [-1]) * (width * height) # -1 = ยังไม่เคยไป
+    parent[src] = src
+    queue = deque([src])
+    expanded = 0
+    while queue:
+        curr = queue.popleft()
+        expanded += 1
+        if curr == goal: break
+        m = masks[curr]
+        # N, E, S, W (ลำดับเดียวกับของเดิม -> ได้ path เดียวกัน)
+        for bit, step in ((OPEN_N, -width), (OPEN_E, 1), (OPEN_S, width), (OPEN_W, -1)):
+            if m & bit:
+                nxt = curr + step
+                if parent[nxt] == -1:
+                    parent[nxt] = curr
+                    queue.append(nxt)
+
+    if stats is not None: stats["expanded"] = expanded
+    if parent[goal] == -1: return []
+    return _build_path(parent, src, goal, width)
+
+def bfs_tree(src, masks, width, height):
+    """ BFS จาก src ทั่วทั้ง maze -> (parent, dist) index = y*W + x, -1 = ไปไม่ถึง """
+    parent = array('i', [-1]) * (width * height)
+    dist = array('i', [-1]) * (width * height)
+    parent[src] = src
+    dist[src] = 0
+    queue = deque([src])
+    while queue:
+        curr = queue.popleft()
+        m = masks[curr]
+        d = dist[curr] + 1
+        for bit, step in ((OPEN_N, -width), (OPEN_E, 1), (OPEN_S, width), (OPEN_W, -1)):
+            if m & bit:
+                nxt = curr + step
+                if parent[nxt] == -1:
+                    parent[nxt] = curr
+                    dist[nxt] = d
+                    queue.append(nxt)
+    return parent, dist
+
+def _build_path(parent, src, goal, width):
+    path = []
+    node = goal
+    while node != src:
+        path.append((node % width, node // width))
+        node = parent[node]
+    path.append((src % width, src // width))
+    path.reverse()
+    return path
+
+def solve_bfs_legacy(start, end, h_walls, v_walls, stats=None):
+    """ BFS แบบเดิม (copy path ทั้งเส้นทุก node) เก็บไว้เทียบใน Benchmark """
+    queue = deque([(start, [start])])
+    visited = set([start])
+    if stats is not None: stats["expanded"] = 0
+    while queue:
+        (curr, path) = queue.popleft()
+        if stats is not None: stats["expanded"] += 1
+        if curr == end: return path
+        cx, cy = curr
+        # N, E, S, W
+        neighbors = [(cx, cy-1), (cx+1, cy), (cx, cy+1), (cx-1, cy)]
+        for nx, ny in neighbors:
+            if (nx, ny) not in visited and is_move_valid(cx, cy, nx, ny, h_walls, v_walls):
+                visited.add((nx, ny))
+                queue.append(((nx, ny), path + [(nx, ny)]))
+    return []
+
+def solve_turn_aware(start, start_dir, end, h_walls, v_walls, masks=None,
+                     cost_forward=COST_FORWARD, cost_turn_90=COST_TURN_90, cost_turn_180=COST_TURN_180, stats=None):
+    """
+    A* บน state (x, y, heading) เริ่มจาก start_dir
+    คิด cost เป็นเวลาจริงของหุ่น (FORWARD / หมุน 90 / หมุน 180) แทนจำนวนช่อง
+    Heuristic = Manhattan * cost_forward
+    คืนค่า (path, commands) หรือ ([], []) ถ้าไปไม่ถึง
+    stats : dict (ถ้าให้มา) -> "expanded" = จำนวน state (x, y, heading) ที่ถูกขยาย
+    """
+    width, height = maze_size(h_walls, v_walls)
+    if masks is None: masks = build_open_masks(h_walls, v_walls)
+    sx, sy = start
+    ex, ey = end
+    if not (0 <= sx < width and 0 <= sy < height): return [], []
+    if not (0 <= ex < width and 0 <= ey < height): return [], []
+
+    steps = (-width, 1, width, -1) # N, E, S, W
+    goal = ey * width + ex
+    src = (sy * width + sx) * 4 + start_dir
+    # action: 0=FORWARD, 1=RIGHT, 2=LEFT, 3=U-TURN
+    turns = ((1, 1, cost_turn_90), (3, 2, cost_turn_90), (2, 3, cost_turn_180))
+
+    g = array('d', [float("inf")]) * (width * height * 4)
+    parent = array('i', [-1]) * (width * height * 4)
+    action = array('b', [-1]) * (width * height * 4)
+    closed = bytearray(width * height * 4) # heuristic consistent -> pop ครั้งแรกคือค่าที่ดีที่สุดแล้ว
+    g[src] = 0.0
+    heap = [((abs(sx - ex) + abs(sy - ey)) * cost_forward, 0, src)]
+    counter = 0
+    found = -1
+    expanded = 0
+    while heap:
+        _, _, state = heapq.heappop(heap)
+        if closed[state]: continue
+        closed[state] = 1
+        expanded += 1
+        cell, d = state >> 2, state & 3
+        if cell == goal:
+            found = state
+            break
+        cost = g[state]
+        moves = []
+        if masks[cell] & DIR_BITS[d]:
+            moves.append(((cell + steps[d]) * 4 + d, 0, cost_forward))
+        for turn, act, c in turns:
+            moves.append((cell * 4 + (d + turn) % 4, act, c))
+        for nxt, act, c in moves:
+            ng = cost + c
+            if ng < g[nxt] and not closed[nxt]:
+                g[nxt] = ng
+                parent[nxt] = state
+                action[nxt] = act
+                n_cell = nxt >> 2
+                h = (abs(n_cell % width - ex) + abs(n_cell // width - ey)) * cost_forward
+                counter += 1
+                heapq.heappush(heap, (ng + h, counter, nxt))
+
+    if stats is not None: stats["expanded"] = expanded
+    if found == -1: return [], []
+    # ย้อน parent กลับไปหา start
+    trail = []
+    state = found
+    while state != src:
+        trail.append(state)
+        state = parent[state]
+    trail.reverse()
+
+    path = [(sx, sy)]
+    commands = []
+    for state in trail:
+        act = action[state]
+        if act == 0:
+            cell = state >> 2
+            path.append((cell % width, cell // width))
+            commands.append("FORWARD")
+        elif act == 1: commands.append("RIGHT")
+        elif act == 2: commands.append("LEFT")
+        else: commands.extend(["RIGHT", "RIGHT"])
+    return path, commands
+
+def commands_cost(commands, cost_forward=COST_FORWARD, cost_turn_90=COST_TURN_90, cost_strafe=COST_STRAFE):
+    """ เวลาโดยประมาณของ command list (ใช้เทียบโหมด Solver บนหน้าจอ) """
+    total = 0.0
+    for cmd in commands:
+        name, cells = parse_command(cmd)
+        if name == "FORWARD": total += cost_forward * cells
+        elif name.startswith("STRAFE"): total += cost_strafe * cells
+        else: total += cost_turn_90
+    return total
+
+# --- 3. Path -> Robot Commands ---
+
+def generate_commands(path, start_dir):
+    if not path or len(path) < 2: return []
+    commands = []
+    curr_d = start_dir
+    for i in range(len(path) - 1):
+        x1, y1 = path[i]
+        x2, y2 = path[i+1]
+
+        # หา Target Dir
+        if y2 < y1: target_d = 0 # N
+        elif x2 > x1: target_d = 1 # E
+        elif y2 > y1: target_d = 2 # S
+        else: target_d = 3 # W
+
+        diff = target_d - curr_d
+        # ปรับค่า Diff (-1=Left, 1=Right)
+        if diff == 3: diff = -1
+        elif diff == -3: diff = 1
+
+        if diff == 0: pass
+        elif diff == 1 or diff == -3: commands.append("RIGHT")
+        elif diff == -1 or diff == 3: commands.append("LEFT")
+        elif abs(diff) == 2:
+            commands.append("RIGHT")
+            commands.append("RIGHT")
+
+        commands.append("FORWARD")
+        curr_d = target_d
+    return commands
+
+# --- 4. Command Compression (Multi-cell) ---
+# รวม FORWARD ที่ติดกันเป็น "FORWARD:n" -> ส่ง MQTT ครั้งเดียว / เร่ง-เบรกครั้งเดียว
+# LEFT + FORWARD*n + RIGHT (หัวกลับทิศเดิม) -> "STRAFE_LEFT:n" (สไลด์ข้างแบบ mecanum)
+
+def parse_command(cmd):
+    """ "FORWARD:5" -> ("FORWARD", 5), "LEFT" -> ("LEFT", 1) """
+    name, _, cells = cmd.partition(":")
+    return name, int(cells) if cells else 1
+
+def format_command(name, cells):
+    return name if cells == 1 else f"{name}:{cells}"
+
+def compress_commands(commands, strafe=True):
+    out = []
+    i = 0
+    n = len(commands)
+    while i < n:
+        cmd = commands[i]
+        if cmd == "FORWARD":
+            j = i
+            while j < n and commands[j] == "FORWARD": j += 1
+            out.append(format_command("FORWARD", j - i))
+            i = j
+            continue
+        if strafe and cmd in ("LEFT", "RIGHT"):
+            # หา pattern: หมุน -> เดินตรง n ช่อง -> หมุนกลับ
+            back = "RIGHT" if cmd == "LEFT" else "LEFT"
+            j = i + 1
+            while j < n and commands[j] == "FORWARD": j += 1
+            if j > i + 1 and j < n and commands[j] == back:
+                out.append(format_command(f"STRAFE_{cmd}", j - i - 1))
+                i = j + 1
+                continue
+        out.append(cmd)
+        i += 1
+    return out
+
+def command_to_wire(cmd, fmt="text"):
+    """ แปลงคำสั่งเป็น payload ที่ส่งจริง: text = "FORWARD:5", json = {"cmd":"FORWARD","cells":5} """
+    if fmt != "json": return cmd
+    name, cells = parse_command(cmd)
+    return json.dumps({"cmd": name, "cells": cells})
+
+# --- 5. Route Cache (คลิกแล้วได้ path ทันที) ---
+
+def maze_hash(h_walls, v_walls):
+    """ Key ของ cache: hash ของ array กำแพงทั้งสอง """
+    digest = hashlib.blake2b(digest_size=16)
+    for row in h_walls: digest.update(bytes(row))
+    digest.update(b"|")
+    for row in v_walls: digest.update(bytes(row))
+    return digest.hexdigest()
+
+class RouteCache:
+    """
+    เก็บ BFS tree (parent + dist) ต่อจุดเริ่ม -> query (start, end) = เดินย้อน parent อย่างเดียว
+    - maze เล็ก : สร้างครบทุกจุด (all-pairs)
+    - maze ใหญ่ : สร้างตอนถูกถาม + LRU eviction
+    ได้ path เดียวกับ solve_bfs (ลำดับ N, E, S, W เหมือนกัน)
+    """
+    def __init__(self, h_walls, v_walls, masks=None, capacity=ROUTE_CACHE_SIZE):
+        self.key = maze_hash(h_walls, v_walls)
+        self.width, self.height = maze_size(h_walls, v_walls)
+        self.masks = masks if masks is not None else build_open_masks(h_walls, v_walls)
+        self.trees = OrderedDict()
+        self.hits = 0; self.misses = 0
+        cells = self.width * self.height
+        self.capacity = cells if cells <= ALL_PAIRS_MAX_CELLS else capacity
+        if cells <= ALL_PAIRS_MAX_CELLS:
+            for src in range(cells):
+                self.trees[src] = bfs_tree(src, self.masks, self.width, self.height)
+
+    def matches(self, h_walls, v_walls):
+        return self.key == maze_hash(h_walls, v_walls)
+
+    def tree(self, start):
+        src = start[1] * self.width + start[0]
+        tree = self.trees.get(src)
+        if tree is not None:
+            self.hits += 1
+            self.trees.move_to_end(src)
+            return tree
+        self.misses += 1
+        tree = bfs_tree(src, self.masks, self.width, self.height)
+        self.trees[src] = tree
+        if len(self.trees) > self.capacity: self.trees.popitem(last=False)
+        return tree
+
+    def route(self, start, end):
+        """ เหมือน solve_bfs แต่ใช้ tree ที่ cache ไว้ """
+        if not self._inside(start) or not self._inside(end): return []
+        parent, _ = self.tree(start)
+        goal = end[1] * self.width + end[0]
+        if parent[goal] == -1: return []
+        return _build_path(parent, start[1] * self.width + start[0], goal, self.width)
+
+    def distances(self, start):
+        """ ระยะ (จำนวนช่อง) จาก start ไปทุกช่อง -> ใช้วาด Reachability Heatmap """
+        if not self._inside(start): return None
+        return self.tree(start)[1]
+
+    def _inside(self, cell):
+        return 0 <= cell[0] < self.width and 0 <= cell[1] < self.height
+
+def get_route_cache(cache, h_walls, v_walls, masks=None):
+    """ คืน cache เดิมถ้ากำแพงไม่เปลี่ยน ไม่งั้นสร้างใหม่ """
+    if cache is not None and cache.matches(h_walls, v_walls): return cache
+    return RouteCache(h_walls, v_walls, masks)
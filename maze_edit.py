@@ -0,0 +1,251 @@
+import os
+import struct
+import zlib
+
+import numpy as np
+
+import maze_model
+
+"""
+MAZE EDIT LOG (Undo / Redo / Autosave)
+ใช้กับ genmap: ทุกการแก้ (คลิก, ลากเส้น, สี่เหลี่ยม, paste, generate) = 1 Patch เก็บเฉพาะกำแพงที่เปลี่ยน
+
+- Patch      : index (flat) + ค่าเก่า + ค่าใหม่ ต่อ plane (h / v) -> undo = เขียนค่าเก่ากลับ
+- MazeEditor : แก้ array ของ editor ในที่ (in place) + undo / redo stack + copy / paste ช่วงช่อง
+- OpLog      : autosave แบบ append-only เขียนแค่ค่าที่เปลี่ยนต่อ 1 การแก้ (ไม่เขียนทั้งแผนที่ใหม่)
+               ครบ COMPACT_OPS ครั้ง -> compact = เขียน base ใหม่ทั้งก้อน แล้วเริ่ม log ว่าง
+
+Layout ไฟล์ .mzedit (little-endian):
+- Header : "MZEDIT" + version (u8) | width (u16) | height (u16) | base length (u32) | base (zlib: h + v uint8)
+- Record : plane (u8, 0 = h, 1 = v) | count (u32) | index u32[count] | value u8[count]
+record สุดท้ายที่เขียนไม่ครบ (โปรแกรมตายระหว่างเขียน) จะถูกข้าม
+"""
+
+MAGIC = b"MZEDIT"
+VERSION = 1
+HEADER = struct.Struct("<BHHI")
+RECORD = struct.Struct("<BI")
+COMPACT_OPS = 200        # append กี่ครั้งแล้ว compact
+UNDO_LIMIT = 500
+
+# --- 1. Patch ---
+
+class Patch:
+    def __init__(self, label, changes):
+        self.label = label
+        self.changes = changes # [(index, old, new) ของ h, (index, old, new) ของ v]
+
+    def __len__(self):
+        return sum(len(idx) for idx, old, new in self.changes)
+
+    def apply(self, planes, undo=False):
+        """ เขียนค่าใหม่ (หรือค่าเก่าถ้า undo) คืนค่า [(index, values)] ที่เขียนไป (ใช้ append ลง log) """
+        written = []
+        for plane, (idx, old, new) in zip(planes, self.changes):
+            values = old if undo else new
+            np.put(plane, idx, values)
+            written.append((idx, values))
+        return written
+
+def _empty_change():
+    return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=np.uint8))
+
+# --- 2. Editor ---
+
+class MazeEditor:
+    def __init__(self, h_walls, v_walls, log=None):
+        self.planes = (h_walls, v_walls) # numpy ของ UI (แก้ในที่ -> UI เห็นทันที)
+        self.log = log
+        self.undo_stack = []
+        self.redo_stack = []
+        self.version = 0                 # เพิ่มทุกครั้งที่ map เปลี่ยน
+        self._group = None               # (label, [{index: ค่าเก่า} ต่อ plane]) ระหว่างลาก
+
+    # --- แก้ทีละเส้น (คลิก / ลาก) ---
+    def begin(self, label):
+        """ เริ่ม stroke: ทุก set() จนถึง commit() = undo ครั้งเดียว """
+        self.commit()
+        self._group = (label, ({}, {}))
+
+    def set(self, plane, y, x, value):
+        arr = self.planes[plane]
+        if arr[y, x] == value: return False
+        single = self._group is None
+        if single: self.begin("Wall")
+        self._group[1][plane].setdefault(y * arr.shape[1] + x, int(arr[y, x]))
+        arr[y, x] = value
+        self.version += 1
+        if single: self.commit()
+        return True
+
+    def toggle(self, plane, y, x):
+        arr = self.planes[plane]
+        self.set(plane, y, x, maze_model.OPEN if arr[y, x] == maze_model.WALL else maze_model.WALL)
+        return int(arr[y, x])
+
+    def commit(self):
+        if self._group is None: return None
+        label, olds = self._group
+        self._group = None
+        changes = []
+        for arr, old in zip(self.planes, olds):
+            idx = np.fromiter(old.keys(), dtype=np.int64, count=len(old))
+            before = np.fromiter(old.values(), dtype=np.uint8, count=len(old))
+            after = arr.take(idx)
+            keep = before != after # ลากกลับมาทับค่าเดิม = ไม่นับ
+            changes.append((idx[keep], before[keep], after[keep]))
+        return self._push(Patch(label, changes))
+
+    # --- แก้เป็นช่วง (สี่เหลี่ยม / paste / ทั้งแผนที่) ---
+    def write_blocks(self, label, blocks):
+        """ blocks: [(plane, y, x, array 2D)] ตัดส่วนที่เกินขอบทิ้ง -> diff เฉพาะในช่วงนั้น """
+        self.commit()
+        changes = [_empty_change(), _empty_change()]
+        for plane, y, x, block in blocks:
+            arr = self.planes[plane]
+            rows, cols = arr.shape
+            y0, x0 = max(y, 0), max(x, 0)
+            y1, x1 = min(y + block.shape[0], rows), min(x + block.shape[1], cols)
+            if y0 >= y1 or x0 >= x1: continue
+            target = arr[y0:y1, x0:x1]
+            source = np.asarray(block, dtype=np.uint8)[y0 - y:y1 - y, x0 - x:x1 - x]
+            ys, xs = np.nonzero(target != source)
+            if ys.size == 0: continue
+            idx = (ys + y0) * cols + (xs + x0)
+            old = target[ys, xs].copy()
+            new = source[ys, xs]
+            target[ys, xs] = new
+            prev = changes[plane]
+            changes[plane] = (np.concatenate([prev[0], idx]), np.concatenate([prev[1], old]), np.concatenate([prev[2], new]))
+        return self._push(Patch(label, changes))
+
+    def fill_rect(self, x0, y0, x1, y1, value=maze_model.WALL):
+        """ ช่อง (x0, y0)-(x1, y1): ทุกเส้นรวมขอบ = value """
+        (x0, x1), (y0, y1) = sorted((x0, x1)), sorted((y0, y1))
+        w, h = x1 - x0 + 1, y1 - y0 + 1
+        return self.write_blocks("Fill", [(0, y0, x0, np.full((h + 1, w), value, np.uint8)),
+                                          (1, y0, x0, np.full((h, w + 1), value, np.uint8))])
+
+    def clear_rect(self, x0, y0, x1, y1):
+        """ เปิดทุกเส้นภายในสี่เหลี่ยม (ขอบนอกคงเดิม) -> ห้องโล่ง """
+        (x0, x1), (y0, y1) = sorted((x0, x1)), sorted((y0, y1))
+        w, h = x1 - x0 + 1, y1 - y0 + 1
+        return self.write_blocks("Clear", [(0, y0 + 1, x0, np.full((h - 1, w), maze_model.OPEN, np.uint8)),
+                                           (1, y0, x0 + 1, np.full((h, w - 1), maze_model.OPEN, np.uint8))])
+
+    def copy(self, x0, y0, x1, y1):
+        """ clipboard = (h, v) ของช่วงช่อง รวมเส้นขอบ """
+        (x0, x1), (y0, y1) = sorted((x0, x1)), sorted((y0, y1))
+        h, v = self.planes
+        return h[y0:y1 + 2, x0:x1 + 1].copy(), v[y0:y1 + 1, x0:x1 + 2].copy()
+
+    def paste(self, clip, x, y):
+        """ วาง clipboard ให้มุมซ้ายบนอยู่ที่ช่อง (x, y) (เส้นที่ตกบนขอบนอกของแผนที่ = กำแพงเสมอ เหมือน Border) """
+        h_block, v_block = clip[0].copy(), clip[1].copy()
+        height, width = self.planes[1].shape[0], self.planes[0].shape[1]
+        h_block[[r for r in range(h_block.shape[0]) if y + r in (0, height)], :] = maze_model.WALL
+        v_block[:, [c for c in range(v_block.shape[1]) if x + c in (0, width)]] = maze_model.WALL
+        return self.write_blocks("Paste", [(0, y, x, h_block), (1, y, x, v_block)])
+
+    def replace(self, label, h_walls, v_walls):
+        """ แทนทั้งแผนที่ (Clear / Border / Generate) -> undo ได้เหมือนการแก้อื่น """
+        return self.write_blocks(label, [(0, 0, 0, np.asarray(h_walls)), (1, 0, 0, np.asarray(v_walls))])
+
+    # --- Undo / Redo ---
+    def undo(self):
+        self.commit()
+        if not self.undo_stack: return None
+        patch = self.undo_stack.pop()
+        self.redo_stack.append(patch)
+        self._applied(patch.apply(self.planes, undo=True))
+        return patch
+
+    def redo(self):
+        self.commit()
+        if not self.redo_stack: return None
+        patch = self.redo_stack.pop()
+        self.undo_stack.append(patch)
+        self._applied(patch.apply(self.planes))
+        return patch
+
+    def _push(self, patch):
+        if len(patch) == 0: return None
+        self.undo_stack.append(patch)
+        if len(self.undo_stack) > UNDO_LIMIT: del self.undo_stack[0]
+        self.redo_stack.clear()
+        self._applied([(idx, new) for idx, old, new in patch.changes])
+        return patch
+
+    def _applied(self, written):
+        self.version += 1
+        if self.log: self.log.append(written, self.planes)
+
+# --- 3. Autosave Log ---
+
+class OpLog:
+    def __init__(self, filename, compact_ops=COMPACT_OPS):
+        self.filename = filename
+        self.compact_ops = compact_ops
+        self.ops = 0           # จำนวน append ตั้งแต่ compact ล่าสุด
+        self._file = None
+
+    def load(self):
+        """ (h, v, จำนวน op ที่เล่นซ้ำ) จากไฟล์ หรือ None ถ้าไม่มี / อ่านไม่ได้ """
+        if not os.path.exists(self.filename): return None
+        with open(self.filename, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC: return None
+            head = f.read(HEADER.size)
+            if len(head) < HEADER.size: return None
+            version, width, height, base_len = HEADER.unpack(head)
+            if version != VERSION: return None
+            try:
+                base = zlib.decompress(f.read(base_len))
+            except zlib.error:
+                return None
+            h_size = (height + 1) * width
+            if len(base) != h_size + height * (width + 1): return None
+            h_walls = np.frombuffer(base[:h_size], dtype=np.uint8).reshape(height + 1, width).copy()
+            v_walls = np.frombuffer(base[h_size:], dtype=np.uint8).reshape(height, width + 1).copy()
+            count = 0
+            while True:
+                head = f.read(RECORD.size)
+                if len(head) < RECORD.size: break
+                plane, n = RECORD.unpack(head)
+                body = f.read(n * 5)
+                if len(body) < n * 5 or plane > 1: break
+                idx = np.frombuffer(body[:n * 4], dtype="<u4")
+                if n and idx.max() >= (h_walls, v_walls)[plane].size: break
+                np.put((h_walls, v_walls)[plane], idx, np.frombuffer(body[n * 4:], dtype=np.uint8))
+                count += 1
+        return h_walls, v_walls, count
+
+    def compact(self, planes):
+        """ เขียน base ใหม่ (ไฟล์ชั่วคราวแล้ว rename -> ไม่มีช่วงที่ไฟล์เสีย) แล้ว append ต่อจากนี้ """
+        h_walls, v_walls = (np.ascontiguousarray(p, dtype=np.uint8) for p in planes)
+        height, width = v_walls.shape[0], h_walls.shape[1]
+        base = zlib.compress(h_walls.tobytes() + v_walls.tobytes(), 1) # level 1: compact บนแผนที่ใหญ่ไม่กระตุก
+        self.close()
+        folder = os.path.dirname(self.filename)
+        if folder: os.makedirs(folder, exist_ok=True)
+        tmp = self.filename + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC + HEADER.pack(VERSION, width, height, len(base)) + base)
+        os.replace(tmp, self.filename)
+        self._file = open(self.filename, "ab")
+        self.ops = 0
+
+    def append(self, written, planes):
+        """ written: [(index, values)] ต่อ plane -> record ละ plane ที่มีค่าเปลี่ยน """
+        if self._file is None: return self.compact(planes)
+        for plane, (idx, values) in enumerate(written):
+            if len(idx) == 0: continue
+            self._file.write(RECORD.pack(plane, len(idx)) + np.asarray(idx, dtype="<u4").tobytes() +
+                             np.asarray(values, dtype=np.uint8).tobytes())
+        self._file.flush()
+        self.ops += 1
+        if self.ops >= self.compact_ops: self.compact(planes)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
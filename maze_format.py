@@ -0,0 +1,199 @@
+import csv
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+"""
+MAZE BINARY FORMAT (.mzb)
+ไฟล์เดียวแทน CSV 3 ไฟล์ (maze_grid / horizontal_walls / vertical_walls) -> ไม่มีทางที่ไฟล์จะไม่ตรงกัน
+
+Layout (little-endian):
+- Header 16 bytes : magic "MAZE" | version (u8) | flags (u8) | width (u16) | height (u16) | crc32 ของ payload (u32) | pad 2
+- Payload         : bit-plane 3 ชุด เรียงต่อกัน แต่ละชุดเริ่มที่ byte ใหม่ (bit ต่ำสุดก่อน)
+    1. h_walls  (H+1) x W   bit 1 = กำแพง
+    2. v_walls  H x (W+1)   bit 1 = กำแพง
+    3. grid     H x W       bit 1 = ช่องที่ไม่ใช่ 2
+เปิดด้วย mmap -> อ่าน bit ได้ตรงจากไฟล์ ไม่ต้อง parse ทั้งไฟล์
+
+CLI:
+    python maze_format.py import [out.mzb]    (CSV 3 ไฟล์ -> .mzb)
+    python maze_format.py export [in.mzb]     (.mzb -> CSV 3 ไฟล์)
+"""
+
+MAGIC = b"MAZE"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHHI2x")
+
+FILE_MAZE_BIN = "maze.mzb"
+FILE_GRID = "maze_grid.csv"
+FILE_H_WALLS = "horizontal_walls.csv"
+FILE_V_WALLS = "vertical_walls.csv"
+
+WALL = 1
+OPEN = 2
+
+# byte -> ค่า 8 ช่อง (1 = กำแพง, 2 = ว่าง) ใช้ตอนแตก bit เป็น list
+_UNPACK_TABLE = [tuple(WALL if (b >> i) & 1 else OPEN for i in range(8)) for b in range(256)]
+
+# --- 1. Pack / Unpack ---
+
+def _plane_bytes(rows, cols):
+    return (rows * cols + 7) // 8
+
+def pack_plane(grid):
+    """ list 2D (1/2) -> bytes (bit 1 = ค่าไม่ใช่ 2) """
+    out = bytearray()
+    acc = 0
+    n = 0
+    for row in grid:
+        for value in row:
+            if value != OPEN: acc |= 1 << n
+            n += 1
+            if n == 8:
+                out.append(acc)
+                acc = 0; n = 0
+    if n: out.append(acc)
+    return bytes(out)
+
+def unpack_plane(buf, rows, cols):
+    """ bytes / memoryview -> list 2D (1/2) """
+    flat = []
+    for b in buf: flat.extend(_UNPACK_TABLE[b])
+    return [flat[r * cols:(r + 1) * cols] for r in range(rows)]
+
+# --- 2. Save ---
+
+def save_maze_bin(filename, h_walls, v_walls, grid=None, pack=pack_plane):
+    """
+    เขียน .mzb (header + h / v / grid) -- writer ตัวเดียวของไฟล์นี้
+    pack : ฟังก์ชัน plane -> bytes (maze_model ส่ง np.packbits มาแทน loop ของ list)
+    เขียนลง .tmp ก่อนแล้วค่อย os.replace -> ถ้าเซฟค้างกลางทาง ไฟล์เดิมไม่เสีย
+    (load_maze เลือก .mzb ทุกครั้งที่ใหม่กว่า CSV ไฟล์ที่ขาดครึ่งจะถูกเลือกแทน CSV ที่ถูกต้อง)
+    """
+    height = len(v_walls)
+    width = len(h_walls[0])
+    if grid is None: grid = [[OPEN] * width for _ in range(height)]
+    payload = pack(h_walls) + pack(v_walls) + pack(grid)
+    header = HEADER.pack(MAGIC, VERSION, 0, width, height, zlib.crc32(payload))
+    tmp = filename + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(header)
+            f.write(payload)
+        os.replace(tmp, filename)
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+
+# --- 3. Load (mmap) ---
+
+class MazeFile:
+    """
+    เปิดไฟล์ .mzb แบบ mmap (read-only)
+    - h_wall / v_wall : อ่าน bit ตรงจาก mmap (zero-copy)
+    - plane()         : memoryview ของ bit-plane (ส่งต่อให้ numpy ได้โดยไม่ copy)
+    - to_lists()      : แปลงเป็น list แบบเดียวกับ load_csv
+    """
+    def __init__(self, filename, verify=True):
+        self._file = open(filename, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"'{filename}' is empty")
+        self.view = memoryview(self._map)
+        try:
+            self._read_header(filename, verify)
+        except Exception:
+            self.close()
+            raise
+
+    def _read_header(self, filename, verify):
+        if len(self.view) < HEADER.size: raise ValueError(f"'{filename}' is too short")
+        magic, version, _, self.width, self.height, crc = HEADER.unpack_from(self.view)
+        if magic != MAGIC: raise ValueError(f"'{filename}' is not a maze file")
+        if version != VERSION: raise ValueError(f"Unsupported maze file version {version}")
+        w, h = self.width, self.height
+        self._shapes = {"h": (h + 1, w), "v": (h, w + 1), "grid": (h, w)}
+        self._offsets = {}
+        offset = HEADER.size
+        for name in ("h", "v", "grid"):
+            self._offsets[name] = offset
+            offset += _plane_bytes(*self._shapes[name])
+        if len(self.view) < offset: raise ValueError(f"'{filename}' is truncated")
+        if verify and zlib.crc32(self.view[HEADER.size:offset]) != crc:
+            raise ValueError(f"'{filename}' checksum mismatch")
+
+    def close(self):
+        self.view.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def shape(self, name):
+        return self._shapes[name]
+
+    def plane(self, name):
+        rows, cols = self._shapes[name]
+        start = self._offsets[name]
+        return self.view[start:start + _plane_bytes(rows, cols)]
+
+    def _bit(self, name, row, col):
+        idx = row * self._shapes[name][1] + col
+        return (self.view[self._offsets[name] + (idx >> 3)] >> (idx & 7)) & 1
+
+    def h_wall(self, x, y):
+        return WALL if self._bit("h", y, x) else OPEN
+
+    def v_wall(self, x, y):
+        return WALL if self._bit("v", y, x) else OPEN
+
+    def planes(self, unpack=unpack_plane):
+        """ คืนค่า (grid, h_walls, v_walls) แตกด้วย unpack(buf, rows, cols) """
+        return tuple(unpack(self.plane(name), *self._shapes[name]) for name in ("grid", "h", "v"))
+
+    def to_lists(self):
+        """ คืนค่า (grid, h_walls, v_walls) เป็น list """
+        return self.planes()
+
+def load_maze_bin(filename, unpack=unpack_plane):
+    with MazeFile(filename) as maze:
+        return maze.planes(unpack)
+
+# --- 4. CSV Import / Export (ใช้ร่วมกับไฟล์เดิม) ---
+
+def read_csv(filename):
+    with open(filename, "r") as f:
+        return [[int(cell) for cell in row] for row in csv.reader(f)]
+
+def write_csv(filename, rows):
+    with open(filename, "w", newline="") as f:
+        csv.writer(f).writerows(rows)
+
+def csv_to_bin(out_file=FILE_MAZE_BIN, grid_file=FILE_GRID, h_file=FILE_H_WALLS, v_file=FILE_V_WALLS):
+    save_maze_bin(out_file, read_csv(h_file), read_csv(v_file), read_csv(grid_file))
+
+def bin_to_csv(in_file=FILE_MAZE_BIN, grid_file=FILE_GRID, h_file=FILE_H_WALLS, v_file=FILE_V_WALLS):
+    grid, h_walls, v_walls = load_maze_bin(in_file)
+    write_csv(grid_file, grid)
+    write_csv(h_file, h_walls)
+    write_csv(v_file, v_walls)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python maze_format.py import|export [file.mzb]")
+        sys.exit(1)
+    target = sys.argv[2] if len(sys.argv) > 2 else FILE_MAZE_BIN
+    if sys.argv[1] == "import":
+        csv_to_bin(target)
+        print(f">>> CSV -> {target}")
+    else:
+        bin_to_csv(target)
+        print(f">>> {target} -> CSV")
@@ -1,10 +1,25 @@
+import argparse
 import threading
-import pygame
 import time
-import paho.mqtt.client as mqtt
 import json
 import csv
 import os
+import numpy as np
+import maze_model
+from maze_core import set_wall_mask
+from maze_planner import DStarLite, flood_fill_direction
+from sensor_buffer import SensorRing
+from lidar_filter import LidarFilter
+from mqtt_transport import MqttTransport, Message
+import wire_format
+import session_log
+import ui_render
+from latency_trace import LatencyTracer
+
+try:
+    import pygame
+except ImportError:
+    pygame = None # โหมด replay แบบ headless ไม่ต้องใช้ pygame
 
 """
 MAZE MASTER CONTROL SYSTEM
@@ -18,6 +33,7 @@ Updates:
 # --- 1. MQTT Settings ---
 MQTT_BROKER_IP = "broker.hivemq.com"
 MQTT_PORT = 1883
+TOPIC_PREFIX = ""         # เช่น "sim1/" -> คุยกับ maze_sim --instances ตัวที่ 1 (ตั้งด้วย --prefix)
 
 # Topics
 TOPIC_LIDAR_DATA = "robot/lidar_data1"       
@@ -26,11 +42,37 @@ TOPIC_ARUCO_DATA = "robot/tracking_data"
 TOPIC_ARUCO_STATE = "robot/state"           
 TOPIC_ROBOT_COMMAND = "robot/mecanum_command1" 
 TOPIC_PID_TUNE = "robot/pid_tune"
+TOPIC_WIRE_CAPS = "robot/wire_caps"        # ประกาศว่าแต่ละฝั่งอ่าน binary ได้ที่ topic ไหน
+
+# Payload: "json" (แบบเดิม) | "binary" (struct) | "auto" (binary เฉพาะ topic ที่หุ่นประกาศว่ารองรับ)
+# ฝั่งรับ decode ได้ทั้ง 2 แบบเสมอ
+WIRE_MODE = "auto"
+
+# Session Log: บันทึก sensor ทุกข้อความลง sessions/*.mzlog (เล่นซ้ำด้วย replay_sessions.py)
+RECORD_SESSION = True
+
+# Latency Trace: "off" | "light" (histogram อย่างเดียว เปิดไว้ตอนแข่งได้) | "full" (+ ค่าดิบสำหรับ export)
+# rx_handler : MQTT -> on_message (parse + ใส่ ring)      ring_wait : เข้า ring -> control loop ดึงไปใช้
+# filter     : กรอง lidar + สะสมหลักฐานกำแพง              decide    : decide_next_action
+# sample_to_cmd : lidar ล่าสุด -> publish คำสั่ง            tx_queue  : publish -> ส่งออก/ได้ ack จาก broker
+# (เวลาใน broker / บนหุ่น วัดไม่ได้จนกว่า packet จะมีเวลาจากหุ่นมาด้วย)
+TRACE_MODE = "light"
+TRACE_STAGES = ("rx_handler", "ring_wait", "filter", "decide", "sample_to_cmd", "tx_queue")
+
+# QoS: คำสั่งความเร็วส่งถี่ -> QoS 0 + coalesce (ค้างคิวเหลืออันล่าสุด) | STOP / PID ต้องถึง -> QoS 1
+QOS_SENSOR = 0
+QOS_COMMAND = 0
+QOS_RELIABLE = 1
+
+# Reference Maze (ไฟล์จาก genmap) -> ใช้เทียบความถูกต้องของแผนที่ [R]
+FILE_REF_H_WALLS = "horizontal_walls.csv"
+FILE_REF_V_WALLS = "vertical_walls.csv"
 
 # --- 2. Map Settings ---
 MAZE_WIDTH = 8
 MAZE_HEIGHT = 8
 CELL_SIZE = 70 
+GOAL_CELL = (MAZE_WIDTH // 2, MAZE_HEIGHT // 2) # เป้าหมายของ Planner
 
 # UI Colors
 C_BG = (30, 30, 30)
@@ -51,9 +93,9 @@ C_STATE_NORMAL = (200, 200, 200)
 C_STATE_CHECK = (255, 200, 0) 
 C_MANUAL_MODE = (0, 255, 255)
 C_OFFSET_TEXT = (100, 255, 100)
+C_PLAN = (0, 180, 0)
 
 # --- 3. Global Variables ---
-data_lock = threading.Lock()
 running = True
 
 # Sensor Data
@@ -62,6 +104,22 @@ current_yaw = 0.0
 aruco_state = "WAITING..." 
 
 LIDAR_SMOOTH_ALPHA = 0.4
+LIDAR_FILTER = "ema"      # "ema" | "median" | "kalman" (ดู lidar_filter.py)
+
+# Sensor Ring Buffers (MQTT thread เขียน / Control loop อ่าน -> ไม่ต้องใช้ Lock)
+SENSOR_RING_SIZE = 1024   # ~10 วินาทีที่ 100 Hz
+lidar_ring = SensorRing(("F", "L", "R", "B"), SENSOR_RING_SIZE)
+yaw_ring = SensorRing(("yaw",), SENSOR_RING_SIZE)
+aruco_ring = SensorRing(("grid_x", "grid_y"), SENSOR_RING_SIZE)
+lidar_seq = 0             # seq ล่าสุดที่ control loop อ่านแล้ว
+recorder = None           # SessionRecorder ตอนรันจริง (None = ไม่บันทึก)
+tracer = LatencyTracer(TRACE_MODE, TRACE_STAGES)
+last_lidar_rx = 0.0       # เวลาที่ lidar sample ล่าสุดที่ใช้ไปแล้วเข้ามา (time.time)
+get_time = time.time      # นาฬิกาของ wall timer (ตอน replay ใช้เวลาใน log แทน)
+lidar_filter = LidarFilter(LIDAR_FILTER, alpha=LIDAR_SMOOTH_ALPHA)
+lidar_variance = {"F": float("nan"), "L": float("nan"), "R": float("nan"), "B": float("nan")}
+# yaw ไม่อยู่ในรายการ: text ("91.25" = 5 bytes) เล็กกว่า binary (6 bytes) และ float() decode เร็วกว่า struct
+wire = wire_format.WireNegotiator("mapper", [TOPIC_LIDAR_DATA, TOPIC_ARUCO_DATA], WIRE_MODE)
 
 # Lidar Offsets
 lidar_offset_l = 0.0
@@ -73,15 +131,38 @@ robot_y = 0
 robot_dir = 2 
 
 # Map Data
-map_h_walls = [[0 for _ in range(MAZE_WIDTH)] for _ in range(MAZE_HEIGHT + 1)]
-map_v_walls = [[0 for _ in range(MAZE_WIDTH + 1)] for _ in range(MAZE_HEIGHT)]
+map_h_walls, map_v_walls = maze_model.empty_walls(MAZE_WIDTH, MAZE_HEIGHT, fill=maze_model.UNKNOWN) # numpy uint8
+map_masks = maze_model.to_mask_array(maze_model.open_masks(map_h_walls, map_v_walls, optimistic=True)) # N/E/S/W open-mask (0 = ยังไม่รู้ -> ถือว่าเปิด)
+diff_msg = "DIFF: -"
+
+# Wall Evidence (log-odds ต่อขอบ: + = กำแพง / - = ทางเปิด / 0 = ยังไม่รู้) -> map_h/v_walls คือ view ที่ผ่าน threshold แล้ว
+LOGODDS_HIT = 0.4         # ต่อ sample ที่ระยะ < WALL_THRESHOLD
+LOGODDS_MISS = -0.4       # ต่อ sample ที่ระยะ >= WALL_THRESHOLD
+LOGODDS_KNOWN = 2.0       # |log-odds| ถึงค่านี้ -> เป็น WALL / OPEN ในแผนที่ (ค่าผิดครั้งเดียวไม่พอ)
+LOGODDS_MAX = 4.0         # clamp ไว้ -> หลักฐานใหม่ยังกลับค่าได้
+EVIDENCE_YAW_TOL = 15.0   # เก็บหลักฐานเฉพาะตอนหันตรงแกน (องศา)
+map_h_evidence = np.zeros(map_h_walls.shape, dtype=np.float32)
+map_v_evidence = np.zeros(map_v_walls.shape, dtype=np.float32)
+
+# Incremental Planner (D* Lite) -> เก็บ state ไว้ข้ามการอัปเดตกำแพง
+planner = DStarLite(map_masks, MAZE_WIDTH, MAZE_HEIGHT, (robot_x, robot_y), GOAL_CELL)
+planner.compute()
+planned_path = planner.path()
 
 # Logic Variables
 WALL_THRESHOLD = 900      
 WALL_TIME_TH = 1.5        
+WALL_MIN_TIME = 0.2       # ถ้า variance ต่ำ + ระยะต่ำกว่า threshold ชัดเจน ยืนยันได้หลังเวลานี้ (ไม่ต้องรอ WALL_TIME_TH)
 wall_start_times = {"F": 0, "L": 0, "R": 0, "B": 0} 
 walls_confirmed = {"F": False, "L": False, "R": False, "B": False} 
 last_plotted_pos = (-1, -1) 
+visited_cells = set()     # ช่องที่ plot กำแพงแล้ว (= สำรวจแล้ว)
+
+# Exploration Mode
+# WALL_FOLLOW : เกาะกำแพงขวา (แบบเดิม)
+# FLOOD_FILL  : ไปหาช่องที่ยังไม่สำรวจที่ใกล้ที่สุด (ครบแล้วไป GOAL_CELL)
+EXPLORE_MODES = ["WALL_FOLLOW", "FLOOD_FILL"]
+explore_mode = "WALL_FOLLOW"
 
 # State Machine
 controller_state = "IDLE" 
@@ -89,6 +170,19 @@ proposed_action = "NONE"
 target_heading = 0.0      
 logic_reason_idx = -1 
 
+# Control Loop (thread แยกจาก pygame -> ความถี่คงที่ ไม่ขึ้นกับ frame rate ของหน้าจอ)
+CONTROL_HZ = 100          # ปรับได้ 50-200
+CONTROL_HZ_MIN, CONTROL_HZ_MAX = 50, 200
+EXEC_TIMEOUT = 1.5        # ทำ action นานเท่านี้แล้วหยุดคิดใหม่
+SETTLE_TIME = 0.2         # รอหุ่นนิ่งหลังหยุด (แทน time.sleep ที่ทำให้ loop ค้าง)
+MANUAL_SEND_PERIOD = 0.1
+control_lock = threading.Lock()   # UI (event) กับ control loop แก้ state สลับกัน
+start_exec_time = 0
+settle_until = 0
+last_manual_send = 0
+last_pid_val = None
+ui_snapshot = None        # state ล่าสุดที่ control loop ส่งให้หน้าจอวาด
+
 # Manual Control Vars
 manual_vx = 0.0
 manual_vy = 0.0
@@ -118,50 +212,24 @@ center_pid = PIDController(kp=0.0015, ki=0.0, kd=0.0005, max_out=0.5)
 
 # --- 4. MQTT Functions ---
 
-def on_mqtt_connect(client, userdata, flags, rc, properties=None):
-    if rc == 0:
-        print(f"Connected to MQTT ({MQTT_BROKER_IP})")
-        client.subscribe(TOPIC_LIDAR_DATA)
-        client.subscribe(TOPIC_ANGLE_DATA)
-        client.subscribe(TOPIC_ARUCO_DATA)
-        client.subscribe(TOPIC_ARUCO_STATE)
-    else:
-        print(f"Failed to connect rc={rc}")
-
-def on_message(client, userdata, msg):
-    global current_lidar, current_yaw, robot_x, robot_y, robot_dir, aruco_state
+def on_message(msg):
+    """
+    (MQTT transport thread) แค่ parse แล้วใส่ ring buffer -> ไม่แตะ state ของ UI / ไม่ต้องรอ lock
+    เวลาของ sample = get_time() -> รันจริงคือ time.time, ตอน replay คือเวลาของ record ใน session log
+    """
+    global aruco_state
+    if recorder is not None: recorder.record(msg.topic, msg.payload)
+    t = get_time()
     
     try:
         if msg.topic == TOPIC_LIDAR_DATA:
-            data = json.loads(msg.payload.decode("utf-8"))
-            
-            with data_lock:
-                raw_f = float(data.get("F", 2000))
-                raw_l = float(data.get("L", 2000)) + lidar_offset_l
-                raw_r = float(data.get("R", 2000)) + lidar_offset_r
-                raw_b = float(data.get("B", 2000))
-            
-                alpha = LIDAR_SMOOTH_ALPHA
-                current_lidar["F"] = (current_lidar["F"] * (1.0 - alpha)) + (raw_f * alpha)
-                current_lidar["L"] = (current_lidar["L"] * (1.0 - alpha)) + (raw_l * alpha)
-                current_lidar["R"] = (current_lidar["R"] * (1.0 - alpha)) + (raw_r * alpha)
-                current_lidar["B"] = (current_lidar["B"] * (1.0 - alpha)) + (raw_b * alpha)
+            lidar_ring.push(wire_format.decode_lidar(msg.payload), t=t)
                 
         elif msg.topic == TOPIC_ANGLE_DATA:
-            val = float(msg.payload.decode("utf-8"))
-            with data_lock:
-                current_yaw = val
-                yaw = current_yaw % 360
-                if yaw >= 315 or yaw < 45: robot_dir = 2 
-                elif 45 <= yaw < 135: robot_dir = 1      
-                elif 135 <= yaw < 225: robot_dir = 0     
-                elif 225 <= yaw < 315: robot_dir = 3     
+            yaw_ring.push((wire_format.decode_yaw(msg.payload),), t=t)
                 
         elif msg.topic == TOPIC_ARUCO_DATA:
-            data = json.loads(msg.payload.decode("utf-8"))
-            with data_lock:
-                robot_x = data.get("grid_x", robot_x)
-                robot_y = data.get("grid_y", robot_y)
+            aruco_ring.push(wire_format.decode_aruco(msg.payload), t=t)
         
         elif msg.topic == TOPIC_ARUCO_STATE:
             aruco_state = msg.payload.decode("utf-8")
@@ -169,61 +237,159 @@ def on_message(client, userdata, msg):
     except Exception as e:
         pass
 
+def yaw_to_dir(yaw):
+    yaw = yaw % 360
+    if yaw >= 315 or yaw < 45: return 2 
+    elif 45 <= yaw < 135: return 1      
+    elif 135 <= yaw < 225: return 0     
+    else: return 3     
+
+def consume_sensor_samples():
+    """
+    (Control loop) ดึงทุก sample ใหม่จาก ring buffer แล้วอัปเดต state ในครั้งเดียว
+    Lidar: ส่งทุก sample ใหม่เข้า lidar_filter เป็น batch เดียว (ไม่ทิ้ง sample แม้ lidar เร็วกว่า loop)
+    """
+    global lidar_seq, current_yaw, robot_dir, robot_x, robot_y, last_lidar_rx
+    yaw = yaw_ring.latest()
+    if yaw is not None:
+        current_yaw = yaw[1]
+        robot_dir = yaw_to_dir(current_yaw)
+
+    pos = aruco_ring.latest()
+    if pos is not None:
+        if pos[1] == pos[1]: robot_x = int(pos[1]) # NaN = ไม่มีค่าใน packet
+        if pos[2] == pos[2]: robot_y = int(pos[2])
+
+    lidar_seq, samples = lidar_ring.read_since(lidar_seq)
+    if samples:
+        t0 = time.perf_counter()
+        rows = np.array(samples)
+        last_lidar_rx = float(rows[-1, 0])
+        tracer.record_many("ring_wait", (get_time() - rows[:, 0]) * 1000)
+        batch = rows[:, 1:] # ตัดคอลัมน์เวลา -> F, L, R, B
+        batch[:, 1] += lidar_offset_l
+        batch[:, 2] += lidar_offset_r
+        lidar_filter.alpha = LIDAR_SMOOTH_ALPHA
+        lidar_filter.process(batch)
+        current_lidar.update(lidar_filter.as_dict())
+        lidar_variance.update(zip(("F", "L", "R", "B"), lidar_filter.variance().tolist()))
+        accumulate_wall_evidence(batch, lidar_filter.valid)
+        tracer.record("filter", (time.perf_counter() - t0) * 1000)
+
+def trace_transport(direction, topic, ms):
+    """ (MQTT transport thread) latency จาก transport -> tracer """
+    if direction == "rx" and topic == TOPIC_LIDAR_DATA: tracer.record("rx_handler", ms)
+    elif direction == "tx" and topic == TOPIC_ROBOT_COMMAND: tracer.record("tx_queue", ms)
+
 def send_pid_update(client):
     payload = { "kp": h_pid_kp, "ki": h_pid_ki, "kd": h_pid_kd, "db": 2.0 }
-    client.publish(TOPIC_PID_TUNE, json.dumps(payload))
+    client.publish(TOPIC_PID_TUNE, json.dumps(payload), qos=QOS_RELIABLE)
     print(f"PID Sent: P{h_pid_kp:.3f} I{h_pid_ki:.3f} D{h_pid_kd:.3f}")
 
-def mqtt_client_loop(client):
-    client.on_connect = on_mqtt_connect
-    client.on_message = on_message
-    client.connect(MQTT_BROKER_IP, MQTT_PORT, 60)
-    client.loop_forever()
+def mqtt_connect():
+    """ transport ที่ subscribe sensor ทุก topic แล้ว (ต่อใหม่ / subscribe ใหม่เองถ้าหลุด) """
+    client = MqttTransport(MQTT_BROKER_IP, MQTT_PORT, prefix=TOPIC_PREFIX)
+    client.on_latency = trace_transport
+    for topic in (TOPIC_LIDAR_DATA, TOPIC_ANGLE_DATA, TOPIC_ARUCO_DATA, TOPIC_ARUCO_STATE):
+        client.subscribe(topic, on_message, qos=QOS_SENSOR)
+
+    def on_wire_caps(msg):
+        # เจอหุ่นตัวใหม่ -> ตอบ caps ของเรากลับ (หุ่นที่เปิดทีหลังก็ได้รู้)
+        if wire.on_caps(msg.payload): client.publish(TOPIC_WIRE_CAPS, wire.caps_payload(), qos=QOS_RELIABLE)
+    client.subscribe(TOPIC_WIRE_CAPS, on_wire_caps, qos=QOS_RELIABLE)
+    client.publish(TOPIC_WIRE_CAPS, wire.caps_payload(), qos=QOS_RELIABLE)
+    return client.start()
 
 # --- 5. Logic & Functions ---
 
 def update_wall_timers():
     global wall_start_times, walls_confirmed
-    now = time.time()
-    directions = ["F", "L", "R"] 
-    for d in directions:
+    now = get_time()
+    for i, d in ((0, "F"), (1, "L"), (2, "R")):
         dist = current_lidar[d]
         if dist < WALL_THRESHOLD:
             if wall_start_times[d] == 0: wall_start_times[d] = now
-            if (now - wall_start_times[d]) >= WALL_TIME_TH: walls_confirmed[d] = True
-            else: walls_confirmed[d] = False
+            held = now - wall_start_times[d]
+            # ครบเวลา หรือ ค่าในหน้าต่างนิ่งและต่ำกว่า threshold อย่างมีนัยสำคัญ
+            walls_confirmed[d] = held >= WALL_TIME_TH or (held >= WALL_MIN_TIME and lidar_filter.confident_below(i, WALL_THRESHOLD))
         else:
             wall_start_times[d] = 0
             walls_confirmed[d] = False
     walls_confirmed["B"] = False; wall_start_times["B"] = 0
 
-def plot_current_walls():
-    global map_h_walls, map_v_walls, last_plotted_pos
+def edge_index(rx, ry, d):
+    """ ขอบด้าน d (0:N 1:E 2:S 3:W) ของช่อง (rx, ry) -> ("h" | "v", y, x) """
+    if d == 0: return "h", ry, rx
+    if d == 1: return "v", ry, rx + 1
+    if d == 2: return "h", ry + 1, rx
+    return "v", ry, rx
+
+def evidence_to_wall(value):
+    if value >= LOGODDS_KNOWN: return maze_model.WALL
+    if value <= -LOGODDS_KNOWN: return maze_model.OPEN
+    return maze_model.UNKNOWN
+
+def add_wall_evidence(rx, ry, deltas, force=False):
+    """
+    deltas: {ทิศ d: log-odds} ของช่อง (rx, ry) (force = ตั้งค่าแทนการบวก)
+    อัปเดต view (map_h/v_walls + mask) เฉพาะขอบที่ข้าม threshold แล้ว replan ครั้งเดียว
+    """
+    changed = False
+    for d, delta in deltas.items():
+        kind, y, x = edge_index(rx, ry, d)
+        evidence, walls = (map_h_evidence, map_h_walls) if kind == "h" else (map_v_evidence, map_v_walls)
+        evidence[y, x] = delta if force else min(max(float(evidence[y, x]) + delta, -LOGODDS_MAX), LOGODDS_MAX)
+        value = evidence_to_wall(evidence[y, x])
+        if value != walls[y, x]:
+            walls[y, x] = value
+            set_wall_mask(map_masks, MAZE_WIDTH, MAZE_HEIGHT, rx, ry, d, value != maze_model.WALL)
+            changed = True
+    if changed: replan_after_walls(rx, ry)
+    return changed
+
+def accumulate_wall_evidence(batch, valid):
+    """
+    (ทุก batch ของ lidar) ตอนหุ่นอยู่ในช่อง (ArUco STOP/CHECK) และหันตรงแกน
+    นับ sample ที่ใกล้/ไกลกว่า WALL_THRESHOLD ต่อทิศ F/L/R -> บวกเป็น log-odds ของขอบนั้น
+    """
+    if aruco_state not in ("STOP", "CHECK"): return
+    if abs((current_yaw - snap_heading(current_yaw) + 180) % 360 - 180) > EVIDENCE_YAW_TOL: return
+    if not (0 <= robot_x < MAZE_WIDTH and 0 <= robot_y < MAZE_HEIGHT): return
+    near = ((batch < WALL_THRESHOLD) & valid).sum(axis=0)
+    far = ((batch >= WALL_THRESHOLD) & valid).sum(axis=0)
+    score = (near * LOGODDS_HIT + far * LOGODDS_MISS).tolist()
+    rdir = robot_dir
+    add_wall_evidence(robot_x, robot_y, {rdir: score[0], (rdir + 3) % 4: score[1], (rdir + 1) % 4: score[2]})
+
+def plot_current_walls(manual=True):
+    """
+    manual (ปุ่ม P): ยืนยันกำแพง F/R/L ตามค่าที่กรองแล้ว (log-odds เต็ม แต่หลักฐานใหม่ยังแก้ได้)
+    auto (ถึงช่องใหม่): กำแพงมาจาก accumulate_wall_evidence -> แค่นับว่าสำรวจแล้ว + replan
+    """
+    global last_plotted_pos
     rx, ry, rdir = robot_x, robot_y, robot_dir
-    dirs = ["Top", "Right", "Bottom", "Left"] 
-    f_idx, r_idx = rdir, (rdir + 1) % 4
-    b_idx, l_idx = (rdir + 2) % 4, (rdir + 3) % 4
-    
-    walls = {"Top": False, "Right": False, "Bottom": False, "Left": False}
-    if current_lidar["F"] < WALL_THRESHOLD: walls[dirs[f_idx]] = True
-    if current_lidar["R"] < WALL_THRESHOLD: walls[dirs[r_idx]] = True
-    if current_lidar["L"] < WALL_THRESHOLD: walls[dirs[l_idx]] = True
-    
-    if walls["Top"]: map_h_walls[ry][rx] = 1
-    if walls["Bottom"]: map_h_walls[ry + 1][rx] = 1
-    if walls["Left"]: map_v_walls[ry][rx] = 1
-    if walls["Right"]: map_v_walls[ry][rx + 1] = 1
+    if manual:
+        side = lambda key: LOGODDS_MAX if current_lidar[key] < WALL_THRESHOLD else -LOGODDS_MAX
+        add_wall_evidence(rx, ry, {rdir: side("F"), (rdir + 1) % 4: side("R"), (rdir + 3) % 4: side("L")}, force=True)
+    replan_after_walls(rx, ry)
+    visited_cells.add((rx, ry))
     
     last_plotted_pos = (rx, ry)
-    print(f"Auto-Plotted walls at ({rx},{ry})")
+    print(f"{'Plotted' if manual else 'Auto-Plotted'} walls at ({rx},{ry})")
 
 def clear_current_cell_walls():
-    global map_h_walls, map_v_walls
     rx, ry = robot_x, robot_y
-    map_h_walls[ry][rx] = 0; map_h_walls[ry + 1][rx] = 0
-    map_v_walls[ry][rx] = 0; map_v_walls[ry][rx + 1] = 0
+    add_wall_evidence(rx, ry, {d: 0.0 for d in range(4)}, force=True) # กลับเป็นยังไม่รู้ (เก็บหลักฐานใหม่)
     print(f"Cleared walls at ({rx},{ry})")
 
+def replan_after_walls(rx, ry):
+    """ ซ่อมแผนไป GOAL_CELL เฉพาะส่วนที่กำแพงรอบช่อง (rx, ry) เปลี่ยน """
+    global planned_path
+    planner.move_start((robot_x, robot_y))
+    planner.update_cells([(rx, ry)])
+    planner.compute()
+    planned_path = planner.path()
+
 def save_map_to_csv():
     try:
         with open("map_horizontal.csv", "w", newline="") as f:
@@ -233,10 +399,39 @@ def save_map_to_csv():
         print("Map Saved.")
     except Exception as e: print(f"Error: {e}")
 
+def export_latency():
+    """ histogram latency ทุก stage -> sessions/latency_*.json """
+    try:
+        os.makedirs(session_log.SESSION_DIR, exist_ok=True)
+        filename = tracer.export(os.path.join(session_log.SESSION_DIR, time.strftime("latency_%Y%m%d_%H%M%S.json")))
+        print(f"Latency exported -> {filename}")
+    except Exception as e: print(f"Error: {e}")
+
+def latency_rows():
+    """ แถวตาราง p50/p95/p99 (ms) สำหรับหน้าจอ """
+    rows = [f"{'stage':<14}{'p50':>8}{'p95':>8}{'p99':>8}{'n':>8}"]
+    for stage, st in tracer.summary().items():
+        rows.append(f"{stage:<14}{st['p50']:>8.2f}{st['p95']:>8.2f}{st['p99']:>8.2f}{st['count']:>8}")
+    return tuple(rows)
+
+def diff_with_reference():
+    """ เทียบแผนที่ที่สร้างกับ maze อ้างอิง (นับกำแพงที่ขาด / เกิน) """
+    global diff_msg
+    try:
+        ref_h = maze_model.load_walls_csv(FILE_REF_H_WALLS)
+        ref_v = maze_model.load_walls_csv(FILE_REF_V_WALLS)
+        missing, phantom = maze_model.diff_summary(maze_model.wall_diff(map_h_walls, map_v_walls, ref_h, ref_v))
+        diff_msg = f"DIFF: missing {missing} | phantom {phantom}"
+    except Exception as e:
+        diff_msg = "DIFF: no reference"
+        print(f"Error: {e}")
+    print(diff_msg)
+
 def snap_heading(yaw):
     return round(yaw / 90) * 90 % 360
 
 def decide_next_action():
+    if explore_mode == "FLOOD_FILL": return decide_flood_fill()
     if current_lidar["F"] < 250: return "STOP", current_yaw, 0
     
     is_wall_f = walls_confirmed["F"]
@@ -252,6 +447,33 @@ def decide_next_action():
     elif not is_wall_l: return "ROTATE_LEFT", (current_snap + 90) % 360, 3
     else: return "U-TURN", (current_snap + 180) % 360, 4 
 
+def decide_flood_fill():
+    """
+    Flood Fill บนแผนที่ที่รู้แล้ว (กำแพงที่ยังไม่รู้ = เปิด)
+    กำแพงที่ sensor ยืนยันตอนนี้ถือว่าปิดด้วย แม้ยังไม่ได้ plot
+    """
+    if current_lidar["F"] < 250: return "STOP", current_yaw, 0
+    current_snap = snap_heading(current_yaw)
+    rx, ry, rdir = robot_x, robot_y, robot_dir
+
+    targets = [(x, y) for y in range(MAZE_HEIGHT) for x in range(MAZE_WIDTH) if (x, y) not in visited_cells]
+    if not targets:
+        if (rx, ry) == GOAL_CELL: return "STOP", current_snap, 5
+        targets = [GOAL_CELL]
+
+    blocked = []
+    if walls_confirmed["F"]: blocked.append(rdir)
+    if walls_confirmed["R"]: blocked.append((rdir + 1) % 4)
+    if walls_confirmed["L"]: blocked.append((rdir + 3) % 4)
+    best_dir, _ = flood_fill_direction(map_masks, MAZE_WIDTH, MAZE_HEIGHT, (rx, ry), rdir, targets, blocked)
+    if best_dir is None: return "STOP", current_snap, 5
+
+    rel = (best_dir - rdir) % 4
+    if rel == 0: return "FORWARD", current_snap, 1
+    elif rel == 1: return "ROTATE_RIGHT", (current_snap - 90) % 360, 2
+    elif rel == 3: return "ROTATE_LEFT", (current_snap + 90) % 360, 3
+    else: return "U-TURN", (current_snap + 180) % 360, 4
+
 def send_auto_command(client):
     global proposed_action, target_heading, controller_state
     if controller_state != "EXECUTING": return
@@ -272,15 +494,181 @@ def send_auto_command(client):
     elif "ROTATE" in proposed_action or "U-TURN" in proposed_action: 
         vy = 0; vx = 0 
         
-    cmd_data = {"vx": vx, "vy": vy, "target_yaw": target_heading}
-    client.publish(TOPIC_ROBOT_COMMAND, json.dumps(cmd_data))
+    payload = wire_format.encode_command(vx, vy, target_yaw=target_heading, binary=wire.binary_for(TOPIC_ROBOT_COMMAND))
+    client.publish(TOPIC_ROBOT_COMMAND, payload, qos=QOS_COMMAND, coalesce=True)
+    if last_lidar_rx: tracer.record("sample_to_cmd", (time.time() - last_lidar_rx) * 1000)
 
 def send_manual_command(client):
-    cmd_data = {"vx": manual_vx, "vy": manual_vy, "wz": manual_wz}
-    if manual_target_angle >= 0: cmd_data["target_yaw"] = manual_target_angle 
-    client.publish(TOPIC_ROBOT_COMMAND, json.dumps(cmd_data))
-
-# --- 6. UI Class ---
+    target_yaw = manual_target_angle if manual_target_angle >= 0 else None
+    payload = wire_format.encode_command(manual_vx, manual_vy, manual_wz, target_yaw, binary=wire.binary_for(TOPIC_ROBOT_COMMAND))
+    client.publish(TOPIC_ROBOT_COMMAND, payload, qos=QOS_COMMAND, coalesce=True)
+
+def stop_robot(client):
+    payload = wire_format.encode_command(0, 0, 0, binary=wire.binary_for(TOPIC_ROBOT_COMMAND))
+    client.publish(TOPIC_ROBOT_COMMAND, payload, qos=QOS_RELIABLE)
+
+# --- 6. Control Loop ---
+
+def control_step(client, now):
+    """ 1 รอบของ control loop: sensor -> wall timer -> state machine (เรียกตอนถือ control_lock) """
+    global controller_state, proposed_action, target_heading, logic_reason_idx
+    global settle_until, last_manual_send, last_pid_val
+    consume_sensor_samples()
+    update_wall_timers()
+
+    # Send PID only if changed
+    current_pid_val = (h_pid_kp, h_pid_ki, h_pid_kd)
+    if current_pid_val != last_pid_val:
+        send_pid_update(client)
+        last_pid_val = current_pid_val
+
+    if controller_state == "THINKING":
+        t0 = time.perf_counter()
+        proposed_action, target_heading, logic_reason_idx = decide_next_action()
+        tracer.record("decide", (time.perf_counter() - t0) * 1000)
+        controller_state = "WAITING_FOR_CONFIRM"
+    elif controller_state == "EXECUTING":
+        send_auto_command(client)
+        if aruco_state in ["STOP", "CHECK"]:
+            stop_robot(client); controller_state = "THINKING"
+        elif now - start_exec_time > EXEC_TIMEOUT:
+            stop_robot(client); controller_state = "SETTLING"; settle_until = now + SETTLE_TIME
+    elif controller_state == "SETTLING":
+        if now >= settle_until: controller_state = "THINKING"
+    elif controller_state == "MANUAL":
+        if now - last_manual_send > MANUAL_SEND_PERIOD:
+            last_manual_send = now
+            send_manual_command(client)
+
+    if aruco_state in ["STOP", "CHECK"]:
+        if (robot_x, robot_y) != last_plotted_pos: plot_current_walls(manual=False)
+
+def take_snapshot():
+    """ copy state ที่หน้าจอต้องใช้ -> renderer อ่านได้โดยไม่ต้องรอ lock """
+    plan_dist = planner.distance()
+    return {
+        "lidar": dict(current_lidar), "lidar_variance": dict(lidar_variance), "yaw": current_yaw, "aruco_state": aruco_state,
+        "robot_x": robot_x, "robot_y": robot_y, "robot_dir": robot_dir,
+        "lidar_seq": lidar_seq, "lidar_dropped": lidar_ring.dropped,
+        "walls_confirmed": dict(walls_confirmed), "wall_start_times": dict(wall_start_times),
+        "map_h_walls": map_h_walls.copy(), "map_v_walls": map_v_walls.copy(),
+        "planned_path": list(planned_path), "plan_dist": plan_dist, "plan_expanded": planner.expanded,
+        "controller_state": controller_state, "proposed_action": proposed_action,
+        "target_heading": target_heading, "logic_reason_idx": logic_reason_idx, "explore_mode": explore_mode,
+        "manual": (manual_vx, manual_vy, manual_target_angle), "diff_msg": diff_msg,
+    }
+
+class ControlLoop(threading.Thread):
+    """
+    เรียก control_step ทุก 1/hz วินาที (นับเวลาจากรอบที่ตั้งไว้ ไม่ใช่จากรอบที่แล้ว -> ไม่ drift)
+    ถ้ารอบไหนช้าเกิน จะไม่เร่งไล่รอบที่หลุด (นับไว้ใน overruns)
+    """
+    def __init__(self, client, hz=CONTROL_HZ):
+        super().__init__(daemon=True)
+        self.client = client
+        self.hz = min(max(hz, CONTROL_HZ_MIN), CONTROL_HZ_MAX)
+        self.period = 1.0 / self.hz
+        self.running = True
+        self.rate = 0.0       # รอบ/วินาที ที่วัดได้จริง
+        self.jitter_ms = 0.0  # ตื่นช้ากว่ากำหนดมากสุด (ช่วง 1 วินาทีล่าสุด)
+        self.overruns = 0
+
+    def run(self):
+        global ui_snapshot
+        next_t = time.perf_counter()
+        ticks, window_start, worst = 0, next_t, 0.0
+        while self.running:
+            t = time.perf_counter()
+            worst = max(worst, t - next_t)
+            with control_lock:
+                control_step(self.client, time.time())
+                ui_snapshot = take_snapshot()
+            ticks += 1
+            if t - window_start >= 1.0:
+                self.rate = ticks / (t - window_start); self.jitter_ms = worst * 1000
+                ticks, window_start, worst = 0, t, 0.0
+            next_t += self.period
+            delay = next_t - time.perf_counter()
+            if delay > 0: time.sleep(delay)
+            else:
+                self.overruns += 1
+                next_t = time.perf_counter()
+
+    def stop(self):
+        self.running = False
+        self.join(timeout=1.0)
+
+# --- 7. Replay (Headless) ---
+
+def reset_mapper_state():
+    """ ล้างแผนที่ / sensor / state machine กลับเป็นค่าเริ่มต้น (ก่อน replay แต่ละ session) """
+    global current_yaw, aruco_state, lidar_ring, yaw_ring, aruco_ring, lidar_seq, lidar_filter
+    global robot_x, robot_y, robot_dir, map_h_walls, map_v_walls, map_masks, planner, planned_path, diff_msg
+    global map_h_evidence, map_v_evidence, last_lidar_rx
+    global last_plotted_pos, controller_state, proposed_action, target_heading, logic_reason_idx
+    current_lidar.update(F=2000.0, L=2000.0, R=2000.0, B=2000.0)
+    lidar_filter = LidarFilter(LIDAR_FILTER, alpha=LIDAR_SMOOTH_ALPHA)
+    for d in lidar_variance: lidar_variance[d] = float("nan")
+    current_yaw = 0.0
+    aruco_state = "WAITING..."
+    lidar_ring = SensorRing(("F", "L", "R", "B"), SENSOR_RING_SIZE)
+    yaw_ring = SensorRing(("yaw",), SENSOR_RING_SIZE)
+    aruco_ring = SensorRing(("grid_x", "grid_y"), SENSOR_RING_SIZE)
+    lidar_seq = 0
+    robot_x, robot_y, robot_dir = 0, 0, 2
+    map_h_walls, map_v_walls = maze_model.empty_walls(MAZE_WIDTH, MAZE_HEIGHT, fill=maze_model.UNKNOWN)
+    map_masks = maze_model.to_mask_array(maze_model.open_masks(map_h_walls, map_v_walls, optimistic=True))
+    map_h_evidence = np.zeros(map_h_walls.shape, dtype=np.float32)
+    map_v_evidence = np.zeros(map_v_walls.shape, dtype=np.float32)
+    planner = DStarLite(map_masks, MAZE_WIDTH, MAZE_HEIGHT, (robot_x, robot_y), GOAL_CELL)
+    planner.compute()
+    planned_path = planner.path()
+    diff_msg = "DIFF: -"
+    for d in wall_start_times: wall_start_times[d] = 0; walls_confirmed[d] = False
+    last_plotted_pos = (-1, -1)
+    visited_cells.clear()
+    controller_state, proposed_action, target_heading, logic_reason_idx = "IDLE", "NONE", 0.0, -1
+    last_lidar_rx = 0.0
+    tracer.reset()
+
+def replay_session(filename, speed=0.0, ref_h=None, ref_v=None):
+    """
+    เล่น session log ผ่าน on_message + wall logic (ไม่มี pygame / MQTT)
+    ทุก record = 1 รอบของ control loop: ดึง sample -> wall timer -> auto-plot ตอน ArUco STOP/CHECK
+    speed <= 0 = เร็วที่สุด | 1.0 = เวลาจริง
+    คืนค่า dict: จำนวนข้อความ, ช่องที่ plot, action ที่จะเลือกในแต่ละช่อง, diff กับ maze อ้างอิง (ถ้าให้มา)
+    """
+    global get_time
+    reset_mapper_state()
+    clock = session_log.ReplayClock()
+    decisions = []
+
+    def step():
+        consume_sensor_samples()
+        update_wall_timers()
+        if aruco_state in ["STOP", "CHECK"] and (robot_x, robot_y) != last_plotted_pos:
+            plot_current_walls(manual=False)
+            t0 = time.perf_counter()
+            action, _, reason = decide_next_action()
+            tracer.record("decide", (time.perf_counter() - t0) * 1000)
+            decisions.append([robot_x, robot_y, action, reason])
+
+    saved_clock = get_time
+    get_time = clock
+    t0 = time.perf_counter()
+    try:
+        count = session_log.replay(filename, lambda topic, payload: on_message(Message(topic, payload)), speed, clock, step)
+    finally:
+        get_time = saved_clock
+    result = {"file": filename, "messages": count, "cells": len(visited_cells), "decisions": decisions,
+              "walls": int((map_h_walls == 1).sum() + (map_v_walls == 1).sum()),
+              "replay_ms": round((time.perf_counter() - t0) * 1000, 3), "latency": tracer.summary()}
+    if ref_h is not None:
+        missing, phantom = maze_model.diff_summary(maze_model.wall_diff(map_h_walls, map_v_walls, ref_h, ref_v))
+        result.update(missing=missing, phantom=phantom)
+    return result
+
+# --- 8. UI Class ---
 class Button:
     def __init__(self, x, y, w, h, text, callback, color=C_BTN_BG, text_size=16):
         self.rect = pygame.Rect(x, y, w, h); self.text = text; self.callback = callback; self.color = color; self.is_hovered = False; self.clicked_timer = 0
@@ -295,11 +683,16 @@ class Button:
         elif event.type == pygame.MOUSEBUTTONDOWN:
             if self.is_hovered and event.button == 1: self.clicked_timer = 10; self.callback()
 
-# --- 7. Main UI ---
+def button_keys(buttons):
+    """ สถานะที่มีผลกับการวาดปุ่ม (ใช้เป็น key ของ DirtyZones) """
+    return tuple((btn.is_hovered, btn.clicked_timer) for btn in buttons)
+
+# --- 9. Main UI ---
 def main_ui():
-    global running, controller_state, proposed_action, target_heading, logic_reason_idx, last_plotted_pos
+    global running, controller_state, proposed_action, target_heading, logic_reason_idx, last_plotted_pos, explore_mode
     global manual_vx, manual_vy, manual_wz, manual_target_angle
     global h_pid_kp, h_pid_ki, h_pid_kd, lidar_offset_l, lidar_offset_r
+    global start_exec_time, last_pid_val, ui_snapshot, recorder
     
     pygame.init()
     SCREEN_W, SCREEN_H = MAZE_WIDTH * CELL_SIZE + 400, MAZE_HEIGHT * CELL_SIZE + 60
@@ -313,8 +706,10 @@ def main_ui():
     font_coord = pygame.font.SysFont("Arial", 12)
     font_cmd = pygame.font.SysFont("Arial", 24, bold=True)
 
-    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
-    threading.Thread(target=mqtt_client_loop, args=(client,), daemon=True).start()
+    if RECORD_SESSION:
+        recorder = session_log.SessionRecorder(session_log.new_session_path())
+        print(f"Recording session -> {recorder.filename}")
+    client = mqtt_connect()
     
     # --- Button Definitions ---
     
@@ -348,180 +743,210 @@ def main_ui():
         btn_plot, btn_clear, btn_save
     ]
 
-    start_exec_time = 0
-    last_manual_send = 0
     last_pid_val = (h_pid_kp, h_pid_ki, h_pid_kd)
 
-    logic_steps = [
-        "0. STOP (< 250mm)",
-        f"1. RIGHT OPEN (> {WALL_THRESHOLD}) -> TURN 90",
-        f"2. FRONT OPEN (> {WALL_THRESHOLD}) -> FWD",
-        f"3. LEFT OPEN (> {WALL_THRESHOLD}) -> TURN 270",
-        "4. BLOCKED -> U-TURN"
-    ]
-
-    def stop_robot():
-        client.publish(TOPIC_ROBOT_COMMAND, json.dumps({"vx": 0, "vy": 0, "wz": 0}))
+    show_latency = False      # [L] แสดงตาราง latency แทน AUTO LOGIC
+    latency_table, next_latency_refresh = (), 0.0
+
+    logic_steps = {
+        "WALL_FOLLOW": [
+            "0. STOP (< 250mm)",
+            f"1. RIGHT OPEN (> {WALL_THRESHOLD}) -> TURN 90",
+            f"2. FRONT OPEN (> {WALL_THRESHOLD}) -> FWD",
+            f"3. LEFT OPEN (> {WALL_THRESHOLD}) -> TURN 270",
+            "4. BLOCKED -> U-TURN"
+        ],
+        "FLOOD_FILL": [
+            "0. STOP (< 250mm)",
+            "1. MIN DIST AHEAD -> FWD",
+            "2. MIN DIST RIGHT -> TURN 90",
+            "3. MIN DIST LEFT -> TURN 270",
+            "4. MIN DIST BEHIND -> U-TURN",
+            "5. EXPLORED / NO PATH -> STOP"
+        ]
+    }
+
+    # Render cache: พื้น grid + label วาดครั้งเดียว / กำแพงวาดใหม่เฉพาะตอนแผนที่เปลี่ยน
+    map_rect = pygame.Rect(0, 0, MAZE_WIDTH * CELL_SIZE, MAZE_HEIGHT * CELL_SIZE)
+    grid_surface = ui_render.grid_layer(MAZE_WIDTH, MAZE_HEIGHT, CELL_SIZE, C_GRID_BG, C_GRID_LINE, C_GRID_POINT, font_coord, C_COORD_TEXT)
+    wall_layer = ui_render.WallLayer(MAZE_WIDTH, MAZE_HEIGHT, CELL_SIZE, C_WALL_SAVED, 5)
+    text = ui_render.TextCache()
+    zones = ui_render.DirtyZones()
+
+    ui_snapshot = take_snapshot()
+    control = ControlLoop(client, CONTROL_HZ)
+    control.start()
 
     while running:
-        update_wall_timers() 
-        
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT: running = False
+        events = pygame.event.get()
+        with control_lock:
+            for event in events:
+                if event.type == pygame.QUIT: running = False
+                zones.handle_event(event)
             
-            # Click Events
-            for btn in all_buttons: btn.handle_event(event)
+                # Click Events
+                for btn in all_buttons: btn.handle_event(event)
             
-            if event.type == pygame.KEYDOWN:
-                # General
-                if event.key == pygame.K_z: controller_state = "THINKING" 
-                elif event.key == pygame.K_RETURN and controller_state == "WAITING_FOR_CONFIRM":
-                    controller_state = "EXECUTING"; start_exec_time = time.time()
-                elif event.key == pygame.K_SPACE: 
-                    stop_robot(); controller_state = "IDLE"; manual_vx=0; manual_vy=0; manual_wz=0; manual_target_angle=-1.0
-                elif event.key == pygame.K_p: plot_current_walls()
-                elif event.key == pygame.K_c: clear_current_cell_walls()
-                elif event.key == pygame.K_s: save_map_to_csv()
+                if event.type == pygame.KEYDOWN:
+                    # General
+                    if event.key == pygame.K_z: controller_state = "THINKING" 
+                    elif event.key == pygame.K_RETURN and controller_state == "WAITING_FOR_CONFIRM":
+                        controller_state = "EXECUTING"; start_exec_time = time.time()
+                    elif event.key == pygame.K_SPACE: 
+                        stop_robot(client); controller_state = "IDLE"; manual_vx=0; manual_vy=0; manual_wz=0; manual_target_angle=-1.0
+                    elif event.key == pygame.K_p: plot_current_walls()
+                    elif event.key == pygame.K_c: clear_current_cell_walls()
+                    elif event.key == pygame.K_s: save_map_to_csv()
+                    elif event.key == pygame.K_r: diff_with_reference()
+                    elif event.key == pygame.K_l: show_latency = not show_latency
+                    elif event.key == pygame.K_t: export_latency()
+                    elif event.key == pygame.K_m and controller_state != "EXECUTING":
+                        explore_mode = EXPLORE_MODES[(EXPLORE_MODES.index(explore_mode) + 1) % len(EXPLORE_MODES)]
                 
-                # Manual
-                if event.key == pygame.K_UP: manual_vy = 0.6; controller_state = "MANUAL"
-                elif event.key == pygame.K_DOWN: manual_vy = -0.6; controller_state = "MANUAL"
-                elif event.key == pygame.K_LEFT: manual_vx = -0.6; controller_state = "MANUAL"
-                elif event.key == pygame.K_RIGHT: manual_vx = 0.6; controller_state = "MANUAL"
-                elif event.key == pygame.K_a: manual_wz = 0.6; controller_state = "MANUAL"
-                elif event.key == pygame.K_d: manual_wz = -0.6; controller_state = "MANUAL"
+                    # Manual
+                    if event.key == pygame.K_UP: manual_vy = 0.6; controller_state = "MANUAL"
+                    elif event.key == pygame.K_DOWN: manual_vy = -0.6; controller_state = "MANUAL"
+                    elif event.key == pygame.K_LEFT: manual_vx = -0.6; controller_state = "MANUAL"
+                    elif event.key == pygame.K_RIGHT: manual_vx = 0.6; controller_state = "MANUAL"
+                    elif event.key == pygame.K_a: manual_wz = 0.6; controller_state = "MANUAL"
+                    elif event.key == pygame.K_d: manual_wz = -0.6; controller_state = "MANUAL"
                 
-                elif event.key == pygame.K_1: manual_target_angle = 0.0; controller_state = "MANUAL"
-                elif event.key == pygame.K_2: manual_target_angle = 90.0; controller_state = "MANUAL"
-                elif event.key == pygame.K_3: manual_target_angle = 180.0; controller_state = "MANUAL"
-                elif event.key == pygame.K_4: manual_target_angle = 270.0; controller_state = "MANUAL"
-                elif event.key == pygame.K_0: manual_target_angle = -1.0; controller_state = "MANUAL"
-
-            if event.type == pygame.KEYUP:
-                if event.key in [pygame.K_UP, pygame.K_DOWN]: manual_vy = 0
-                if event.key in [pygame.K_LEFT, pygame.K_RIGHT]: manual_vx = 0 
-                if event.key in [pygame.K_a, pygame.K_d]: manual_wz = 0        
-
-        # Send PID only if changed
-        current_pid_val = (h_pid_kp, h_pid_ki, h_pid_kd)
-        if current_pid_val != last_pid_val:
-            send_pid_update(client)
-            last_pid_val = current_pid_val
-
-        if controller_state == "THINKING":
-            proposed_action, target_heading, logic_reason_idx = decide_next_action()
-            controller_state = "WAITING_FOR_CONFIRM"
-        elif controller_state == "EXECUTING":
-            send_auto_command(client)
-            if time.time() - start_exec_time > 1.5: 
-                stop_robot(); controller_state = "THINKING"; time.sleep(0.2) 
-            if aruco_state in ["STOP", "CHECK"]:
-                stop_robot(); controller_state = "THINKING"
-        elif controller_state == "MANUAL":
-            if time.time() - last_manual_send > 0.1:
-                last_manual_send = time.time()
-                send_manual_command(client)
-
-        if aruco_state in ["STOP", "CHECK"]:
-             current_pos = (robot_x, robot_y)
-             if current_pos != last_plotted_pos: plot_current_walls()
-
-        # Draw
-        screen.fill(C_BG)
-        pygame.draw.rect(screen, C_GRID_BG, (0, 0, MAZE_WIDTH * CELL_SIZE, SCREEN_H - 60))
-        for y in range(MAZE_HEIGHT):
-            for x in range(MAZE_WIDTH):
-                r = (x * CELL_SIZE, y * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-                pygame.draw.rect(screen, C_GRID_LINE, r, 1)
-                pygame.draw.circle(screen, C_GRID_POINT, (x * CELL_SIZE + 35, y * CELL_SIZE + 35), 3)
-                screen.blit(font_coord.render(f"{x},{y}", True, C_COORD_TEXT), (x * CELL_SIZE + 3, y * CELL_SIZE + 3))
-        
-        for y in range(len(map_h_walls)):
-            for x in range(len(map_h_walls[0])):
-                if map_h_walls[y][x] == 1: pygame.draw.line(screen, C_WALL_SAVED, (x*CELL_SIZE, y*CELL_SIZE), ((x+1)*CELL_SIZE, y*CELL_SIZE), 5)
-        for y in range(len(map_v_walls)):
-            for x in range(len(map_v_walls[0])):
-                if map_v_walls[y][x] == 1: pygame.draw.line(screen, C_WALL_SAVED, (x*CELL_SIZE, y*CELL_SIZE), (x*CELL_SIZE, (y+1)*CELL_SIZE), 5)
-
-        cx, cy, s = robot_x * CELL_SIZE + 35, robot_y * CELL_SIZE + 35, 23
-        pts = []
-        if robot_dir == 0: pts = [(cx, cy-s), (cx-s, cy+s), (cx+s, cy+s)]
-        elif robot_dir == 1: pts = [(cx+s, cy), (cx-s, cy-s), (cx-s, cy+s)]
-        elif robot_dir == 2: pts = [(cx, cy+s), (cx-s, cy-s), (cx+s, cy-s)]
-        elif robot_dir == 3: pts = [(cx-s, cy), (cx+s, cy-s), (cx+s, cy+s)]
-        pygame.draw.polygon(screen, C_ROBOT, pts)
-        
-        dirs = ["Top", "Right", "Bottom", "Left"]
-        f_idx, r_idx = robot_dir, (robot_dir + 1) % 4
-        b_idx, l_idx = (robot_dir + 2) % 4, (robot_dir + 3) % 4
-        def get_wall_color(key): return C_WALL_CONFIRMED if walls_confirmed[key] else (C_WALL_DETECTING if wall_start_times[key] > 0 else None)
-        px, py = robot_x * CELL_SIZE, robot_y * CELL_SIZE
-        c = get_wall_color("F"); 
-        if c and f_idx==0: pygame.draw.line(screen, c, (px, py), (px+70, py), 3) 
-        elif c and f_idx==1: pygame.draw.line(screen, c, (px+70, py), (px+70, py+70), 3) 
-        elif c and f_idx==2: pygame.draw.line(screen, c, (px, py+70), (px+70, py+70), 3) 
-        elif c and f_idx==3: pygame.draw.line(screen, c, (px, py), (px, py+70), 3) 
-        c = get_wall_color("R"); 
-        if c and r_idx==0: pygame.draw.line(screen, c, (px, py), (px+70, py), 3)
-        elif c and r_idx==1: pygame.draw.line(screen, c, (px+70, py), (px+70, py+70), 3)
-        elif c and r_idx==2: pygame.draw.line(screen, c, (px, py+70), (px+70, py+70), 3)
-        elif c and r_idx==3: pygame.draw.line(screen, c, (px, py), (px, py+70), 3)
-        c = get_wall_color("L"); 
-        if c and l_idx==0: pygame.draw.line(screen, c, (px, py), (px+70, py), 3)
-        elif c and l_idx==1: pygame.draw.line(screen, c, (px+70, py), (px+70, py+70), 3)
-        elif c and l_idx==2: pygame.draw.line(screen, c, (px, py+70), (px+70, py+70), 3)
-        elif c and l_idx==3: pygame.draw.line(screen, c, (px, py), (px, py+70), 3)
+                    elif event.key == pygame.K_1: manual_target_angle = 0.0; controller_state = "MANUAL"
+                    elif event.key == pygame.K_2: manual_target_angle = 90.0; controller_state = "MANUAL"
+                    elif event.key == pygame.K_3: manual_target_angle = 180.0; controller_state = "MANUAL"
+                    elif event.key == pygame.K_4: manual_target_angle = 270.0; controller_state = "MANUAL"
+                    elif event.key == pygame.K_0: manual_target_angle = -1.0; controller_state = "MANUAL"
+
+                if event.type == pygame.KEYUP:
+                    if event.key in [pygame.K_UP, pygame.K_DOWN]: manual_vy = 0
+                    if event.key in [pygame.K_LEFT, pygame.K_RIGHT]: manual_vx = 0 
+                    if event.key in [pygame.K_a, pygame.K_d]: manual_wz = 0
+
+        # Draw (จาก snapshot ของ control loop -> ไม่ต้องรอ lock ระหว่างวาด)
+        # วาดเฉพาะโซนที่ข้อมูลเปลี่ยน แล้วส่งขึ้นจอเฉพาะโซนนั้น
+        snap = ui_snapshot
+        rx, ry, rdir = snap["robot_x"], snap["robot_y"], snap["robot_dir"]
+        lidar = snap["lidar"]
+        state = snap["controller_state"]
+        if zones.full: screen.fill(C_BG)
+
+        wall_layer.update(snap["map_h_walls"], snap["map_v_walls"])
+        def get_wall_color(key): return C_WALL_CONFIRMED if snap["walls_confirmed"][key] else (C_WALL_DETECTING if snap["wall_start_times"][key] > 0 else None)
+        wall_colors = (get_wall_color("F"), get_wall_color("R"), get_wall_color("L"))
+        if zones.begin(screen, "map", map_rect, (wall_layer.version, tuple(snap["planned_path"]), rx, ry, rdir, wall_colors)):
+            screen.blit(grid_surface, (0, 0))
+            wall_layer.draw(screen)
+
+            if len(snap["planned_path"]) > 1:
+                plan_pts = [(x * CELL_SIZE + 35, y * CELL_SIZE + 35) for x, y in snap["planned_path"]]
+                pygame.draw.lines(screen, C_PLAN, False, plan_pts, 2)
+            gx, gy = GOAL_CELL
+            pygame.draw.rect(screen, C_PLAN, (gx * CELL_SIZE, gy * CELL_SIZE, CELL_SIZE, CELL_SIZE), 3)
+
+            cx, cy, s = rx * CELL_SIZE + 35, ry * CELL_SIZE + 35, 23
+            pts = []
+            if rdir == 0: pts = [(cx, cy-s), (cx-s, cy+s), (cx+s, cy+s)]
+            elif rdir == 1: pts = [(cx+s, cy), (cx-s, cy-s), (cx-s, cy+s)]
+            elif rdir == 2: pts = [(cx, cy+s), (cx-s, cy-s), (cx+s, cy-s)]
+            elif rdir == 3: pts = [(cx-s, cy), (cx+s, cy-s), (cx+s, cy+s)]
+            pygame.draw.polygon(screen, C_ROBOT, pts)
+
+            f_idx, r_idx = rdir, (rdir + 1) % 4
+            l_idx = (rdir + 3) % 4
+            px, py = rx * CELL_SIZE, ry * CELL_SIZE
+            for c, idx in zip(wall_colors, (f_idx, r_idx, l_idx)):
+                if c and idx==0: pygame.draw.line(screen, c, (px, py), (px+70, py), 3)
+                elif c and idx==1: pygame.draw.line(screen, c, (px+70, py), (px+70, py+70), 3)
+                elif c and idx==2: pygame.draw.line(screen, c, (px, py+70), (px+70, py+70), 3)
+                elif c and idx==3: pygame.draw.line(screen, c, (px, py), (px, py+70), 3)
 
         px = MAZE_WIDTH * CELL_SIZE + 10
-        screen.blit(font_head.render("SENSORS", True, C_TEXT), (px, 20))
-        pygame.draw.rect(screen, (50, 50, 50), (px, 50, 380, 100))
-        screen.blit(font_text.render(f"F:{current_lidar['F']:.0f} R:{current_lidar['R']:.0f} L:{current_lidar['L']:.0f}", True, C_TEXT), (px+10, 60))
-        screen.blit(font_text.render(f"Yaw: {current_yaw:.1f} (Dir: {robot_dir})", True, (255, 255, 0)), (px+10, 85))
-        screen.blit(font_text.render(f"ArUco: {aruco_state}", True, (0,255,255) if aruco_state in ["CHECK","STOP"] else C_TEXT), (px+10, 110))
-
-        screen.blit(font_head.render("LIDAR CALIBRATION", True, C_TEXT), (px, 160))
-        for btn in [btn_l_dn, btn_l_up, btn_r_dn, btn_r_up]: btn.draw(screen)
-        off_txt = font_coord.render(f"Offset L: {lidar_offset_l:+.0f} | R: {lidar_offset_r:+.0f}", True, C_OFFSET_TEXT)
-        screen.blit(off_txt, (px+130, 195))
-
-        screen.blit(font_head.render("HEADING PID TUNING", True, (255, 200, 0)), (px, 225))
-        pygame.draw.rect(screen, (50, 50, 50), (px, 250, 380, 100))
+        sd = {d: (v ** 0.5 if v == v else 0.0) for d, v in snap["lidar_variance"].items()} # NaN = ยังไม่มีข้อมูล
+        sensor_lines = (f"F:{lidar['F']:.0f} R:{lidar['R']:.0f} L:{lidar['L']:.0f}",
+                        f"{LIDAR_FILTER} sd F:{sd['F']:.0f} R:{sd['R']:.0f} L:{sd['L']:.0f}",
+                        f"Yaw: {snap['yaw']:.1f} (Dir: {rdir})",
+                        f"ArUco: {snap['aruco_state']}",
+                        f"Lidar samples: {snap['lidar_seq']} | dropped: {snap['lidar_dropped']} | Control: {control.rate:.0f} Hz (late {control.jitter_ms:.1f} ms)")
+        if zones.begin(screen, "sensors", (px - 10, 0, 400, 155), sensor_lines, C_BG):
+            screen.blit(text.render(font_head, "SENSORS", C_TEXT), (px, 20))
+            pygame.draw.rect(screen, (50, 50, 50), (px, 50, 380, 100))
+            screen.blit(text.render(font_text, sensor_lines[0], C_TEXT), (px+10, 60))
+            screen.blit(text.render(font_coord, sensor_lines[1], C_COORD_TEXT), (px+235, 64))
+            screen.blit(text.render(font_text, sensor_lines[2], (255, 255, 0)), (px+10, 85))
+            screen.blit(text.render(font_text, sensor_lines[3], (0,255,255) if snap["aruco_state"] in ["CHECK","STOP"] else C_TEXT), (px+10, 110))
+            screen.blit(text.render(font_coord, sensor_lines[4], C_COORD_TEXT), (px+10, 132))
+
+        calib_buttons = [btn_l_dn, btn_l_up, btn_r_dn, btn_r_up]
+        if zones.begin(screen, "calib", (px - 10, 155, 400, 67), (lidar_offset_l, lidar_offset_r, button_keys(calib_buttons)), C_BG):
+            screen.blit(text.render(font_head, "LIDAR CALIBRATION", C_TEXT), (px, 160))
+            for btn in calib_buttons: btn.draw(screen)
+            off_txt = text.render(font_coord, f"Offset L: {lidar_offset_l:+.0f} | R: {lidar_offset_r:+.0f}", C_OFFSET_TEXT)
+            screen.blit(off_txt, (px+130, 195))
+
+        pid_buttons = [btn_kp_dn, btn_kp_up, btn_ki_dn, btn_ki_up, btn_kd_dn, btn_kd_up]
+        if zones.begin(screen, "pid", (px - 10, 222, 400, 140), (h_pid_kp, h_pid_ki, h_pid_kd, button_keys(pid_buttons)), C_BG):
+            screen.blit(text.render(font_head, "HEADING PID TUNING", (255, 200, 0)), (px, 225))
+            pygame.draw.rect(screen, (50, 50, 50), (px, 250, 380, 100))
         
-        # Draw PID Buttons and Values
-        for btn in [btn_kp_dn, btn_kp_up, btn_ki_dn, btn_ki_up, btn_kd_dn, btn_kd_up]: btn.draw(screen)
+            # Draw PID Buttons and Values
+            for btn in pid_buttons: btn.draw(screen)
         
-        screen.blit(font_text.render(f"Kp: {h_pid_kp:.3f}", True, C_TEXT), (px+130, 255))
-        screen.blit(font_text.render(f"Ki: {h_pid_ki:.3f}", True, C_TEXT), (px+130, 285))
-        screen.blit(font_text.render(f"Kd: {h_pid_kd:.3f}", True, C_TEXT), (px+130, 315))
-
-        screen.blit(font_head.render("AUTO LOGIC", True, C_TEXT), (px, 370))
-        y = 400
-        for i, step in enumerate(logic_steps):
-            c = C_HIGHLIGHT if (controller_state in ["WAITING_FOR_CONFIRM", "EXECUTING"] and i == logic_reason_idx) else C_TEXT
-            screen.blit(font_logic.render(step, True, c), (px, y)); y += 25
-        
-        for btn in [btn_plot, btn_clear, btn_save]: btn.draw(screen)
+            screen.blit(text.render(font_text, f"Kp: {h_pid_kp:.3f}", C_TEXT), (px+130, 255))
+            screen.blit(text.render(font_text, f"Ki: {h_pid_ki:.3f}", C_TEXT), (px+130, 285))
+            screen.blit(text.render(font_text, f"Kd: {h_pid_kd:.3f}", C_TEXT), (px+130, 315))
+
+        if show_latency:
+            if time.time() >= next_latency_refresh: # ตารางเปลี่ยนทุก 0.5 วินาที (ไม่ต้องวาดโซนนี้ทุกเฟรม)
+                latency_table, next_latency_refresh = latency_rows(), time.time() + 0.5
+            if zones.begin(screen, "logic", (px - 10, 362, 400, 178), latency_table, C_BG):
+                screen.blit(text.render(font_head, f"LATENCY [L] ms ({tracer.mode}) [T] export", C_TEXT), (px, 370))
+                y = 400
+                for row in latency_table:
+                    screen.blit(text.render(font_logic, row, C_TEXT), (px, y)); y += 19
+        else:
+            highlight = snap["logic_reason_idx"] if state in ["WAITING_FOR_CONFIRM", "EXECUTING"] else None
+            if zones.begin(screen, "logic", (px - 10, 362, 400, 178), (snap["explore_mode"], highlight), C_BG):
+                screen.blit(text.render(font_head, f"AUTO LOGIC [M]: {snap['explore_mode']}", C_TEXT), (px, 370))
+                y = 400
+                for i, step in enumerate(logic_steps[snap["explore_mode"]]):
+                    c = C_HIGHLIGHT if i == highlight else C_TEXT
+                    screen.blit(text.render(font_logic, step, c), (px, y)); y += 25
+
+        map_buttons = [btn_plot, btn_clear, btn_save]
+        if zones.begin(screen, "map_buttons", (px - 10, 540, 400, SCREEN_H - 60 - 540), button_keys(map_buttons), C_BG):
+            for btn in map_buttons: btn.draw(screen)
         
-        pygame.draw.rect(screen, (10, 10, 10), (0, SCREEN_H - 60, SCREEN_W, 60))
         msg = "IDLE"
         color_msg = (200, 200, 200)
-        if controller_state == "MANUAL": 
-            msg = f"MANUAL: V({manual_vx},{manual_vy}) Lock: {manual_target_angle}"
+        if state == "MANUAL": 
+            msg = "MANUAL: V({},{}) Lock: {}".format(*snap["manual"])
             color_msg = C_MANUAL_MODE
-        elif controller_state == "WAITING_FOR_CONFIRM": 
-            msg = f"AUTO: {proposed_action} > {target_heading:.0f} (ENTER)"
+        elif state == "WAITING_FOR_CONFIRM": 
+            msg = f"AUTO: {snap['proposed_action']} > {snap['target_heading']:.0f} (ENTER)"
             color_msg = (255, 255, 0)
-        elif controller_state == "EXECUTING": 
-            msg = f"AUTO EXEC: {proposed_action}..."
+        elif state == "EXECUTING": 
+            msg = f"AUTO EXEC: {snap['proposed_action']}..."
             color_msg = (0, 255, 0)
-        elif controller_state == "THINKING": msg = "THINKING..."
+        elif state == "THINKING": msg = "THINKING..."
+        elif state == "SETTLING": msg = "SETTLING..."
             
-        screen.blit(font_cmd.render(msg, True, color_msg), (20, SCREEN_H - 50))
-        pygame.display.flip()
+        plan_dist = snap["plan_dist"]
+        plan_msg = f"PLAN {GOAL_CELL}: {'-' if plan_dist == float('inf') else int(plan_dist)} cells | repaired {snap['plan_expanded']} nodes"
+        if zones.begin(screen, "status", (0, SCREEN_H - 60, SCREEN_W, 60), (msg, color_msg, plan_msg, snap["diff_msg"]), (10, 10, 10)):
+            screen.blit(text.render(font_cmd, msg, color_msg), (20, SCREEN_H - 50))
+            screen.blit(text.render(font_text, plan_msg, C_PLAN), (SCREEN_W - 380, SCREEN_H - 45))
+            screen.blit(text.render(font_text, f"{snap['diff_msg']} [R]", C_TEXT), (SCREEN_W - 380, SCREEN_H - 25))
+        zones.flush()
         clock.tick(30)
 
+    control.stop()
     pygame.quit()
-    if client.is_connected(): stop_robot(); client.loop_stop()
+    if client.is_connected(): stop_robot(client)
+    client.stop()
+    if recorder is not None: recorder.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maze mapper UI")
+    parser.add_argument("--prefix", default=TOPIC_PREFIX, help="topic prefix, e.g. sim1/ for maze_sim --instances")
+    TOPIC_PREFIX = parser.parse_args().prefix
     main_ui()
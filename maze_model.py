@@ -0,0 +1,177 @@
+from array import array
+
+import numpy as np
+
+from maze_core import WALL, OPEN, OPEN_N, OPEN_E, OPEN_S, OPEN_W
+import maze_format
+
+"""
+MAZE MODEL (NumPy)
+เก็บกำแพงเป็น uint8 array แทน list ซ้อน list -> ทำงานทีละทั้ง array (vectorized)
+
+- h_walls : shape (H+1, W)   ค่า 1 = กำแพง, 2 = ว่าง, 0 = ยังไม่รู้ (แผนที่ของ mapper)
+- v_walls : shape (H, W+1)
+- masks   : shape (H, W)     N/E/S/W open-mask แบบเดียวกับ maze_core (ravel() -> index y*W + x)
+
+ใช้ index แบบเดิมได้ (arr[y][x]) โค้ดเดิมที่วนลูปยังทำงานได้
+"""
+
+UNKNOWN = 0
+
+# --- 1. สร้าง / แปลง ---
+
+def empty_walls(width, height, fill=OPEN):
+    h_walls = np.full((height + 1, width), fill, dtype=np.uint8)
+    v_walls = np.full((height, width + 1), fill, dtype=np.uint8)
+    return h_walls, v_walls
+
+def reset_walls(width, height, add_border=False, fill=OPEN):
+    """ เหมือน genmap.reset_map แต่สร้างขอบทีเดียวทั้งแถว/คอลัมน์ """
+    h_walls, v_walls = empty_walls(width, height, fill)
+    if add_border:
+        h_walls[[0, -1], :] = WALL  # ขอบบน / ล่าง
+        v_walls[:, [0, -1]] = WALL  # ขอบซ้าย / ขวา
+    return h_walls, v_walls
+
+def walls_from_masks(masks):
+    """ ย้อนกลับของ open_masks: masks (H, W) -> (h_walls, v_walls) มีขอบรอบนอกเสมอ """
+    masks = np.asarray(masks)
+    height, width = masks.shape
+    h_walls, v_walls = empty_walls(width, height, WALL)
+    h_walls[1:-1][(masks[:-1] & OPEN_S) != 0] = OPEN
+    v_walls[:, 1:-1][(masks[:, :-1] & OPEN_E) != 0] = OPEN
+    return h_walls, v_walls
+
+def from_lists(rows):
+    return np.asarray(rows, dtype=np.uint8)
+
+def load_walls_csv(filename):
+    return np.loadtxt(filename, delimiter=",", dtype=np.uint8, ndmin=2)
+
+def unpack_plane(buf, rows, cols):
+    """ bit-plane ของไฟล์ .mzb -> uint8 (rows, cols) ค่า 1/2 (อ่านจาก mmap ตรงๆ ไม่ผ่าน list) """
+    bits = np.unpackbits(np.frombuffer(buf, dtype=np.uint8), count=rows * cols, bitorder="little")
+    return np.where(bits.reshape(rows, cols), WALL, OPEN).astype(np.uint8)
+
+def load_maze_file(filename):
+    """ โหลด .mzb -> (grid, h_walls, v_walls) เป็น numpy """
+    return maze_format.load_maze_bin(filename, unpack_plane)
+
+def pack_plane(plane):
+    """ ย้อนกลับของ unpack_plane (np.packbits แทนการวนลูปใน maze_format.pack_plane) """
+    return np.packbits(np.asarray(plane) != OPEN, bitorder="little").tobytes()
+
+def save_maze_file(filename, h_walls, v_walls, grid=None):
+    """ เหมือน maze_format.save_maze_bin แต่รับ numpy ตรงๆ (เร็วพอสำหรับ 1024x1024) """
+    if grid is None:
+        height, width = np.asarray(v_walls).shape[0], np.asarray(h_walls).shape[1]
+        grid = np.full((height, width), OPEN, dtype=np.uint8)
+    maze_format.save_maze_bin(filename, h_walls, v_walls, grid, pack=pack_plane)
+
+def to_mask_array(masks):
+    """ numpy masks -> array('B') สำหรับ solver ใน maze_core (เข้าถึงทีละช่องเร็วกว่า) """
+    return array('B', np.ascontiguousarray(masks, dtype=np.uint8).tobytes())
+
+def maze_shape(h_walls, v_walls):
+    """ คืนค่า (W, H) """
+    return h_walls.shape[1], v_walls.shape[0]
+
+# --- 2. Bulk Operations ---
+
+def open_masks(h_walls, v_walls, optimistic=False):
+    """ Vectorized build_open_masks -> uint8 (H, W) """
+    h_walls = np.asarray(h_walls); v_walls = np.asarray(v_walls)
+    if optimistic:
+        h_open = h_walls != WALL; v_open = v_walls != WALL
+    else:
+        h_open = h_walls == OPEN; v_open = v_walls == OPEN
+    # กำแพงขอบนอกสุดห้ามออก (แม้ใน CSV จะเป็น 2)
+    h_open = h_open.copy(); v_open = v_open.copy()
+    h_open[[0, -1], :] = False
+    v_open[:, [0, -1]] = False
+    masks = np.zeros(h_open[:-1].shape, dtype=np.uint8)
+    masks |= h_open[:-1] * np.uint8(OPEN_N)
+    masks |= v_open[:, 1:] * np.uint8(OPEN_E)
+    masks |= h_open[1:] * np.uint8(OPEN_S)
+    masks |= v_open[:, :-1] * np.uint8(OPEN_W)
+    return masks
+
+def count_open_edges(h_walls, v_walls):
+    """ จำนวนทางเชื่อมระหว่างช่อง (ไม่นับขอบนอก) """
+    return int(np.count_nonzero(h_walls[1:-1] == OPEN) + np.count_nonzero(v_walls[:, 1:-1] == OPEN))
+
+def wall_diff(map_h, map_v, ref_h, ref_v):
+    """
+    เทียบแผนที่ที่ mapper สร้าง กับ maze อ้างอิง
+    missing = อ้างอิงมีกำแพง แต่แผนที่ไม่มี | phantom = แผนที่มีกำแพง แต่จริงๆ ไม่มี
+    คืนค่า dict ของพิกัด (y, x) แยก h / v
+    """
+    map_h = np.asarray(map_h); map_v = np.asarray(map_v)
+    ref_h = np.asarray(ref_h); ref_v = np.asarray(ref_v)
+    return {
+        "h_missing": np.argwhere((ref_h == WALL) & (map_h != WALL)),
+        "h_phantom": np.argwhere((map_h == WALL) & (ref_h != WALL)),
+        "v_missing": np.argwhere((ref_v == WALL) & (map_v != WALL)),
+        "v_phantom": np.argwhere((map_v == WALL) & (ref_v != WALL)),
+    }
+
+def diff_summary(diff):
+    missing = len(diff["h_missing"]) + len(diff["v_missing"])
+    phantom = len(diff["h_phantom"]) + len(diff["v_phantom"])
+    return missing, phantom
+
+def wall_segments(h_walls, v_walls, value=WALL):
+    """ พิกัด (y, x) ของกำแพงทั้งหมด -> ใช้วาดแทนการวนลูปทุกช่อง """
+    return np.argwhere(np.asarray(h_walls) == value), np.argwhere(np.asarray(v_walls) == value)
+
+# --- 3. Frontier BFS (ขยายทีละทั้ง level) ---
+
+def frontier_bfs(masks, start, goal=None):
+    """
+    BFS แบบ level-synchronous: frontier เป็น bool array ทั้งแผนที่
+    ทุก level เลื่อน frontier 4 ทิศพร้อมกัน -> dist (H, W) int32, -1 = ไปไม่ถึง
+    goal : ถ้าให้มา จะหยุดทันทีที่ถึง
+    """
+    masks = np.asarray(masks)
+    height, width = masks.shape
+    dist = np.full((height, width), -1, dtype=np.int32)
+    sx, sy = start
+    frontier = np.zeros((height, width), dtype=bool)
+    frontier[sy, sx] = True
+    dist[sy, sx] = 0
+    can_n = (masks & OPEN_N) != 0
+    can_e = (masks & OPEN_E) != 0
+    can_s = (masks & OPEN_S) != 0
+    can_w = (masks & OPEN_W) != 0
+    level = 0
+    while frontier.any():
+        if goal is not None and dist[goal[1], goal[0]] >= 0: break
+        level += 1
+        nxt = np.zeros_like(frontier)
+        nxt[:-1, :] |= (frontier & can_n)[1:, :]   # ขึ้น
+        nxt[1:, :] |= (frontier & can_s)[:-1, :]   # ลง
+        nxt[:, 1:] |= (frontier & can_e)[:, :-1]   # ขวา
+        nxt[:, :-1] |= (frontier & can_w)[:, 1:]   # ซ้าย
+        nxt &= dist < 0
+        dist[nxt] = level
+        frontier = nxt
+    return dist
+
+def frontier_path(masks, start, end):
+    """ สร้าง path จาก dist ของ frontier_bfs (ย้อนจาก end หา dist-1 ทีละช่อง) """
+    masks = np.asarray(masks)
+    dist = frontier_bfs(masks, start, end)
+    ex, ey = end
+    if dist[ey, ex] < 0: return []
+    path = [(ex, ey)]
+    x, y = ex, ey
+    while dist[y, x] > 0:
+        m = masks[y, x]
+        d = dist[y, x] - 1
+        if m & OPEN_N and dist[y - 1, x] == d: y -= 1
+        elif m & OPEN_E and dist[y, x + 1] == d: x += 1
+        elif m & OPEN_S and dist[y + 1, x] == d: y += 1
+        else: x -= 1
+        path.append((x, y))
+    path.reverse()
+    return path
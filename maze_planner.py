@@ -0,0 +1,193 @@
+import heapq
+from array import array
+from collections import deque
+
+from maze_core import DIR_BITS, DIR_DX, DIR_DY
+
+"""
+MAZE PLANNER (Incremental Re-planning)
+D* Lite บนแผนที่ของ mapper (open-mask แบบ optimistic: กำแพงที่ยังไม่รู้ = เดินได้)
+
+- เก็บ g / rhs / priority queue ไว้ระหว่างการอัปเดตกำแพง
+- พอ plot / clear กำแพง -> แก้เฉพาะ vertex ที่โดนผลกระทบ ไม่ต้องค้นหาใหม่ทั้งแผนที่
+- ค้นหาจาก Goal ย้อนมาหาหุ่น -> หุ่นเดินไปเรื่อยๆ ได้โดยไม่ต้องเริ่มใหม่ (ใช้ km)
+
+Flood Fill (แบบ Micromouse) สำหรับโหมดสำรวจ
+- ไล่ระยะจากทุกช่องที่ยังไม่ได้สำรวจพร้อมกัน (multi-source BFS)
+- หุ่นเลือกเดินไปช่องข้างเคียงที่ค่าน้อยที่สุด
+"""
+
+INF = float("inf")
+
+class DStarLite:
+    def __init__(self, masks, width, height, start, goal):
+        self.masks = masks  # ใช้ array ตัวเดียวกับ mapper (อัปเดตผ่าน set_wall_mask)
+        self.width = width
+        self.height = height
+        n = width * height
+        self.g = [INF] * n
+        self.rhs = [INF] * n
+        self.queue = []
+        self.queued = {}    # vertex -> key ปัจจุบัน (entry อื่นใน heap = ค้าง ข้ามไป)
+        self.km = 0
+        self.start = self._index(start)
+        self.last = self.start
+        self.goal = self._index(goal)
+        self.expanded = 0   # จำนวน vertex ที่ถูกขยายในการ compute ครั้งล่าสุด
+        self.rhs[self.goal] = 0
+        self._push(self.goal)
+
+    # --- Helper ---
+    def _index(self, cell):
+        return cell[1] * self.width + cell[0]
+
+    def _cell(self, idx):
+        return idx % self.width, idx // self.width
+
+    def _h(self, a, b):
+        return abs(a % self.width - b % self.width) + abs(a // self.width - b // self.width)
+
+    def _key(self, u):
+        m = min(self.g[u], self.rhs[u])
+        return (m + self._h(self.start, u) + self.km, m)
+
+    def _neighbors(self, u):
+        """ ช่องข้างเคียงที่เดินถึงได้ (เส้นเชื่อมไม่มีทิศ -> pred = succ) """
+        m = self.masks[u]
+        x, y = u % self.width, u // self.width
+        for d in range(4):
+            if m & DIR_BITS[d]:
+                yield (y + DIR_DY[d]) * self.width + x + DIR_DX[d]
+
+    def _push(self, u):
+        key = self._key(u)
+        self.queued[u] = key
+        heapq.heappush(self.queue, (key, u))
+
+    def _top_key(self):
+        while self.queue:
+            key, u = self.queue[0]
+            if self.queued.get(u) == key: return key
+            heapq.heappop(self.queue)
+        return (INF, INF)
+
+    def _update_vertex(self, u):
+        if u != self.goal:
+            best = INF
+            for s in self._neighbors(u):
+                if self.g[s] + 1 < best: best = self.g[s] + 1
+            self.rhs[u] = best
+        self.queued.pop(u, None)
+        if self.g[u] != self.rhs[u]: self._push(u)
+
+    # --- API ---
+    def compute(self):
+        """ ซ่อม g ให้ถูกต้องจนถึงตำแหน่งหุ่น (เฉพาะ vertex ที่ไม่ consistent) """
+        self.expanded = 0
+        start = self.start
+        while self._top_key() < self._key(start) or self.rhs[start] != self.g[start]:
+            k_old, u = heapq.heappop(self.queue)
+            del self.queued[u]
+            self.expanded += 1
+            k_new = self._key(u)
+            if k_old < k_new:
+                self._push(u)
+            elif self.g[u] > self.rhs[u]:
+                self.g[u] = self.rhs[u]
+                for s in self._neighbors(u): self._update_vertex(s)
+            else:
+                self.g[u] = INF
+                self._update_vertex(u)
+                for s in self._neighbors(u): self._update_vertex(s)
+            if not self.queue: break
+
+    def move_start(self, cell):
+        """ หุ่นย้ายช่อง -> เพิ่ม km แทนการเรียงคิวใหม่ """
+        idx = self._index(cell)
+        if idx == self.start: return
+        self.km += self._h(self.last, idx)
+        self.last = idx
+        self.start = idx
+
+    def update_cells(self, cells):
+        """
+        เรียกหลังกำแพงรอบช่องใน cells เปลี่ยน (masks อัปเดตแล้ว)
+        กำแพงที่ปิดไปแล้วไม่อยู่ใน _neighbors -> ต้องอัปเดตทั้ง 4 ช่องรอบๆ ด้วย
+        """
+        touched = set()
+        for x, y in cells:
+            touched.add(self._index((x, y)))
+            for d in range(4):
+                nx, ny = x + DIR_DX[d], y + DIR_DY[d]
+                if 0 <= nx < self.width and 0 <= ny < self.height:
+                    touched.add(self._index((nx, ny)))
+        for u in touched: self._update_vertex(u)
+
+    def distance(self):
+        """ ระยะ (ช่อง) จากหุ่นถึง Goal บนแผนที่ที่รู้ตอนนี้ (INF = ไปไม่ได้) """
+        return self.g[self.start]
+
+    def next_cell(self):
+        """ ช่องถัดไปที่ควรเดิน (None ถ้าถึงแล้ว / ไปไม่ได้) """
+        if self.start == self.goal or self.g[self.start] == INF: return None
+        best, best_g = None, INF
+        for s in self._neighbors(self.start):
+            if self.g[s] < best_g: best, best_g = s, self.g[s]
+        return self._cell(best) if best is not None else None
+
+    def path(self, max_len=None):
+        """ ไล่ตาม g ที่ลดลงจากหุ่นถึง Goal """
+        if self.g[self.start] == INF: return []
+        limit = max_len or self.width * self.height
+        u = self.start
+        out = [self._cell(u)]
+        while u != self.goal and len(out) <= limit:
+            nxt, best_g = None, INF
+            for s in self._neighbors(u):
+                if self.g[s] < best_g: nxt, best_g = s, self.g[s]
+            if nxt is None: break
+            u = nxt
+            out.append(self._cell(u))
+        return out
+
+# --- Flood Fill ---
+
+def flood_fill(masks, width, height, targets):
+    """ ระยะ (ช่อง) จากทุกช่องไปหา target ที่ใกล้ที่สุด (-1 = ไปไม่ถึง) """
+    dist = array('i', [-1]) * (width * height)
+    queue = deque()
+    for x, y in targets:
+        idx = y * width + x
+        if dist[idx] == -1:
+            dist[idx] = 0
+            queue.append(idx)
+    while queue:
+        u = queue.popleft()
+        m = masks[u]
+        x, y = u % width, u // width
+        for d in range(4):
+            if m & DIR_BITS[d]:
+                v = (y + DIR_DY[d]) * width + x + DIR_DX[d]
+                if dist[v] == -1:
+                    dist[v] = dist[u] + 1
+                    queue.append(v)
+    return dist
+
+def flood_fill_direction(masks, width, height, cell, heading, targets, blocked=()):
+    """
+    เลือกทิศ (0:N 1:E 2:S 3:W) ที่พาไปหา target ใกล้สุด
+    blocked = ทิศที่ sensor เห็นกำแพงตอนนี้ (ยังไม่ได้ plot ลงแผนที่)
+    ค่าเท่ากัน -> เลือกตรงไปก่อน แล้วขวา ซ้าย กลับหลัง (หมุนน้อยสุด)
+    คืนค่า (ทิศ, ระยะ) หรือ (None, -1) ถ้าไม่มีทางไป
+    """
+    dist = flood_fill(masks, width, height, targets)
+    x, y = cell
+    m = masks[y * width + x]
+    best, best_dist = None, -1
+    for rel in (0, 1, 3, 2):
+        d = (heading + rel) % 4
+        if not (m & DIR_BITS[d]) or d in blocked: continue
+        nd = dist[(y + DIR_DY[d]) * width + x + DIR_DX[d]]
+        if nd >= 0 and (best is None or nd < best_dist):
+            best, best_dist = d, nd
+    return best, best_dist
@@ -0,0 +1,400 @@
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import deque
+from multiprocessing import Process
+from queue import Empty, SimpleQueue
+
+import command_queue
+import wire_format
+from batch_solve import load_walls
+from maze_core import WALL, DIR_DX, DIR_DY, parse_command
+from mqtt_transport import MqttTransport
+
+"""
+MAZE ROBOT SIMULATOR (Headless)
+หุ่น mecanum จำลองแทนหุ่นจริงผ่าน MQTT -> ทดสอบ maze_mapper / maze_solver ได้โดยไม่ต้องลงสนาม
+
+- โหลด maze จาก horizontal_walls.csv / vertical_walls.csv (หรือ .mzb)
+- รับคำสั่ง: mapper (vx / vy / wz / target_yaw) และ solver (FORWARD:n / LEFT / RIGHT / STRAFE_*)
+  solver แบบ stream (robot/command_seq) -> buffer ตาม seq + ack กลับทาง robot/command_ack (ดู command_queue.py)
+- ส่ง sensor: lidar F/L/R/B (ray-cast ชนกำแพง + noise), yaw, ArUco grid_x/grid_y, state (CHECK ตอนถึงกลางช่อง)
+- เดินเวลาเองทีละ DT -> --speed 0 = เร็วที่สุด, 1 = เวลาจริง, 5 = เร็ว 5 เท่า
+- --instances N -> รัน N ตัวพร้อมกัน (process แยก) แต่ละตัวมี topic prefix ของตัวเอง (sim0/, sim1/, ...)
+  mapper / solver เลือกตัวด้วย --prefix simN/
+
+ตัวอย่าง:
+    python maze_sim.py                                  (maze จาก CSV ในโฟลเดอร์นี้, broker เดียวกับ mapper)
+    python maze_sim.py --maze corpus/m01.mzb --noise 15 --instances 4 --speed 3
+    python maze_solver.py --prefix sim2/                (คุมตัวที่ 2, maze_mapper ก็ใช้ --prefix แบบเดียวกัน)
+"""
+
+# --- 1. Settings ---
+MQTT_BROKER_IP = "broker.hivemq.com"
+MQTT_PORT = 1883
+
+# Topics (ตรงกับ maze_mapper / maze_solver)
+TOPIC_LIDAR_DATA = "robot/lidar_data1"
+TOPIC_ANGLE_DATA = "robot/anglem51"
+TOPIC_ARUCO_DATA = "robot/tracking_data"
+TOPIC_ARUCO_STATE = "robot/state"
+TOPIC_ROBOT_COMMAND = "robot/mecanum_command1"  # mapper
+TOPIC_SOLVER_COMMAND = "robot/command"          # solver
+TOPIC_COMMAND_SEQ = "robot/command_seq"         # solver (stream)
+TOPIC_COMMAND_ACK = "robot/command_ack"
+TOPIC_WIRE_CAPS = "robot/wire_caps"
+
+# Robot / Sensor Model
+CELL_MM = 700            # ขนาดช่อง (กำแพงข้างตัว ~350 mm < WALL_THRESHOLD ของ mapper)
+ROBOT_RADIUS = 0.2       # (ช่อง) ชนกำแพงเมื่อเข้าใกล้กว่านี้
+MAX_SPEED = 0.7          # (ช่อง/วินาที) ที่คำสั่ง 1.0
+MAX_TURN_RATE = 180.0    # (องศา/วินาที)
+YAW_KP = 4.0             # P controller สำหรับ target_yaw
+LIDAR_MAX_MM = 2000.0
+NOISE_MM = 10.0          # ส่วนเบี่ยงเบนมาตรฐานของ noise lidar
+CMD_TIMEOUT = 0.5        # ไม่มีคำสั่งเกินนี้ -> หยุด (เหมือน failsafe ของหุ่นจริง)
+CHECK_RADIUS = 0.12      # (ช่อง) ใกล้กลางช่องเท่านี้ -> state "CHECK"
+CHECK_HOLD = 0.3         # ค้าง CHECK ไว้กี่วินาทีก่อนกลับเป็น NORMAL
+QUEUE_SIZE = command_queue.WINDOW # buffer คำสั่ง stream ของหุ่น
+
+DT = 0.01                # physics step (วินาที)
+LIDAR_HZ = 50
+YAW_HZ = 50
+ARUCO_HZ = 10
+
+def yaw_vectors(yaw):
+    """ yaw (องศา, 0 = S, 90 = E แบบ mapper) -> (หน้า, ขวา) ในพิกัดแผนที่ (x ขวา, y ลง) """
+    r = math.radians(yaw)
+    return (math.sin(r), math.cos(r)), (-math.cos(r), math.sin(r))
+
+def dir_to_yaw(d):
+    return (2 - d) * 90 % 360
+
+def yaw_to_dir(yaw):
+    return round(2 - (yaw % 360) / 90) % 4
+
+def _angle_error(target, yaw):
+    return (target - yaw + 180) % 360 - 180
+
+# --- 2. Simulator ---
+
+class MazeSim:
+    def __init__(self, h_walls, v_walls, start=(0, 0), start_dir=2, noise_mm=NOISE_MM, seed=None):
+        self.h_walls = h_walls
+        self.v_walls = v_walls
+        self.width = len(h_walls[0])
+        self.height = len(v_walls)
+        self.x = start[0] + 0.5
+        self.y = start[1] + 0.5
+        self.yaw = float(dir_to_yaw(start_dir))
+        self.noise_mm = noise_mm
+        self.rng = random.Random(seed)
+        self.t = 0.0
+        self.vx = self.vy = 0.0          # คำสั่ง (หน่วย -1..1)
+        self.wz = None
+        self.target_yaw = None
+        self.last_cmd_t = -CMD_TIMEOUT
+        self.moves = deque()             # คำสั่งแบบ solver ที่รอทำ
+        self.goal = None                 # (x, y, yaw) ของคำสั่ง solver ที่กำลังทำ
+        self.goal_from_yaw = 0           # ทิศก่อนเริ่ม goal (halt กลางการหมุน -> กลับทิศเดิม)
+        self.distance = 0.0              # ระยะที่เดินไปแล้ว (ช่อง)
+        self.collisions = 0
+
+    # --- คำสั่ง ---
+    def command(self, data):
+        """ คำสั่งความเร็วจาก mapper (dict) -> ยกเลิกคำสั่งแบบ solver ที่ค้าง """
+        self.vx = float(data.get("vx", 0)); self.vy = float(data.get("vy", 0))
+        self.wz = float(data["wz"]) if "wz" in data else None
+        self.target_yaw = float(data["target_yaw"]) if "target_yaw" in data else None
+        self.last_cmd_t = self.t
+        self.moves.clear(); self.goal = None
+
+    def discrete(self, cmd):
+        """ คำสั่งจาก solver เช่น "FORWARD:3", "LEFT", "STRAFE_RIGHT:2" """
+        self.moves.append(parse_command(cmd))
+
+    def halt(self):
+        """ ยกเลิกคำสั่ง solver ทั้งหมด -> หยุดที่กลางช่องที่อยู่ (ไม่ค้างคร่อมกำแพง) """
+        self.moves.clear()
+        yaw = self.goal_from_yaw if self.goal else round(self.yaw / 90) * 90 % 360
+        self.goal = (math.floor(self.x) + 0.5, math.floor(self.y) + 0.5, yaw)
+
+    def idle(self):
+        return self.goal is None and not self.moves
+
+    def _next_goal(self):
+        name, cells = self.moves.popleft()
+        gx, gy, gyaw = self.goal[:3] if self.goal else (math.floor(self.x) + 0.5, math.floor(self.y) + 0.5, self.yaw)
+        d = yaw_to_dir(gyaw)
+        if name == "LEFT": gyaw = (gyaw + 90) % 360
+        elif name == "RIGHT": gyaw = (gyaw - 90) % 360
+        else:
+            if name == "STRAFE_LEFT": d = (d + 3) % 4
+            elif name == "STRAFE_RIGHT": d = (d + 1) % 4
+            elif name == "BACKWARD": d = (d + 2) % 4
+            gx += DIR_DX[d] * cells; gy += DIR_DY[d] * cells
+        self.goal_from_yaw = round((self.goal[2] if self.goal else self.yaw) / 90) * 90 % 360
+        self.goal = (gx, gy, round(gyaw / 90) * 90 % 360)
+
+    # --- Physics ---
+    def step(self, dt=DT):
+        self.t += dt
+        if self.goal is None and self.moves: self._next_goal()
+        if self.goal is not None:
+            mx, my, yaw_rate = self._goal_motion()
+        else:
+            if self.t - self.last_cmd_t > CMD_TIMEOUT: self.vx = self.vy = 0.0; self.wz = None; self.target_yaw = None
+            fwd, right = yaw_vectors(self.yaw)
+            mx = (self.vy * fwd[0] + self.vx * right[0]) * MAX_SPEED
+            my = (self.vy * fwd[1] + self.vx * right[1]) * MAX_SPEED
+            if self.target_yaw is not None:
+                yaw_rate = YAW_KP * _angle_error(self.target_yaw, self.yaw)
+            else:
+                yaw_rate = (self.wz or 0.0) * MAX_TURN_RATE
+        yaw_rate = max(-MAX_TURN_RATE, min(MAX_TURN_RATE, yaw_rate))
+        self.yaw = (self.yaw + yaw_rate * dt) % 360
+        self._move(mx * dt, my * dt)
+
+    def _goal_motion(self):
+        gx, gy, gyaw = self.goal
+        err = _angle_error(gyaw, self.yaw)
+        if abs(err) > 1.0: return 0.0, 0.0, YAW_KP * err # หมุนให้ตรงก่อนค่อยเดิน
+        dx, dy = gx - self.x, gy - self.y
+        dist = math.hypot(dx, dy)
+        if dist < 0.01:
+            self.x, self.y, self.yaw = gx, gy, float(gyaw)
+            self.goal = None
+            return 0.0, 0.0, 0.0
+        speed = min(MAX_SPEED, dist / DT)
+        return dx / dist * speed, dy / dist * speed, YAW_KP * err
+
+    def _move(self, dx, dy):
+        """ เลื่อนทีละแกน ชนกำแพงของช่องปัจจุบันแล้วหยุด (ไม่คิดมุมเสา) """
+        before = (self.x, self.y)
+        cx, cy = math.floor(self.x), math.floor(self.y)
+        x = self.x + dx
+        if dx > 0 and self._wall_v(cx + 1, cy) and x > cx + 1 - ROBOT_RADIUS: x = cx + 1 - ROBOT_RADIUS; self.collisions += 1
+        elif dx < 0 and self._wall_v(cx, cy) and x < cx + ROBOT_RADIUS: x = cx + ROBOT_RADIUS; self.collisions += 1
+        self.x = x
+        cx = math.floor(self.x)
+        y = self.y + dy
+        if dy > 0 and self._wall_h(cx, cy + 1) and y > cy + 1 - ROBOT_RADIUS: y = cy + 1 - ROBOT_RADIUS; self.collisions += 1
+        elif dy < 0 and self._wall_h(cx, cy) and y < cy + ROBOT_RADIUS: y = cy + ROBOT_RADIUS; self.collisions += 1
+        self.y = y
+        self.distance += math.hypot(self.x - before[0], self.y - before[1])
+
+    def _wall_h(self, x, y):
+        if not (0 <= x < self.width and 0 <= y <= self.height): return True
+        return self.h_walls[y][x] == WALL
+
+    def _wall_v(self, x, y):
+        if not (0 <= x <= self.width and 0 <= y < self.height): return True
+        return self.v_walls[y][x] == WALL
+
+    # --- Sensors ---
+    def ray(self, dx, dy, max_cells):
+        """ ระยะ (ช่อง) จากตำแหน่งหุ่นตามทิศ (dx, dy) ถึงกำแพงแรก (DDA ทีละเส้น grid) """
+        cx, cy = math.floor(self.x), math.floor(self.y)
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        t_max_x = ((cx + (dx > 0)) - self.x) / dx if dx else math.inf
+        t_max_y = ((cy + (dy > 0)) - self.y) / dy if dy else math.inf
+        t_dx = abs(1 / dx) if dx else math.inf
+        t_dy = abs(1 / dy) if dy else math.inf
+        while True:
+            if t_max_x < t_max_y:
+                if t_max_x > max_cells: return max_cells
+                if self._wall_v(cx + (step_x > 0), cy): return t_max_x
+                cx += step_x; t_max_x += t_dx
+            else:
+                if t_max_y > max_cells: return max_cells
+                if self._wall_h(cx, cy + (step_y > 0)): return t_max_y
+                cy += step_y; t_max_y += t_dy
+
+    def lidar(self):
+        """ (F, L, R, B) เป็น mm พร้อม noise """
+        fwd, right = yaw_vectors(self.yaw)
+        max_cells = LIDAR_MAX_MM / CELL_MM
+        out = []
+        for vx, vy in (fwd, (-right[0], -right[1]), right, (-fwd[0], -fwd[1])):
+            mm = self.ray(vx, vy, max_cells) * CELL_MM
+            if self.noise_mm > 0: mm += self.rng.gauss(0.0, self.noise_mm)
+            out.append(max(0.0, min(LIDAR_MAX_MM, mm)))
+        return tuple(out)
+
+    def cell(self):
+        return math.floor(self.x), math.floor(self.y)
+
+    def at_center(self):
+        return math.hypot(self.x % 1 - 0.5, self.y % 1 - 0.5) < CHECK_RADIUS
+
+# --- 3. MQTT Node ---
+
+class SimNode:
+    """
+    ผูก MazeSim กับ MQTT: รับคำสั่ง / ส่ง sensor ตามอัตราของหุ่นจริง (นับตามเวลา sim)
+    handler ของ transport ทำงานใน thread ของ transport -> แค่ใส่ inbox แล้ว run() ทำต่อใน thread ของ sim
+    ต้นทุกรอบ (MazeSim / RobotQueue.on_abort ไม่ถูกแก้จาก 2 thread พร้อมกัน ไม่ต้องมี lock)
+    """
+    def __init__(self, sim, transport, prefix="", wire_mode="auto"):
+        self.sim = sim
+        self.transport = transport
+        self.inbox = SimpleQueue()       # (handler, msg) ที่รอทำใน thread ของ sim
+        self.topic = lambda name: prefix + name
+        # caps แลกกันใน topic ที่มี prefix อยู่แล้ว -> รายการ topic ใน caps ไม่ใส่ prefix (แบบเดียวกับ mapper)
+        self.wire = wire_format.WireNegotiator(prefix + "robot", [TOPIC_ROBOT_COMMAND], wire_mode)
+        self.state = "NORMAL"
+        self.check_until = 0.0
+        self.last_cell = None
+        self.queue = command_queue.RobotQueue(lambda payload: transport.publish(self.topic(TOPIC_COMMAND_ACK), payload),
+                                              QUEUE_SIZE, on_abort=sim.halt)
+        transport.subscribe(self.topic(TOPIC_ROBOT_COMMAND), self._defer(self._on_command))
+        transport.subscribe(self.topic(TOPIC_SOLVER_COMMAND), self._defer(self._on_solver_command), qos=1)
+        transport.subscribe(self.topic(TOPIC_COMMAND_SEQ), self._defer(self._on_command_seq))
+        transport.subscribe(self.topic(TOPIC_WIRE_CAPS), self._defer(self._on_caps), qos=1)
+        transport.publish(self.topic(TOPIC_WIRE_CAPS), self.wire.caps_payload(), qos=1)
+
+    def _defer(self, handler):
+        return lambda msg: self.inbox.put((handler, msg))
+
+    def process_inbox(self):
+        """ (thread ของ sim) ทำทุกข้อความที่เข้ามาตั้งแต่รอบก่อน ตามลำดับที่ได้รับ """
+        while True:
+            try: handler, msg = self.inbox.get_nowait()
+            except Empty: return
+            try: handler(msg)
+            except Exception as e: print(f"Handler error on {msg.topic}: {e}") # แบบ transport: ข้อความเสียไม่ทำให้ loop ตาย
+
+    def _on_command(self, msg):
+        try: self.sim.command(wire_format.decode_command(msg.payload))
+        except (ValueError, KeyError) as e: print(f"Bad command: {e}")
+
+    def _on_solver_command(self, msg):
+        text = msg.payload.decode("utf-8")
+        if text.startswith("{"):
+            data = json.loads(text)
+            text = f"{data['cmd']}:{data.get('cells', 1)}"
+        self.sim.discrete(text)
+
+    def _on_command_seq(self, msg):
+        try: self.queue.on_message(msg.payload)
+        except (ValueError, KeyError) as e: print(f"Bad queued command: {e}")
+
+    def _feed_queue(self):
+        """ หุ่นว่าง -> ปิดคำสั่งที่ทำเสร็จ (ack done) แล้วหยิบคำสั่งถัดไปจาก buffer ทันที (ไม่ต้องรอ broker) """
+        if not self.sim.idle(): return
+        self.queue.complete()
+        item = self.queue.next_command()
+        if item: self.sim.discrete(item[1])
+
+    def _on_caps(self, msg):
+        if self.wire.on_caps(msg.payload):
+            self.transport.publish(self.topic(TOPIC_WIRE_CAPS), self.wire.caps_payload(), qos=1)
+
+    def publish_sensors(self, lidar=True, yaw=True, aruco=True):
+        sim, t, binary = self.sim, self.topic, self.wire.binary_for
+        if lidar:
+            self.transport.publish(t(TOPIC_LIDAR_DATA), wire_format.encode_lidar(*self._flrb(), binary=binary(TOPIC_LIDAR_DATA)))
+        if yaw:
+            self.transport.publish(t(TOPIC_ANGLE_DATA), wire_format.encode_yaw(round(sim.yaw, 2), binary=binary(TOPIC_ANGLE_DATA)),
+                                   coalesce=True)
+        if aruco:
+            gx, gy = sim.cell()
+            self.transport.publish(t(TOPIC_ARUCO_DATA), wire_format.encode_aruco(gx, gy, binary=binary(TOPIC_ARUCO_DATA)),
+                                   coalesce=True)
+        self._update_state()
+
+    def _flrb(self):
+        f, l, r, b = self.sim.lidar()
+        return round(f, 1), round(l, 1), round(r, 1), round(b, 1)
+
+    def _update_state(self):
+        """ CHECK ครั้งเดียวตอนถึงกลางช่องใหม่ (แบบหุ่นจริงที่เห็น ArUco) แล้วกลับเป็น NORMAL """
+        sim = self.sim
+        state = self.state
+        if sim.at_center() and sim.cell() != self.last_cell:
+            self.last_cell = sim.cell()
+            self.check_until = sim.t + CHECK_HOLD
+            state = "CHECK"
+        elif state == "CHECK" and sim.t >= self.check_until:
+            state = "NORMAL"
+        if state != self.state:
+            self.state = state
+            self.transport.publish(self.topic(TOPIC_ARUCO_STATE), state, qos=1)
+
+    def run(self, duration=None, speed=1.0):
+        """ speed <= 0 = เร็วที่สุด | 1.0 = เวลาจริง """
+        sim = self.sim
+        next_pub = {"lidar": 0.0, "yaw": 0.0, "aruco": 0.0}
+        periods = {"lidar": 1.0 / LIDAR_HZ, "yaw": 1.0 / YAW_HZ, "aruco": 1.0 / ARUCO_HZ}
+        wall0 = time.perf_counter()
+        while duration is None or sim.t < duration:
+            self.process_inbox()
+            self._feed_queue()
+            sim.step(DT)
+            due = {name: sim.t >= next_pub[name] for name in next_pub}
+            for name, is_due in due.items():
+                if is_due: next_pub[name] += periods[name]
+            if any(due.values()): self.publish_sensors(due["lidar"], due["yaw"], due["aruco"])
+            if speed > 0:
+                delay = sim.t / speed - (time.perf_counter() - wall0)
+                if delay > 0: time.sleep(delay)
+
+# --- 4. Main ---
+
+def run_instance(args, index):
+    h_walls, v_walls = load_walls(args.maze)
+    sx, sy, sdir = args.start
+    sim = MazeSim(h_walls, v_walls, (sx, sy), sdir, args.noise, seed=None if args.seed is None else args.seed + index)
+    prefix = args.prefix + (f"sim{index}/" if args.instances > 1 else "")
+    transport = MqttTransport(args.broker, args.port).start()
+    node = SimNode(sim, transport, prefix, args.wire)
+    print(f">>> Sim '{prefix or '-'}' {sim.width}x{sim.height} start ({sx},{sy}) dir {'NESW'[sdir]}")
+    try:
+        node.run(args.duration, args.speed)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        transport.stop()
+    print(f">>> Sim '{prefix or '-'}' t={sim.t:.1f}s distance {sim.distance:.1f} cells, {sim.collisions} collision steps")
+
+def parse_start(spec):
+    cell, _, heading = spec.partition(":")
+    x, y = (int(v) for v in cell.split(","))
+    return x, y, "NESW".index((heading or "S").upper())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless mecanum maze robot simulator over MQTT")
+    parser.add_argument("--maze", default=".", help=".mzb file or folder with horizontal/vertical_walls.csv")
+    parser.add_argument("--broker", default=MQTT_BROKER_IP)
+    parser.add_argument("--port", type=int, default=MQTT_PORT)
+    parser.add_argument("--start", type=parse_start, default=(0, 0, 2), help="x,y:DIR (default 0,0:S)")
+    parser.add_argument("--noise", type=float, default=NOISE_MM, help="lidar noise (mm, std dev)")
+    parser.add_argument("--speed", type=float, default=1.0, help="0 = as fast as possible, 1 = real time")
+    parser.add_argument("--duration", type=float, help="stop after this many simulated seconds")
+    parser.add_argument("--instances", type=int, default=1, help="parallel robots, topics prefixed simN/ (mapper / solver: --prefix simN/)")
+    parser.add_argument("--prefix", default="", help="topic prefix")
+    parser.add_argument("--wire", choices=wire_format.MODES, default="auto")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.maze):
+        print(f"!!! Maze '{args.maze}' not found")
+        return 1
+    if args.instances == 1:
+        run_instance(args, 0)
+        return 0
+    procs = [Process(target=run_instance, args=(args, i)) for i in range(args.instances)]
+    for p in procs: p.start()
+    try:
+        for p in procs: p.join()
+    except KeyboardInterrupt:
+        for p in procs: p.join()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
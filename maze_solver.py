@@ -1,26 +1,53 @@
+import argparse
 import threading
 import csv
+import os
 import pygame
 import time
-import paho.mqtt.client as mqtt
-from collections import deque
+import command_queue
+import maze_model
+import ui_render
+import wire_format
+from maze_core import solve_turn_aware, generate_commands, commands_cost
+from maze_core import compress_commands, command_to_wire, get_route_cache, parse_command
+from mqtt_transport import MqttTransport
 
 # --- 1. การตั้งค่า ---
 
 # --- ตั้งค่า MQTT ---
 MQTT_BROKER_IP = "broker.hivemq.com"
 MQTT_PORT = 1883
+TOPIC_PREFIX = ""         # เช่น "sim1/" -> คุยกับ maze_sim --instances ตัวที่ 1 (ตั้งด้วย --prefix)
 TOPIC_ROBOT_COMMAND = "robot/command"
+QOS_COMMAND = 1           # คำสั่งทีละ step ต้องถึงหุ่นครบ
+COMMAND_FORMAT = "text"   # "text" = FORWARD:5 | "json" = {"cmd":"FORWARD","cells":5}
+TOPIC_ARUCO_DATA = "robot/tracking_data"  # ตำแหน่งช่องจริงจาก ArUco (topic เดียวกับ maze_mapper)
+TOPIC_ARUCO_STATE = "robot/state"         # CHECK / STOP = หุ่นถึงกลางช่อง / หยุดแล้ว
+QOS_SENSOR = 0
+TOPIC_COMMAND_SEQ = "robot/command_seq"   # Auto Mode แบบ stream: คำสั่งมี seq (ดู command_queue.py)
+TOPIC_COMMAND_ACK = "robot/command_ack"
+QOS_STREAM = 0            # seq / ack ส่งซ้ำเองแล้ว ไม่ต้องรอ PUBACK
+COMMAND_WINDOW = command_queue.WINDOW # คำสั่งที่ค้างในหุ่นได้พร้อมกัน
+
+# --- ตั้งค่า Auto Mode (closed-loop) ---
+ARRIVED_STATES = ("CHECK", "STOP")
+SEGMENT_TIMEOUT = 3.0  # (วินาที) + CELL_TIME ต่อช่อง -> ไม่ถึงเป้าหมายในเวลานี้ = ถือว่าติด
+CELL_TIME = 2.0
+DRIFT_SETTLE = 0.5     # หุ่นต้องนิ่งอยู่ช่องเดิมนานเท่านี้ก่อนวางเส้นทางใหม่ (ไม่ให้ต่อคิวคำสั่งตอนยังเดินอยู่)
+MAX_REPLANS = 10
 
 # --- ตั้งค่าไฟล์ CSV ---
 FILE_GRID = 'maze_grid.csv'
 FILE_H_WALLS = 'horizontal_walls.csv'
 FILE_V_WALLS = 'vertical_walls.csv'
+FILE_MAZE_BIN = 'maze.mzb' # ไฟล์ binary (genmap เซฟให้) -> ถ้ามีจะโหลดอันนี้ก่อน
 
 # --- ตั้งค่าแผนที่ ---
-MAZE_WIDTH = 8
+MAZE_WIDTH = 8       # ค่าเริ่มต้น -> main_ui ตั้งใหม่ตามขนาดของ maze ที่โหลด (.mzb / CSV)
 MAZE_HEIGHT = 8
-CELL_SIZE = 80
+CELL_SIZE = 80       # 8x8 -> 80, maze ใหญ่ / เล็กกว่านี้ย่อ / ขยายให้ด้านยาวพอดี MAP_SIZE_PX
+MAP_SIZE_PX = 640
+MIN_CELL_SIZE = 8
 UI_PANEL_WIDTH = 250 # พื้นที่ด้านขวาสำหรับแสดง Step
 
 # --- 2. ตัวแปร Global ---
@@ -30,17 +57,30 @@ running = True
 maze_grid = []
 horizontal_walls = []
 vertical_walls = []
+open_masks = None   # N/E/S/W bitmask ต่อช่อง (สร้างครั้งเดียวหลังโหลด CSV)
+route_cache = None  # BFS tree ที่คำนวณไว้แล้ว (key = hash ของกำแพง)
+show_heatmap = False # [H] แสดงระยะจากจุดเริ่มไปทุกช่อง
 
 start_point = None
 start_dir = 2       # 0:N, 1:E, 2:S, 3:W
 end_point = None
 solved_path = []
 
+# --- โหมด Solver ---
+# BFS     : ทางที่สั้นที่สุด (นับช่อง)
+# FASTEST : A* บน (x, y, heading) คิดเวลาหมุนด้วย -> หุ่นวิ่งจบเร็วที่สุด
+SOLVER_MODES = ["BFS", "FASTEST"]
+solver_mode = "BFS"
+compress_mode = False   # รวม FORWARD ติดกัน / สไลด์ข้าง -> ส่งคำสั่งน้อยลง
+
 # --- ตัวแปรสำหรับ Step Execution ---
 command_list = []   # ["FORWARD", "LEFT", ...]
 current_step_index = 0 # ตอนนี้อยู่ที่ Step ไหน
 is_step_mode = False   # กำลังอยู่ในโหมดรันหรือไม่
 execution_status = "IDLE" # IDLE, WAITING, FINISHED
+auto_runner = None     # [A] Auto Mode (AutoRunner) สร้างตอนเปิด UI
+command_stream = None  # CommandStream ของ Auto Mode
+stream_mode = True     # [Q] True = stream ทั้งเส้นทาง (window) | False = ส่งทีละ segment ทาง robot/command
 
 # --- 3. ฟังก์ชัน Helper: โหลด CSV ---
 def load_csv(filename):
@@ -56,86 +96,239 @@ def load_csv(filename):
         print(f"!!! Error loading '{filename}': {e}")
         return [[0]*MAZE_WIDTH for _ in range(MAZE_HEIGHT)] # Return empty if fail
 
-# --- 4. Solver Logic (BFS) ---
-def is_move_valid(x1, y1, x2, y2, h_walls, v_walls):
-    if not (0 <= x2 < MAZE_WIDTH and 0 <= y2 < MAZE_HEIGHT): return False
-    try:
-        if x1 == x2: # เดินแนวตั้ง
-            if y2 < y1: return h_walls[y1][x1] == 2 # ขึ้น
-            else: return h_walls[y2][x1] == 2 # ลง
-        elif y1 == y2: # เดินแนวนอน
-            if x2 < x1: return v_walls[y1][x1] == 2 # ซ้าย
-            else: return v_walls[y1][x2] == 2 # ขวา
-    except: return False
-    return False
-
-def solve_bfs(start, end, h_walls, v_walls):
-    queue = deque([(start, [start])])
-    visited = set([start])
-    while queue:
-        (curr, path) = queue.popleft()
-        if curr == end: return path
-        cx, cy = curr
-        # N, E, S, W
-        neighbors = [(cx, cy-1), (cx+1, cy), (cx, cy+1), (cx-1, cy)]
-        for nx, ny in neighbors:
-            if (nx, ny) not in visited and is_move_valid(cx, cy, nx, ny, h_walls, v_walls):
-                visited.add((nx, ny))
-                queue.append(((nx, ny), path + [(nx, ny)]))
-    return []
-
-def generate_commands(path, start_dir):
-    if not path or len(path) < 2: return []
-    commands = []
-    curr_d = start_dir
-    for i in range(len(path) - 1):
-        x1, y1 = path[i]
-        x2, y2 = path[i+1]
-        
-        # หา Target Dir
-        if y2 < y1: target_d = 0 # N
-        elif x2 > x1: target_d = 1 # E
-        elif y2 > y1: target_d = 2 # S
-        else: target_d = 3 # W
-        
-        diff = target_d - curr_d
-        # ปรับค่า Diff (-1=Left, 1=Right)
-        if diff == 3: diff = -1
-        elif diff == -3: diff = 1
-        
-        if diff == 0: pass
-        elif diff == 1 or diff == -3: commands.append("RIGHT")
-        elif diff == -1 or diff == 3: commands.append("LEFT")
-        elif abs(diff) == 2: 
-            commands.append("RIGHT")
-            commands.append("RIGHT")
-            
-        commands.append("FORWARD")
-        curr_d = target_d
-    return commands
+def load_maze():
+    """ โหลด .mzb (mmap) ถ้ามีและไม่เก่ากว่า CSV ไม่งั้นใช้ CSV 3 ไฟล์ -> (grid, h_walls, v_walls) """
+    csv_time = max((os.path.getmtime(f) for f in (FILE_GRID, FILE_H_WALLS, FILE_V_WALLS) if os.path.exists(f)), default=0)
+    if os.path.exists(FILE_MAZE_BIN) and os.path.getmtime(FILE_MAZE_BIN) >= csv_time:
+        try:
+            maze = maze_model.load_maze_file(FILE_MAZE_BIN)
+            print(f"โหลด '{FILE_MAZE_BIN}' สำเร็จ")
+            return maze
+        except Exception as e:
+            print(f"!!! Error loading '{FILE_MAZE_BIN}': {e} -> ใช้ CSV แทน")
+    grid = load_csv(FILE_GRID)
+    h_walls, v_walls = maze_model.from_lists(load_csv(FILE_H_WALLS)), maze_model.from_lists(load_csv(FILE_V_WALLS))
+    width, height = h_walls.shape[1], v_walls.shape[0]
+    if h_walls.shape != (height + 1, width) or v_walls.shape != (height, width + 1):
+        raise ValueError(f"Wall CSV shapes do not match: horizontal {h_walls.shape}, vertical {v_walls.shape} "
+                         f"(expected (H+1, W) and (H, W+1))")
+    if len(grid) != height or any(len(row) != width for row in grid):
+        grid = [[2] * width for _ in range(height)] # grid ไม่ตรงขนาด (ไม่ได้ใช้ solve) -> ช่องว่างทั้งหมด
+    return grid, h_walls, v_walls
+
+def solve_route(start, end, direction):
+    """ คืนค่า (path, commands) ตามโหมด Solver ที่เลือก """
+    if solver_mode == "FASTEST":
+        path, commands = solve_turn_aware(start, direction, end, horizontal_walls, vertical_walls, open_masks)
+    else:
+        path = route_cache.route(start, end)
+        commands = generate_commands(path, direction)
+    if compress_mode: commands = compress_commands(commands)
+    return path, commands
 
-# --- 5. MQTT Helper ---
+# --- 4. MQTT Helper ---
 def send_command(client, cmd):
     if client:
-        print(f">>> MQTT SEND: {cmd}")
-        client.publish(TOPIC_ROBOT_COMMAND, cmd)
+        payload = command_to_wire(cmd, COMMAND_FORMAT)
+        print(f">>> MQTT SEND: {payload}")
+        client.publish(TOPIC_ROBOT_COMMAND, payload, qos=QOS_COMMAND)
+
+def on_robot_message(msg):
+    """ (MQTT transport thread) ตำแหน่ง / state ของหุ่น -> AutoRunner """
+    try:
+        if msg.topic == TOPIC_ARUCO_DATA:
+            x, y = wire_format.decode_aruco(msg.payload)
+            if x == x and y == y: auto_runner.on_tracking(int(x), int(y)) # NaN = ไม่มีค่าใน packet
+        elif msg.topic == TOPIC_ARUCO_STATE:
+            auto_runner.on_state(msg.payload.decode("utf-8").strip())
+        elif msg.topic == TOPIC_COMMAND_ACK:
+            command_stream.on_ack(msg.payload)
+    except Exception as e:
+        print(f"!!! Bad robot message on {msg.topic}: {e}")
+
+# --- 5. Auto Execution (closed-loop) ---
+
+TURN_DELTA = {"LEFT": 3, "RIGHT": 1} # คำสั่งที่หมุนอยู่กับที่ (ไม่ย้ายช่อง)
+
+class AutoRunner:
+    """
+    [A] Auto Mode: แทนการกด Spacebar ทีละ step
+    - ส่งทีละ segment = คำสั่งหมุน (ถ้ามี) + คำสั่งที่ย้ายช่อง 1 คำสั่ง (FORWARD:n / STRAFE_*)
+    - ยืนยัน = robot/state เป็น CHECK/STOP ขณะที่ ArUco อยู่ที่ช่องปลาย segment
+      -> ส่ง segment ถัดไปทันทีใน thread ของ MQTT (ไม่ต้องรอเฟรมของ UI)
+    - หุ่นหยุดที่ช่องนอก path / ไม่ถึงเป้าหมายในเวลา -> รอให้นิ่งแล้ววางเส้นทางใหม่จากช่องจริง
+      (ใช้ทิศที่หุ่นควรหันอยู่ตามแผน เพราะ topic ตำแหน่งไม่มีทิศ)
+    - stream (CommandStream): ส่งทั้งเส้นทางล่วงหน้าตาม window ของหุ่น segment ใช้แค่ติดตามความคืบหน้า
+      -> drift / timeout / stop = cancel หางคิวทันที หุ่นไม่เดินต่อตามแผนเดิม
+    """
+    def __init__(self, send, replan, stream=None):
+        self.send = send       # send(cmd)
+        self.replan = replan   # replan(cell, heading) -> (path, commands)
+        self.stream = stream   # None = ส่งทีละ segment ด้วย send()
+        self.lock = threading.Lock()
+        self.active = False
+        self.status = "IDLE"
+        self.path = []
+        self.commands = []
+        self.version = 0       # เพิ่มทุกครั้งที่ path / commands เปลี่ยน (UI ใช้ sync)
+        self.replans = 0
+        self.cell = None       # ช่องล่าสุดจาก ArUco
+        self.cell_since = 0.0  # เวลาที่เข้าช่องนี้
+        self.robot_state = None
+        self._reset_progress(2)
+
+    def _reset_progress(self, heading):
+        self.plan_heading = heading
+        self.heading = heading # ทิศของหุ่นหลังจบ segment ที่ส่งไปล่าสุด
+        self.seq_base = 0      # seq ของ commands[0] ใน stream
+        self.cmd_index = 0     # คำสั่งถัดไปที่ยังไม่ได้ส่ง
+        self.path_index = 0    # ช่องใน path ที่ยืนยันแล้ว
+        self.target_index = 0  # ช่องใน path ที่ segment ปัจจุบันต้องไปถึง
+        self.deadline = 0.0
+        self.drift = False
+
+    # --- API (UI thread) ---
+    def start(self, path, commands, heading, now=None):
+        now = now or time.time()
+        with self.lock:
+            self.path, self.commands = list(path), list(commands)
+            self.version += 1
+            self.replans = 0
+            self._reset_progress(heading)
+            self.active = True
+            if self.stream: self.seq_base = self.stream.replace(self.commands, now)
+            self._send_segment(now)
+
+    def stop(self, status="STOPPED"):
+        with self.lock:
+            if self.active and self.stream: self.stream.cancel(stop=True)
+            self.active = False
+            self.status = status
+
+    def poll(self, now=None):
+        """ เรียกทุกเฟรม: ส่งซ้ำคำสั่ง stream ที่หาย + จัดการ timeout / drift (หุ่นนิ่งแล้ว) """
+        now = now or time.time()
+        if self.stream: self.stream.poll(now)
+        with self.lock:
+            if not self.active or self.cell is None: return
+            if not self.drift and now > self.deadline:
+                if self.cell == self.path[self.target_index]:
+                    self._confirm(now) # ไม่ได้รับ state CHECK แต่อยู่ช่องเป้าหมายแล้ว
+                    return
+                self._set_drift("TIMEOUT")
+            if self.drift and now - self.cell_since >= DRIFT_SETTLE and (self.stream is None or self.stream.settled()):
+                self._replan(now)
+
+    # --- MQTT thread ---
+    def on_tracking(self, x, y, now=None):
+        with self.lock:
+            if (x, y) == self.cell: return
+            self.cell = (x, y)
+            self.cell_since = now or time.time()
+            if self.active and self.robot_state in ARRIVED_STATES: self._check_arrival(now or time.time())
+
+    def on_state(self, state, now=None):
+        with self.lock:
+            self.robot_state = state
+            if self.active and state in ARRIVED_STATES and self.cell is not None: self._check_arrival(now or time.time())
+
+    # --- Internal (ถือ lock อยู่แล้ว) ---
+    def _check_arrival(self, now):
+        if self.stream and self.cell in self.path[self.target_index + 1:]:
+            # stream: หุ่นทำคำสั่งถัดไปเองโดยไม่รอ -> CHECK ของ segment ก่อนหน้าอาจหลุด ยืนยันข้ามมาถึงช่องนี้
+            index = self.path.index(self.cell, self.target_index + 1)
+            while self.active and self.target_index < index: self._confirm(now)
+            if not self.active: return
+        if self.cell == self.path[self.target_index]:
+            self._confirm(now)
+        elif self.cell not in self.path[self.path_index:self.target_index]: # ช่องกลางทางของ FORWARD:n = ปกติ
+            self._set_drift("DRIFT")
+
+    def _set_drift(self, status):
+        self.drift = True
+        self.status = status
+        if self.stream: self.stream.cancel(stop=True) # หยุดหุ่นก่อน ค่อยวางเส้นทางใหม่ตอนนิ่ง
+
+    def _send_segment(self, now):
+        end, moved, heading = self.cmd_index, 0, self.heading
+        while end < len(self.commands):
+            name, cells = parse_command(self.commands[end])
+            end += 1
+            if name in TURN_DELTA: heading = (heading + TURN_DELTA[name]) % 4
+            else:
+                moved = cells
+                break
+        if self.stream is None:
+            for cmd in self.commands[self.cmd_index:end]: self.send(cmd)
+        self.cmd_index, self.heading = end, heading
+        self.target_index = min(self.path_index + moved, len(self.path) - 1)
+        self.deadline = now + SEGMENT_TIMEOUT + CELL_TIME * moved
+        self.drift = False
+        self.status = "RUNNING"
+        if moved == 0: self._confirm(now) # เหลือแต่หมุน (หรือไม่มีคำสั่งแล้ว) -> ไม่มีช่องให้ยืนยัน
+
+    def _confirm(self, now):
+        self.path_index = self.target_index
+        if self.cmd_index >= len(self.commands):
+            self.active = False
+            self.status = "FINISHED"
+        else:
+            self._send_segment(now)
+
+    def _replan(self, now):
+        if self.replans >= MAX_REPLANS:
+            self.active = False
+            self.status = "FAILED"
+            return
+        self.replans += 1
+        heading = self._executed_heading() if self.stream else self.heading
+        path, commands = self.replan(self.cell, heading)
+        if not path:
+            self.active = False
+            self.status = "NO ROUTE"
+            return
+        print(f"[Auto] Re-plan #{self.replans} from {self.cell}")
+        self.path, self.commands = list(path), list(commands)
+        self.version += 1
+        self._reset_progress(heading)
+        if self.stream: self.seq_base = self.stream.replace(self.commands, now)
+        self._send_segment(now)
+
+    def _executed_heading(self):
+        """ stream: ทิศตอนเริ่มแผน + คำสั่งหมุนที่หุ่น ack ว่าทำเสร็จ (segment ที่ถูก cancel กลางทางอาจยังไม่ได้หมุน) """
+        done = max(0, min(self.stream.done - self.seq_base + 1, len(self.commands)))
+        heading = self.plan_heading
+        for cmd in self.commands[:done]:
+            name = parse_command(cmd)[0]
+            if name in TURN_DELTA: heading = (heading + TURN_DELTA[name]) % 4
+        return heading
 
 # --- 6. Main UI ---
 def main_ui():
-    global running, start_point, end_point, solved_path, command_list
-    global start_dir, current_step_index, is_step_mode, execution_status
+    global running, start_point, end_point, solved_path, command_list, auto_runner, command_stream, stream_mode
+    global start_dir, current_step_index, is_step_mode, execution_status, solver_mode, compress_mode
     
     # Load Data
-    global maze_grid, horizontal_walls, vertical_walls
-    maze_grid = load_csv(FILE_GRID)
-    horizontal_walls = load_csv(FILE_H_WALLS)
-    vertical_walls = load_csv(FILE_V_WALLS)
+    global maze_grid, horizontal_walls, vertical_walls, open_masks, route_cache, show_heatmap
+    global MAZE_WIDTH, MAZE_HEIGHT, CELL_SIZE
+    try:
+        maze_grid, horizontal_walls, vertical_walls = load_maze()
+    except ValueError as e:
+        print(f"!!! {e}")
+        return
+    MAZE_WIDTH, MAZE_HEIGHT = maze_model.maze_shape(horizontal_walls, vertical_walls)
+    CELL_SIZE = max(MIN_CELL_SIZE, MAP_SIZE_PX // max(MAZE_WIDTH, MAZE_HEIGHT))
+    open_masks = maze_model.to_mask_array(maze_model.open_masks(horizontal_walls, vertical_walls))
+    route_cache = get_route_cache(route_cache, horizontal_walls, vertical_walls, open_masks)
 
     pygame.init()
     
     # Screen Setup
-    SCREEN_W = (MAZE_WIDTH * CELL_SIZE) + UI_PANEL_WIDTH
-    SCREEN_H = (MAZE_HEIGHT * CELL_SIZE) + 60 # + Status Bar
+    # พื้นที่แผนที่อย่างน้อย MAP_SIZE_PX (maze ไม่จัตุรัส -> ที่เหลือเป็นพื้นว่าง, panel / status bar ไม่หด)
+    map_w = max(MAZE_WIDTH * CELL_SIZE, MAP_SIZE_PX)
+    map_h = max(MAZE_HEIGHT * CELL_SIZE, MAP_SIZE_PX)
+    SCREEN_W = map_w + UI_PANEL_WIDTH
+    SCREEN_H = map_h + 60 # + Status Bar
     screen = pygame.display.set_mode((SCREEN_W, SCREEN_H))
     pygame.display.set_caption("Maze Solver : Step-by-Step Mode")
     
@@ -151,21 +344,32 @@ def main_ui():
     C_HIGHLIGHT = (0, 255, 0)
     C_PENDING = (100, 100, 100)
     
-    # MQTT
-    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
-    try:
-        client.connect(MQTT_BROKER_IP, MQTT_PORT, 60)
-        client.loop_start()
-        print("MQTT Connected.")
-    except:
-        print("!!! MQTT Connect Fail (Offline Mode)")
+    # MQTT (ต่อ / ต่อใหม่เองใน background -> ออฟไลน์ก็ยังใช้ UI ได้ คำสั่งจะรอในคิว)
+    client = MqttTransport(MQTT_BROKER_IP, MQTT_PORT, prefix=TOPIC_PREFIX)
+    for topic in (TOPIC_ARUCO_DATA, TOPIC_ARUCO_STATE, TOPIC_COMMAND_ACK):
+        client.subscribe(topic, on_robot_message, qos=QOS_SENSOR)
+    command_stream = command_queue.CommandStream(lambda payload: client.publish(TOPIC_COMMAND_SEQ, payload, qos=QOS_STREAM),
+                                                 COMMAND_WINDOW)
+    auto_runner = AutoRunner(lambda cmd: send_command(client, cmd),
+                             lambda cell, heading: solve_route(cell, end_point, heading),
+                             command_stream if stream_mode else None)
+    auto_seen = (auto_runner.version, auto_runner.status, auto_runner.cmd_index)
+    client.start()
 
     clock = pygame.time.Clock()
 
+    # Render cache (พื้นช่อง / กำแพง เป็น Surface ที่สร้างใหม่เฉพาะตอนเปลี่ยน + ส่งขึ้นจอเฉพาะโซนที่เปลี่ยน)
+    map_rect = pygame.Rect(0, 0, map_w, map_h)
+    wall_layer = ui_render.WallLayer(MAZE_WIDTH, MAZE_HEIGHT, CELL_SIZE, (0, 0, 0), 4)
+    text = ui_render.TextCache()
+    zones = ui_render.DirtyZones()
+    cells_key, cells_surface = False, None # False = ยังไม่เคยสร้าง
+
     while running:
         # --- Event Handling ---
         for event in pygame.event.get():
             if event.type == pygame.QUIT: running = False
+            zones.handle_event(event)
             
             # 1. Mouse Click (เลือกจุด)
             if event.type == pygame.MOUSEBUTTONDOWN:
@@ -173,14 +377,13 @@ def main_ui():
                 if mx < MAZE_WIDTH * CELL_SIZE and my < MAZE_HEIGHT * CELL_SIZE:
                     gx, gy = mx // CELL_SIZE, my // CELL_SIZE
                     
-                    if not is_step_mode: # ห้ามแก้จุดตอนรัน
+                    if not is_step_mode and not auto_runner.active: # ห้ามแก้จุดตอนรัน
                         if start_point is None:
                             start_point = (gx, gy)
                         elif end_point is None and (gx, gy) != start_point:
                             end_point = (gx, gy)
                             # Auto Solve
-                            solved_path = solve_bfs(start_point, end_point, horizontal_walls, vertical_walls)
-                            command_list = generate_commands(solved_path, start_dir)
+                            solved_path, command_list = solve_route(start_point, end_point, start_dir)
                             execution_status = "READY"
                         else:
                             # Reset
@@ -195,7 +398,7 @@ def main_ui():
             if event.type == pygame.KEYDOWN:
                 
                 # [G] Start / Stop
-                if event.key == pygame.K_g and command_list:
+                if event.key == pygame.K_g and command_list and not auto_runner.active:
                     if not is_step_mode:
                         is_step_mode = True
                         current_step_index = 0
@@ -206,6 +409,33 @@ def main_ui():
                         is_step_mode = False
                         execution_status = "PAUSED"
 
+                # [A] Auto Mode: ส่งคำสั่งต่อเองเมื่อหุ่นยืนยันว่าถึงช่อง (กดซ้ำ = หยุด)
+                if event.key == pygame.K_a and command_list and not is_step_mode:
+                    if auto_runner.active:
+                        auto_runner.stop()
+                    else:
+                        print(f"--- Auto Mode ({f'stream W{COMMAND_WINDOW}' if stream_mode else 'step'}) ---")
+                        auto_runner.start(solved_path, command_list, start_dir)
+
+                # [Q] สลับ Auto Mode แบบ stream (ส่งล่วงหน้า) / ทีละ segment (หุ่นที่ยังไม่รองรับ robot/command_seq)
+                if event.key == pygame.K_q and not auto_runner.active:
+                    stream_mode = not stream_mode
+                    auto_runner.stream = command_stream if stream_mode else None
+
+                # [M] สลับโหมด Solver / [F] รวมคำสั่ง (แก้ได้ตอนยังไม่รัน)
+                if event.key in (pygame.K_m, pygame.K_f) and not is_step_mode and not auto_runner.active:
+                    if event.key == pygame.K_m:
+                        solver_mode = SOLVER_MODES[(SOLVER_MODES.index(solver_mode) + 1) % len(SOLVER_MODES)]
+                    else:
+                        compress_mode = not compress_mode
+                    if start_point and end_point:
+                        solved_path, command_list = solve_route(start_point, end_point, start_dir)
+                        current_step_index = 0
+                        execution_status = "READY"
+
+                # [H] Heatmap ระยะทางจากจุดเริ่ม
+                if event.key == pygame.K_h: show_heatmap = not show_heatmap
+
                 # [Spacebar] Execute Next Step
                 if event.key == pygame.K_SPACE:
                     if is_step_mode and current_step_index < len(command_list):
@@ -233,121 +463,156 @@ def main_ui():
                     send_command(client, manual_cmd)
                 
                 # [Start Dir]
-                if not is_step_mode and start_point and not end_point:
+                if not is_step_mode and not auto_runner.active and start_point and not end_point:
                     if event.key == pygame.K_UP: start_dir = 0
                     elif event.key == pygame.K_RIGHT: start_dir = 1
                     elif event.key == pygame.K_DOWN: start_dir = 2
                     elif event.key == pygame.K_LEFT: start_dir = 3
                     # Recalculate if needed (not critical here)
 
-        # --- Drawing ---
-        screen.fill(C_BG)
+        # --- Auto Mode: timeout / re-plan แล้ว sync path + step ที่แสดง ---
+        auto_runner.poll()
+        auto_now = (auto_runner.version, auto_runner.status, auto_runner.cmd_index)
+        if auto_now != auto_seen:
+            if auto_now[0] != auto_seen[0]: solved_path, command_list = auto_runner.path, auto_runner.commands
+            auto_seen = auto_now
+            current_step_index = auto_runner.cmd_index
+            execution_status = f"AUTO {auto_runner.status}"
+        executing = is_step_mode or auto_runner.active
+        robot_cell = auto_runner.cell
+
+        # --- Drawing (เฉพาะโซนที่เปลี่ยน) ---
+        if zones.full: screen.fill(C_BG)
         
-        # 1. Draw Maze (Zone ซ้าย)
-        for y in range(MAZE_HEIGHT):
-            for x in range(MAZE_WIDTH):
-                rect = (x*CELL_SIZE, y*CELL_SIZE, CELL_SIZE, CELL_SIZE)
+        # 1. Draw Maze (Zone ซ้าย) : พื้นช่อง / heatmap เป็น layer ที่สร้างใหม่เฉพาะตอนเปิดปิด heatmap หรือย้ายจุดเริ่ม
+        heat_key = start_point if show_heatmap else None
+        if cells_key != heat_key:
+            cells_key = heat_key
+            dist_map = route_cache.distances(start_point) if heat_key else None
+            max_dist = max(max(dist_map), 1) if dist_map else 1
+            def cell_color(x, y):
                 color = (255, 255, 255)
                 if maze_grid[y][x] != 2: color = (220, 220, 220)
-                pygame.draw.rect(screen, color, rect)
-                pygame.draw.rect(screen, (230, 230, 230), rect, 1)
-        
-        # Walls
-        for y in range(MAZE_HEIGHT+1):
-            for x in range(MAZE_WIDTH):
-                if horizontal_walls[y][x] == 1:
-                    pygame.draw.line(screen, (0,0,0), (x*CELL_SIZE, y*CELL_SIZE), ((x+1)*CELL_SIZE, y*CELL_SIZE), 4)
-        for y in range(MAZE_HEIGHT):
-            for x in range(MAZE_WIDTH+1):
-                if vertical_walls[y][x] == 1:
-                    pygame.draw.line(screen, (0,0,0), (x*CELL_SIZE, y*CELL_SIZE), (x*CELL_SIZE, (y+1)*CELL_SIZE), 4)
-
-        # Path
-        if solved_path:
-            pts = [(x*CELL_SIZE+CELL_SIZE//2, y*CELL_SIZE+CELL_SIZE//2) for x,y in solved_path]
-            pygame.draw.lines(screen, (0,0,255), False, pts, 3)
+                if dist_map:
+                    d = dist_map[y*MAZE_WIDTH + x]
+                    if d < 0: color = (150, 150, 150) # ไปไม่ถึง
+                    else:
+                        k = d / max_dist # ใกล้ = เหลือง, ไกล = แดง
+                        color = (255, int(240 - 170*k), int(160 - 120*k))
+                return color
+            cells_surface = ui_render.grid_layer(MAZE_WIDTH, MAZE_HEIGHT, CELL_SIZE, C_BG, (230, 230, 230), cell_color=cell_color)
+        wall_layer.update(horizontal_walls, vertical_walls)
+
+        map_key = (heat_key, wall_layer.version, tuple(solved_path), start_point, end_point, robot_cell)
+        if zones.begin(screen, "map", map_rect, map_key, C_BG):
+            screen.blit(cells_surface, (0, 0))
+            wall_layer.draw(screen)
+
+            # Path
+            if solved_path:
+                pts = [(x*CELL_SIZE+CELL_SIZE//2, y*CELL_SIZE+CELL_SIZE//2) for x,y in solved_path]
+                pygame.draw.lines(screen, (0,0,255), False, pts, 3)
             
-        # Start/End
-        if start_point:
-            sx, sy = start_point
-            pygame.draw.rect(screen, (0,200,0), (sx*CELL_SIZE, sy*CELL_SIZE, CELL_SIZE, CELL_SIZE), 4)
-            # Arrow
-            cx, cy = sx*CELL_SIZE+CELL_SIZE//2, sy*CELL_SIZE+CELL_SIZE//2
-            pygame.draw.circle(screen, (255,0,0), (cx, cy), 5) # Simple dot for now
+            # Start/End
+            if start_point:
+                sx, sy = start_point
+                pygame.draw.rect(screen, (0,200,0), (sx*CELL_SIZE, sy*CELL_SIZE, CELL_SIZE, CELL_SIZE), 4)
+                # Arrow
+                cx, cy = sx*CELL_SIZE+CELL_SIZE//2, sy*CELL_SIZE+CELL_SIZE//2
+                pygame.draw.circle(screen, (255,0,0), (cx, cy), 5) # Simple dot for now
             
-        if end_point:
-            ex, ey = end_point
-            pygame.draw.rect(screen, (200,0,0), (ex*CELL_SIZE, ey*CELL_SIZE, CELL_SIZE, CELL_SIZE), 4)
+            if end_point:
+                ex, ey = end_point
+                pygame.draw.rect(screen, (200,0,0), (ex*CELL_SIZE, ey*CELL_SIZE, CELL_SIZE, CELL_SIZE), 4)
+
+            # ตำแหน่งจริงจาก ArUco
+            if robot_cell and 0 <= robot_cell[0] < MAZE_WIDTH and 0 <= robot_cell[1] < MAZE_HEIGHT:
+                rx, ry = robot_cell
+                pygame.draw.circle(screen, (255,140,0), (rx*CELL_SIZE+CELL_SIZE//2, ry*CELL_SIZE+CELL_SIZE//2), CELL_SIZE//5, 3)
 
         # 2. Draw UI Panel (Zone ขวา)
-        panel_rect = (MAZE_WIDTH*CELL_SIZE, 0, UI_PANEL_WIDTH, SCREEN_H)
-        pygame.draw.rect(screen, C_PANEL, panel_rect)
-        
-        # Title
-        title_s = font_big.render("Command List", True, (255,255,255))
-        screen.blit(title_s, (MAZE_WIDTH*CELL_SIZE + 20, 20))
+        panel_rect = (map_w, 0, UI_PANEL_WIDTH, SCREEN_H)
+        panel_key = (tuple(map(str, command_list)), current_step_index, executing, show_heatmap, solver_mode, compress_mode, stream_mode)
+        if zones.begin(screen, "panel", panel_rect, panel_key, C_PANEL):
+            # Title
+            title_s = text.render(font_big, "Command List", (255,255,255))
+            screen.blit(title_s, (map_w + 20, 20))
         
-        # Instructions
-        help_y = SCREEN_H - 140
-        help_lines = [
-            "[G] Start Step Mode",
-            "[Space] Execute Next",
-            "[Arrows] Manual Fix",
-            "[Click] Reset Map"
-        ]
-        for i, line in enumerate(help_lines):
-            t = font_ui.render(line, True, (150, 150, 150))
-            screen.blit(t, (MAZE_WIDTH*CELL_SIZE + 20, help_y + i*25))
-
-        # Command List Scroll
-        start_list_y = 70
-        max_items = 15
+            # Instructions
+            help_y = SCREEN_H - 265
+            help_lines = [
+                "[G] Start Step Mode",
+                "[Space] Execute Next",
+                "[A] Auto Run (ArUco)",
+                f"[Q] Auto Send: {f'STREAM W{COMMAND_WINDOW}' if stream_mode else 'STEP'}",
+                "[Arrows] Manual Fix",
+                "[Click] Reset Map",
+                f"[H] Heatmap: {'ON' if show_heatmap else 'OFF'}",
+                f"[M] Solver: {solver_mode}",
+                f"[F] Merge Cmds: {'ON' if compress_mode else 'OFF'}"
+            ]
+            for i, line in enumerate(help_lines):
+                t = text.render(font_ui, line, (150, 150, 150))
+                screen.blit(t, (map_w + 20, help_y + i*25))
+
+            # Command List Scroll
+            start_list_y = 70
+            max_items = 14
         
-        # คำนวณหน้าที่จะแสดง (Scroll ตาม Current Step)
-        display_start_idx = 0
-        if current_step_index > 5:
-            display_start_idx = current_step_index - 5
+            # คำนวณหน้าที่จะแสดง (Scroll ตาม Current Step)
+            display_start_idx = 0
+            if current_step_index > 5:
+                display_start_idx = current_step_index - 5
             
-        for i in range(display_start_idx, min(len(command_list), display_start_idx + max_items)):
-            cmd = command_list[i]
+            for i in range(display_start_idx, min(len(command_list), display_start_idx + max_items)):
+                cmd = command_list[i]
             
-            # Determine Color
-            color = C_TXT_PANEL
-            prefix = "   "
+                # Determine Color
+                color = C_TXT_PANEL
+                prefix = "   "
             
-            if is_step_mode:
-                if i < current_step_index:
-                    color = (100, 100, 100) # ทำไปแล้ว (เทาเข้ม)
-                    prefix = "[x]"
-                elif i == current_step_index:
-                    color = C_HIGHLIGHT     # กำลังจะทำ (เขียวสว่าง)
-                    prefix = ">>>"
-                else:
-                    color = C_PENDING       # รอทำ (เทา)
-                    prefix = "[ ]"
+                if executing:
+                    if i < current_step_index:
+                        color = (100, 100, 100) # ทำไปแล้ว (เทาเข้ม)
+                        prefix = "[x]"
+                    elif i == current_step_index:
+                        color = C_HIGHLIGHT     # กำลังจะทำ (เขียวสว่าง)
+                        prefix = ">>>"
+                    else:
+                        color = C_PENDING       # รอทำ (เทา)
+                        prefix = "[ ]"
             
-            text_str = f"{i+1}. {prefix} {cmd}"
-            txt = font_cmd.render(text_str, True, color)
-            screen.blit(txt, (MAZE_WIDTH*CELL_SIZE + 20, start_list_y + (i - display_start_idx)*25))
+                text_str = f"{i+1}. {prefix} {cmd}"
+                txt = text.render(font_cmd, text_str, color)
+                screen.blit(txt, (map_w + 20, start_list_y + (i - display_start_idx)*25))
 
         # 3. Status Bar (Bottom)
-        status_rect = (0, MAZE_HEIGHT*CELL_SIZE, MAZE_WIDTH*CELL_SIZE, 60)
-        pygame.draw.rect(screen, (30, 30, 30), status_rect)
-        
+        status_rect = (0, map_h, map_w, 60)
         status_msg = f"STATUS: {execution_status}"
-        if is_step_mode:
+        if command_list:
+            status_msg += f" | {solver_mode} ~{commands_cost(command_list):.1f}s"
+        if executing:
             status_msg += f" | Step: {current_step_index}/{len(command_list)}"
             if execution_status == "WAITING":
                 status_msg += " (Press Space)"
+        if auto_runner.replans and execution_status.startswith("AUTO"):
+            status_msg += f" | Re-plan: {auto_runner.replans}"
+        if auto_runner.active and auto_runner.stream:
+            status_msg += f" | Q: {command_stream.in_flight()}/{COMMAND_WINDOW}"
+            if command_stream.retransmits: status_msg += f" retx {command_stream.retransmits}"
         
-        st_txt = font_ui.render(status_msg, True, (255, 255, 255))
-        screen.blit(st_txt, (20, MAZE_HEIGHT*CELL_SIZE + 20))
+        if zones.begin(screen, "status", status_rect, status_msg, (30, 30, 30)):
+            st_txt = text.render(font_ui, status_msg, (255, 255, 255))
+            screen.blit(st_txt, (20, map_h + 20))
 
-        pygame.display.flip()
+        zones.flush()
         clock.tick(30)
 
     pygame.quit()
-    if client: client.disconnect()
+    if client: client.stop()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maze solver UI")
+    parser.add_argument("--prefix", default=TOPIC_PREFIX, help="topic prefix, e.g. sim1/ for maze_sim --instances")
+    TOPIC_PREFIX = parser.parse_args().prefix
     main_ui()
\ No newline at end of file
@@ -0,0 +1,410 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import deque
+
+"""
+MQTT TRANSPORT (asyncio)
+ชั้นส่ง/รับ MQTT ที่ maze_solver และ maze_mapper ใช้ร่วมกัน
+
+- asyncio event loop รันใน thread ของตัวเอง -> UI (pygame) เรียก publish() ได้ตรงๆ ไม่ต้องเป็น async
+- paho ถูกขับด้วย socket callback ของ asyncio (ไม่มี thread ของ paho แยก)
+- QoS กำหนดต่อ topic (subscribe / publish)
+- Batching    : sender ดึงคิวทีละหลายข้อความแล้วส่งรวดเดียว
+- Backpressure: จำกัดจำนวนข้อความที่ broker ยังไม่ตอบ (max_inflight) + คิวมีขนาดจำกัด
+                coalesce=True -> ข้อความใหม่ของ topic เดิมแทนที่อันที่ยังค้างคิว (เช่นคำสั่งความเร็ว)
+- Reconnect   : ต่อใหม่อัตโนมัติ (exponential backoff) แล้ว subscribe ใหม่ทุก topic
+- Metrics     : latency ต่อ topic (tx = เข้าคิว -> broker รับ, rx = ได้รับ -> handler ทำเสร็จ)
+- Prefix      : prefix="sim1/" -> ทุก topic ที่ subscribe / publish ถูกเติมหน้า (ใช้คู่กับ maze_sim --instances)
+                handler / on_latency เห็น topic แบบไม่มี prefix -> code ของ mapper / solver ไม่ต้องเปลี่ยน
+
+ทดสอบได้ทั้งกับ Mosquitto ในเครื่อง และ FakeBroker (in-process):
+    python mqtt_transport.py localhost
+    python mqtt_transport.py --fake
+"""
+
+DEFAULT_PORT = 1883
+MAX_QUEUE = 256       # ข้อความที่รอส่งได้สูงสุด (เกินนี้ทิ้งข้อความใหม่)
+MAX_INFLIGHT = 20     # ข้อความที่ส่งไปแล้วแต่ยังไม่ได้ ack
+BATCH_MAX = 32
+RECONNECT_MIN = 0.5   # วินาที
+RECONNECT_MAX = 10.0
+
+def topic_matches(sub, topic):
+    """ เทียบ topic กับ subscription แบบ MQTT (+ = 1 ชั้น, # = ที่เหลือทั้งหมด) """
+    sub_parts = sub.split("/")
+    topic_parts = topic.split("/")
+    for i, part in enumerate(sub_parts):
+        if part == "#": return True
+        if i >= len(topic_parts): return False
+        if part != "+" and part != topic_parts[i]: return False
+    return len(sub_parts) == len(topic_parts)
+
+def _paho_client():
+    import paho.mqtt.client as mqtt # import ตอนใช้จริง -> โหมด headless / FakeBroker ไม่ต้องมี paho
+    return mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+
+# --- 1. Metrics ---
+
+class TopicStats:
+    def __init__(self):
+        self.count = 0
+        self.dropped = 0     # คิวเต็ม -> ทิ้ง
+        self.coalesced = 0   # ถูกข้อความใหม่ของ topic เดียวกันแทนที่
+        self.last_ms = 0.0
+        self.avg_ms = 0.0    # EMA
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.count += 1
+        self.last_ms = ms
+        self.avg_ms = ms if self.count == 1 else self.avg_ms * 0.9 + ms * 0.1
+        if ms > self.max_ms: self.max_ms = ms
+
+    def as_dict(self):
+        return {"count": self.count, "dropped": self.dropped, "coalesced": self.coalesced,
+                "last_ms": round(self.last_ms, 3), "avg_ms": round(self.avg_ms, 3), "max_ms": round(self.max_ms, 3)}
+
+class Message:
+    __slots__ = ("topic", "payload", "qos", "t")
+    def __init__(self, topic, payload, qos=0, t=0.0):
+        self.topic = topic; self.payload = payload; self.qos = qos; self.t = t
+
+# --- 2. Transport ---
+
+class MqttTransport:
+    def __init__(self, host, port=DEFAULT_PORT, keepalive=60, client_factory=None,
+                 max_queue=MAX_QUEUE, max_inflight=MAX_INFLIGHT, batch_max=BATCH_MAX, prefix=""):
+        self.host = host; self.port = port; self.keepalive = keepalive
+        self.prefix = prefix
+        self.max_queue = max_queue; self.max_inflight = max_inflight; self.batch_max = batch_max
+        self.client = (client_factory or _paho_client)()
+        self.connected = False
+        self.reconnects = 0
+        self._subs = {}              # topic -> [qos, [handler, ...]]
+        self._queue = deque()        # Message ที่รอส่ง
+        self._pending = {}           # topic -> Message ที่ยังอยู่ในคิว (ใช้กับ coalesce)
+        self._queue_lock = threading.Lock()
+        self._inflight = {}          # mid -> Message
+        self.tx_stats = {}
+        self.rx_stats = {}
+        self.on_latency = None       # on_latency("tx" | "rx", topic, ms) -> ส่งต่อให้ latency tracer
+        self._loop = None
+        self._thread = None
+        self._stopping = False
+        self._backoff = RECONNECT_MIN
+
+    # --- API (เรียกจาก thread ไหนก็ได้) ---
+    def subscribe(self, topic, handler, qos=0):
+        """ handler(msg) ถูกเรียกใน thread ของ transport (msg.topic / msg.payload เป็น bytes) """
+        topic = self.prefix + topic
+        entry = self._subs.setdefault(topic, [qos, []])
+        entry[0] = max(entry[0], qos)
+        entry[1].append(handler)
+        if self.connected: self._call(self.client.subscribe, topic, entry[0])
+
+    def publish(self, topic, payload, qos=0, coalesce=False):
+        """ เข้าคิวแล้วคืนทันที -> False ถ้าคิวเต็ม (ข้อความถูกทิ้ง) """
+        if isinstance(payload, str): payload = payload.encode("utf-8")
+        topic = self.prefix + topic
+        now = time.perf_counter()
+        with self._queue_lock:
+            stats = self.tx_stats.get(topic) or self.tx_stats.setdefault(topic, TopicStats())
+            if coalesce and topic in self._pending:
+                old = self._pending[topic]
+                old.payload = payload; old.qos = qos   # คงเวลาเข้าคิวเดิมไว้ -> latency รวมเวลาที่รอจริง
+                stats.coalesced += 1
+                return True
+            if len(self._queue) >= self.max_queue:
+                stats.dropped += 1
+                return False
+            msg = Message(topic, payload, qos, now)
+            self._queue.append(msg)
+            if coalesce: self._pending[topic] = msg
+            else: self._pending.pop(topic, None) # ห้ามข้อความถัดไปแซงข้อความนี้ (เช่น STOP)
+        self._wakeup()
+        return True
+
+    def is_connected(self):
+        return self.connected
+
+    def queued(self):
+        return len(self._queue)
+
+    def metrics(self):
+        with self._queue_lock:
+            return {"tx": {t: s.as_dict() for t, s in self.tx_stats.items()},
+                    "rx": {t: s.as_dict() for t, s in self.rx_stats.items()},
+                    "queued": len(self._queue), "inflight": len(self._inflight),
+                    "connected": self.connected, "reconnects": self.reconnects}
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._wake = asyncio.Event()
+        self._link_down = asyncio.Event()
+        self._done = asyncio.Event()
+        self._thread = threading.Thread(target=self._thread_main, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, flush_timeout=1.0):
+        """ รอส่งคิวที่ค้าง (สูงสุด flush_timeout วินาที) แล้วตัดการเชื่อมต่อ """
+        deadline = time.time() + flush_timeout
+        while self.connected and (self._queue or self._inflight) and time.time() < deadline:
+            time.sleep(0.01)
+        self._stopping = True
+        if self._loop is not None: self._loop.call_soon_threadsafe(self._shutdown)
+        if self._thread is not None: self._thread.join(timeout=2.0)
+
+    # --- asyncio side ---
+    def _call(self, fn, *args):
+        if self._loop is not None: self._loop.call_soon_threadsafe(fn, *args)
+
+    def _wakeup(self):
+        if self._loop is not None: self._loop.call_soon_threadsafe(self._wake.set)
+
+    def _thread_main(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._main())
+        finally:
+            self._loop.close()
+
+    async def _main(self):
+        self._link_down.set()
+        self._install_callbacks()
+        self.client.connect_async(self.host, self.port, self.keepalive)
+        tasks = [asyncio.ensure_future(coro) for coro in (self._run_connection(), self._run_sender(), self._run_misc())]
+        await self._done.wait()
+        for task in tasks: task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _shutdown(self):
+        if self.connected:
+            try: self.client.disconnect()
+            except Exception: pass
+        self.connected = False
+        self._done.set()
+
+    def _install_callbacks(self):
+        c = self.client
+        loop = self._loop
+        c.on_connect = lambda client, userdata, flags, rc, props=None: loop.call_soon_threadsafe(self._on_connect, rc)
+        c.on_disconnect = lambda client, userdata, flags, rc, props=None: loop.call_soon_threadsafe(self._on_disconnect, rc)
+        c.on_publish = lambda client, userdata, mid, rc=None, props=None: loop.call_soon_threadsafe(self._on_publish, mid)
+        c.on_message = lambda client, userdata, msg: loop.call_soon_threadsafe(self._on_message, msg.topic, msg.payload, time.perf_counter())
+        # socket ของ paho -> ให้ asyncio เฝ้าแทน thread ของ paho
+        c.on_socket_open = lambda client, userdata, sock: self._in_loop(loop.add_reader, sock, client.loop_read)
+        c.on_socket_close = lambda client, userdata, sock: self._in_loop(self._forget_socket, sock)
+        c.on_socket_register_write = lambda client, userdata, sock: self._in_loop(loop.add_writer, sock, client.loop_write)
+        c.on_socket_unregister_write = lambda client, userdata, sock: self._in_loop(loop.remove_writer, sock)
+
+    def _in_loop(self, fn, *args):
+        """ ถ้าอยู่ใน thread ของ loop อยู่แล้วเรียกเลย (paho ปิด socket ทันทีหลัง callback) """
+        if threading.current_thread() is self._thread: fn(*args)
+        else: self._loop.call_soon_threadsafe(fn, *args)
+
+    def _forget_socket(self, sock):
+        try:
+            self._loop.remove_reader(sock)
+            self._loop.remove_writer(sock)
+        except (OSError, ValueError):
+            pass # socket ถูกปิดไปก่อนแล้ว
+
+    def _on_connect(self, rc):
+        if rc != 0:
+            print(f"MQTT connect refused rc={rc}")
+            self._link_down.set()
+            return
+        self.connected = True
+        self._backoff = RECONNECT_MIN
+        print(f"Connected to MQTT ({self.host})")
+        if self._subs:
+            self.client.subscribe([(topic, entry[0]) for topic, entry in self._subs.items()])
+        self._wake.set()
+
+    def _on_disconnect(self, rc):
+        was_connected = self.connected
+        self.connected = False
+        self._inflight.clear() # QoS 1/2 -> paho ส่งซ้ำเองหลังต่อใหม่
+        if self._stopping: return
+        if was_connected: print(f"MQTT disconnected rc={rc} -> reconnecting")
+        self._link_down.set()
+
+    def _on_publish(self, mid):
+        msg = self._inflight.pop(mid, None)
+        if msg is not None:
+            ms = (time.perf_counter() - msg.t) * 1000
+            with self._queue_lock:
+                self.tx_stats[msg.topic].add(ms)
+            if self.on_latency is not None: self.on_latency("tx", msg.topic[len(self.prefix):], ms)
+        self._wake.set()
+
+    def _on_message(self, topic, payload, t_recv):
+        local = topic[len(self.prefix):] if topic.startswith(self.prefix) else topic
+        msg = Message(local, payload, 0, t_recv)
+        handled = False
+        for sub, (qos, handlers) in list(self._subs.items()):
+            if sub != topic and not topic_matches(sub, topic): continue
+            for handler in handlers:
+                handled = True
+                try: handler(msg)
+                except Exception as e: print(f"Handler error on {topic}: {e}")
+        if handled:
+            ms = (time.perf_counter() - t_recv) * 1000
+            stats = self.rx_stats.get(topic) or self.rx_stats.setdefault(topic, TopicStats())
+            stats.add(ms)
+            if self.on_latency is not None: self.on_latency("rx", local, ms)
+
+    async def _run_connection(self):
+        first = True
+        while True:
+            await self._link_down.wait()
+            self._link_down.clear()
+            if not first:
+                await asyncio.sleep(self._backoff)
+                self._backoff = min(self._backoff * 2, RECONNECT_MAX)
+                self.reconnects += 1
+            first = False
+            try:
+                # TCP connect เป็น blocking -> ทำใน executor ไม่ให้ loop ค้าง
+                await self._loop.run_in_executor(None, self.client.reconnect)
+            except (OSError, ValueError) as e:
+                print(f"!!! MQTT connect failed ({e}) retry in {self._backoff:.1f}s")
+                self._link_down.set()
+
+    async def _run_sender(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            while self.connected:
+                budget = min(self.batch_max, self.max_inflight - len(self._inflight))
+                if budget <= 0: break   # รอ ack ก่อน (_on_publish จะปลุก)
+                with self._queue_lock:
+                    batch = [self._queue.popleft() for _ in range(min(budget, len(self._queue)))]
+                    for msg in batch:
+                        if self._pending.get(msg.topic) is msg: del self._pending[msg.topic]
+                if not batch: break
+                for i, msg in enumerate(batch):
+                    info = self.client.publish(msg.topic, msg.payload, msg.qos)
+                    if info.rc != 0:
+                        # หลุดระหว่างส่ง -> คืนข้อความที่เหลือเข้าหัวคิว
+                        with self._queue_lock: self._queue.extendleft(reversed(batch[i:]))
+                        break
+                    self._inflight[info.mid] = msg
+                await asyncio.sleep(0) # ให้ socket / ack ได้ทำงานระหว่าง batch
+
+    async def _run_misc(self):
+        while True:
+            await asyncio.sleep(1.0)
+            if self.connected: self.client.loop_misc() # keepalive ping / ตรวจ timeout
+
+# --- 3. In-process Fake Broker (สำหรับทดสอบ ไม่ต้องมี network) ---
+
+class _PublishInfo:
+    def __init__(self, rc, mid):
+        self.rc = rc; self.mid = mid
+
+class FakeBroker:
+    """
+    broker ในหน่วยความจำ: ส่งข้อความให้ทุก client ที่ subscribe ตรง
+    ack_delay -> จำลอง broker ช้า | online = False -> ต่อไม่ได้ | drop_clients() -> ตัดทุกคน
+    """
+    def __init__(self, ack_delay=0.0):
+        self.ack_delay = ack_delay
+        self.online = True
+        self.clients = []
+        self.published = []   # (topic, payload, qos) ที่ broker ได้รับทั้งหมด
+        self._lock = threading.Lock()
+
+    def client(self):
+        return FakeClient(self)
+
+    def route(self, topic, payload, qos):
+        with self._lock:
+            self.published.append((topic, payload, qos))
+            targets = [c for c in self.clients if c.connected and any(topic_matches(s, topic) for s in c.subs)]
+        for c in targets:
+            if c.on_message: c.on_message(c, None, Message(topic, payload, qos))
+
+    def drop_clients(self):
+        with self._lock: clients = list(self.clients)
+        for c in clients: c._drop(7)
+
+class FakeClient:
+    """ ส่วนของ API paho ที่ MqttTransport ใช้ """
+    def __init__(self, broker):
+        self.broker = broker
+        self.connected = False
+        self.subs = set()
+        self._mid = 0
+        self.on_connect = self.on_disconnect = self.on_publish = self.on_message = None
+        self.on_socket_open = self.on_socket_close = None
+        self.on_socket_register_write = self.on_socket_unregister_write = None
+
+    def connect_async(self, host, port=DEFAULT_PORT, keepalive=60):
+        pass
+
+    def reconnect(self):
+        if not self.broker.online: raise ConnectionRefusedError("fake broker offline")
+        with self.broker._lock:
+            if self not in self.broker.clients: self.broker.clients.append(self)
+        self.connected = True
+        self.subs.clear()   # clean session
+        if self.on_connect: self.on_connect(self, None, {}, 0, None)
+
+    def disconnect(self):
+        self._drop(0)
+
+    def _drop(self, rc):
+        if not self.connected: return
+        self.connected = False
+        with self.broker._lock:
+            if self in self.broker.clients: self.broker.clients.remove(self)
+        if self.on_disconnect: self.on_disconnect(self, None, {}, rc, None)
+
+    def subscribe(self, topic, qos=0):
+        topics = topic if isinstance(topic, list) else [(topic, qos)]
+        for t, _ in topics: self.subs.add(t)
+        return 0, self._next_mid()
+
+    def publish(self, topic, payload, qos=0):
+        if not self.connected: return _PublishInfo(4, 0) # MQTT_ERR_NO_CONN
+        mid = self._next_mid()
+        self.broker.route(topic, payload, qos)
+        if self.on_publish:
+            if self.broker.ack_delay > 0:
+                threading.Timer(self.broker.ack_delay, self.on_publish, (self, None, mid, 0, None)).start()
+            else:
+                self.on_publish(self, None, mid, 0, None)
+        return _PublishInfo(0, mid)
+
+    def loop_misc(self):
+        return 0
+
+    def _next_mid(self):
+        self._mid += 1
+        return self._mid
+
+# --- 4. Self Test (loopback) ---
+
+def self_test(host=None, count=200):
+    """ publish หา topic ตัวเอง แล้วแสดง latency (host=None -> FakeBroker) """
+    factory = FakeBroker().client if host is None else None
+    transport = MqttTransport(host or "fake", client_factory=factory).start()
+    received = []
+    transport.subscribe("maze/selftest", lambda msg: received.append(msg.payload), qos=1)
+    deadline = time.time() + 5
+    while not transport.is_connected() and time.time() < deadline: time.sleep(0.01)
+    for i in range(count): transport.publish("maze/selftest", str(i), qos=1)
+    while len(received) < count and time.time() < deadline: time.sleep(0.01)
+    transport.stop()
+    print(f">>> received {len(received)}/{count}")
+    for direction, topics in (("tx", transport.metrics()["tx"]), ("rx", transport.metrics()["rx"])):
+        for topic, stats in topics.items(): print(f"    {direction} {topic}: {stats}")
+    return len(received) == count
+
+if __name__ == "__main__":
+    arg = sys.argv[1] if len(sys.argv) > 1 else "--fake"
+    sys.exit(0 if self_test(None if arg == "--fake" else arg) else 1)
@@ -0,0 +1,87 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import lidar_filter
+import maze_mapper
+import session_log
+from batch_solve import load_walls
+
+"""
+SESSION REPLAY (Headless)
+เล่น session log (.mzlog) ที่ mapper บันทึกไว้ ผ่าน on_message + wall logic ของ maze_mapper โดยตรง
+ไม่มี pygame / MQTT -> ใช้ทดสอบการปรับ WALL_THRESHOLD / WALL_TIME_TH / LIDAR_SMOOTH_ALPHA / LIDAR_FILTER กับหลายร้อย run
+
+ส่งออก: JSON lines ทีละ session (จำนวนช่องที่ plot, action ที่เลือก, กำแพงที่ขาด/เกินเทียบกับ maze อ้างอิง)
+
+ตัวอย่าง:
+    python replay_sessions.py sessions/ --ref maze.mzb --wall-threshold 850 --jobs 8
+    python replay_sessions.py sessions/session_20250101_120000.mzlog --speed 1   (เวลาจริง)
+"""
+
+# --- 1. Worker (รันใน process แยก) ---
+
+def replay_file(filename, params, ref_path=None, speed=0.0):
+    for name, value in params.items(): setattr(maze_mapper, name, value)
+    try:
+        ref_h = ref_v = None
+        if ref_path: ref_h, ref_v = load_walls(ref_path)
+        with contextlib.redirect_stdout(io.StringIO()): # print ของ mapper (Auto-Plotted ...) ไม่ปน JSON
+            result = maze_mapper.replay_session(filename, speed, ref_h, ref_v)
+        result["ok"] = True
+        return result
+    except Exception as e:
+        return {"file": filename, "ok": False, "error": str(e)}
+
+# --- 2. Main ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded mapper sessions headless (JSON lines output)")
+    parser.add_argument("paths", nargs="+", help=".mzlog files or folders")
+    parser.add_argument("--ref", help="reference maze (.mzb or folder with horizontal/vertical_walls.csv)")
+    parser.add_argument("--speed", type=float, default=0.0, help="0 = as fast as possible, 1 = real time")
+    parser.add_argument("--wall-threshold", type=float, default=maze_mapper.WALL_THRESHOLD)
+    parser.add_argument("--wall-time", type=float, default=maze_mapper.WALL_TIME_TH)
+    parser.add_argument("--alpha", type=float, default=maze_mapper.LIDAR_SMOOTH_ALPHA)
+    parser.add_argument("--filter", choices=lidar_filter.FILTERS, default=maze_mapper.LIDAR_FILTER)
+    parser.add_argument("--mode", choices=maze_mapper.EXPLORE_MODES, default=maze_mapper.explore_mode)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--out", help="write JSON lines here instead of stdout")
+    args = parser.parse_args(argv)
+
+    sessions = session_log.find_sessions(args.paths)
+    if not sessions:
+        print(f"!!! No session logs in {args.paths}", file=sys.stderr)
+        return 1
+    params = {"WALL_THRESHOLD": args.wall_threshold, "WALL_TIME_TH": args.wall_time,
+              "LIDAR_SMOOTH_ALPHA": args.alpha, "LIDAR_FILTER": args.filter, "explore_mode": args.mode}
+
+    out = open(args.out, "w") if args.out else sys.stdout
+    messages = missing = phantom = failed = 0
+    t0 = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            futures = [pool.submit(replay_file, s, params, args.ref, args.speed) for s in sessions]
+            for future in as_completed(futures):
+                row = future.result()
+                if row["ok"]:
+                    messages += row["messages"]
+                    missing += row.get("missing", 0); phantom += row.get("phantom", 0)
+                else:
+                    failed += 1
+                out.write(json.dumps(row) + "\n")
+                out.flush()
+    finally:
+        if args.out: out.close()
+    elapsed = time.perf_counter() - t0
+    print(f">>> {len(sessions)} sessions, {messages} messages in {elapsed:.2f}s "
+          f"({messages / elapsed:.0f} msg/s) | missing {missing} | phantom {phantom} | {failed} failed", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+import time
+from array import array
+
+"""
+SENSOR RING BUFFER
+ส่งข้อมูล sensor จาก thread ของ MQTT (paho) ไปยัง Control Loop โดยไม่ต้องใช้ Lock
+
+- จองพื้นที่ไว้ล่วงหน้า (array('d') แยกคอลัมน์) -> ไม่ allocate ตอนรับข้อมูล
+- Writer 1 ตัว (on_message) / Reader 1 ตัว (control loop)
+- Writer เขียนข้อมูลให้เสร็จก่อน แล้วค่อยเพิ่ม write_seq (publish)
+- Reader อ่านทุก sample ตั้งแต่ seq ที่อ่านล่าสุด -> ไม่มี sample หาย (ถ้าอ่านทันก่อนวนครบรอบ)
+  ถ้าอ่านไม่ทันจนโดนเขียนทับ จะข้าม sample ที่เสียและนับไว้ใน dropped
+"""
+
+class SensorRing:
+    def __init__(self, fields, capacity=1024):
+        if capacity & (capacity - 1): raise ValueError("capacity must be a power of 2")
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self._mask = capacity - 1
+        self.t = array('d', [0.0]) * capacity
+        self.columns = [array('d', [0.0]) * capacity for _ in self.fields]
+        self.write_seq = 0  # จำนวน sample ที่เขียนเสร็จแล้วทั้งหมด
+        self.dropped = 0
+
+    def push(self, values, t=None):
+        """ (Writer) เพิ่ม sample 1 ชุด เรียงตาม fields """
+        i = self.write_seq & self._mask
+        self.t[i] = time.time() if t is None else t
+        for col, v in zip(self.columns, values): col[i] = v
+        self.write_seq += 1
+
+    def read_since(self, seq):
+        """
+        (Reader) อ่านทุก sample ตั้งแต่ seq
+        คืนค่า (seq ใหม่, [(t, v1, v2, ...), ...])
+        """
+        end = self.write_seq
+        start = max(seq, end - self.capacity)
+        rows = []
+        for n in range(start, end):
+            i = n & self._mask
+            rows.append((self.t[i],) + tuple(col[i] for col in self.columns))
+        # ตรวจว่า writer วนมาเขียนทับระหว่างที่อ่านหรือไม่ (แบบ seqlock)
+        # slot ของ seq = write_seq - capacity อาจกำลังถูกเขียนอยู่ -> ทิ้งด้วย
+        overrun = self.write_seq - self.capacity + 1
+        if overrun > start:
+            rows = rows[overrun - start:]
+            start = overrun
+        self.dropped += start - seq
+        return end, rows
+
+    def latest(self):
+        """ (Reader) sample ล่าสุด หรือ None ถ้ายังไม่มีข้อมูล """
+        while True:
+            seq = self.write_seq
+            if seq == 0: return None
+            i = (seq - 1) & self._mask
+            row = (self.t[i],) + tuple(col[i] for col in self.columns)
+            if self.write_seq - seq < self.capacity - 1: return row
+            # โดนเขียนทับระหว่างอ่าน -> อ่านใหม่
@@ -0,0 +1,111 @@
+import gzip
+import os
+import struct
+import time
+
+"""
+SESSION LOG (Record / Replay)
+บันทึกทุกข้อความ MQTT ที่ mapper ได้รับ ลงไฟล์ .mzlog (gzip, append-only) แล้วเล่นซ้ำแบบ offline
+
+Layout (หลัง gunzip):
+- Header  : "MZLOG" + version (u8)  (เขียนครั้งเดียวตอนสร้างไฟล์)
+- Record  : time (f64) | topic length (u16) | payload length (u32) | topic | payload
+เปิดไฟล์เดิมแล้วเขียนต่อ = gzip member ใหม่ต่อท้าย (gzip อ่านต่อกันได้เอง)
+flush ทุก FLUSH_EVERY record -> ถ้าโปรแกรมตาย ข้อมูลหายไม่เกินนั้น
+"""
+
+MAGIC = b"MZLOG"
+VERSION = 1
+RECORD = struct.Struct("<dHI")
+FLUSH_EVERY = 200
+SESSION_DIR = "sessions"
+
+# --- 1. Record ---
+
+class SessionRecorder:
+    def __init__(self, filename):
+        self.filename = filename
+        folder = os.path.dirname(filename)
+        if folder: os.makedirs(folder, exist_ok=True)
+        is_new = not os.path.exists(filename) or os.path.getsize(filename) == 0
+        self._file = gzip.open(filename, "ab", compresslevel=6)
+        if is_new: self._file.write(MAGIC + bytes([VERSION]))
+        self.count = 0
+
+    def record(self, topic, payload, t=None):
+        if isinstance(payload, str): payload = payload.encode("utf-8")
+        topic_b = topic.encode("utf-8")
+        self._file.write(RECORD.pack(time.time() if t is None else t, len(topic_b), len(payload)) + topic_b + payload)
+        self.count += 1
+        if self.count % FLUSH_EVERY == 0: self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+def new_session_path(folder=SESSION_DIR):
+    return os.path.join(folder, time.strftime("session_%Y%m%d_%H%M%S.mzlog"))
+
+# --- 2. Read ---
+
+def read_session(filename):
+    """ yield (t, topic, payload) ตามลำดับที่บันทึก (record สุดท้ายที่เขียนไม่ครบจะถูกข้าม) """
+    with gzip.open(filename, "rb") as f:
+        header = f.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)] != MAGIC: raise ValueError(f"'{filename}' is not a session log")
+        if header[len(MAGIC)] != VERSION: raise ValueError(f"Unsupported session log version {header[len(MAGIC)]}")
+        while True:
+            try:
+                head = f.read(RECORD.size)
+            except EOFError:
+                return # gzip member สุดท้ายไม่สมบูรณ์ (โปรแกรมตายระหว่างเขียน)
+            if len(head) < RECORD.size: return
+            t, topic_len, payload_len = RECORD.unpack(head)
+            try:
+                body = f.read(topic_len + payload_len)
+            except EOFError:
+                return
+            if len(body) < topic_len + payload_len: return
+            yield t, body[:topic_len].decode("utf-8"), body[topic_len:]
+
+def find_sessions(paths):
+    """ ไฟล์ .mzlog จาก path ที่เป็นไฟล์ หรือโฟลเดอร์ (เรียงชื่อ) """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                found.extend(os.path.join(root, name) for name in sorted(files) if name.endswith(".mzlog"))
+        else:
+            found.append(path)
+    return found
+
+# --- 3. Replay ---
+
+class ReplayClock:
+    """ นาฬิกาที่เดินตามเวลาใน log (ใช้แทน time.time ของ logic ที่มี timer) """
+    def __init__(self, t=0.0):
+        self.now = t
+
+    def __call__(self):
+        return self.now
+
+def replay(filename, handler, speed=0.0, clock=None, on_step=None):
+    """
+    ส่งทุก record ให้ handler(topic, payload)
+    speed <= 0 : เร็วที่สุด | 1.0 = เวลาจริง | 2.0 = เร็ว 2 เท่า
+    clock      : ReplayClock ที่จะถูกตั้งเป็นเวลาของ record ก่อนเรียก handler
+    on_step    : เรียกหลังทุก record (เช่น รอบของ control loop)
+    คืนค่า จำนวน record
+    """
+    count = 0
+    t0 = wall0 = None
+    for t, topic, payload in read_session(filename):
+        if t0 is None: t0, wall0 = t, time.perf_counter()
+        if speed > 0:
+            delay = (t - t0) / speed - (time.perf_counter() - wall0)
+            if delay > 0: time.sleep(delay)
+        if clock is not None: clock.now = t
+        handler(topic, payload)
+        if on_step is not None: on_step()
+        count += 1
+    return count
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# สคริปต์อยู่ที่ root ของ repo (ไม่ใช่ package) -> ให้ import ได้ตอนรัน pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,35 @@
+import bench_solver
+
+def row(ms, peak_kb=100.0, expanded=50, path=12, commands=8):
+    return {"ms": ms, "peak_kb": peak_kb, "expanded": expanded, "path": path, "commands": commands}
+
+def check(current, base, scale=1.0):
+    return bench_solver.compare({"bfs": current}, {"results": {"bfs": base}}, scale=scale)
+
+def test_same_result_passes():
+    assert check(row(10.0), row(10.0)) == ([], [])
+
+def test_4x_slower_fails():
+    problems, warnings = check(row(40.0), row(10.0))
+    assert len(problems) == 1 and "time" in problems[0]
+    assert warnings == []
+
+def test_moderate_slowdown_only_warns():
+    problems, warnings = check(row(18.0), row(10.0))
+    assert problems == [] and len(warnings) == 1
+
+def test_calibration_scale_absorbs_slow_machine():
+    assert check(row(40.0), row(10.0), scale=4.0) == ([], [])
+
+def test_tiny_cases_never_fail_on_timer_noise():
+    assert check(row(0.04), row(0.01)) == ([], []) # 4 เท่า แต่ต่างไม่ถึง MIN_DELTA_MS
+
+def test_memory_growth_fails_beyond_fail_band():
+    problems, warnings = check(row(10.0, peak_kb=400.0), row(10.0, peak_kb=100.0))
+    assert len(problems) == 1 and "peak memory" in problems[0]
+    problems, warnings = check(row(10.0, peak_kb=1.0 + bench_solver.MIN_DELTA_KB / 2), row(10.0, peak_kb=1.0)) # 9 เท่า แต่ไม่กี่ KB
+    assert problems == [] and warnings == []
+
+def test_deterministic_changes_fail():
+    problems, _ = check(row(10.0, expanded=51, path=13), row(10.0))
+    assert len(problems) == 2
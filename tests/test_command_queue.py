@@ -0,0 +1,127 @@
+import json
+import random
+from collections import deque
+
+import command_queue
+from command_queue import CommandStream, RobotQueue
+
+DT = 0.01
+
+class Link:
+    """ solver <-> robot ผ่านกล่องข้อความ 2 ทาง (ทำ packet หายได้) เดินเวลาเองทีละ DT """
+    def __init__(self, loss=0.0, seed=1, window=command_queue.WINDOW):
+        self.rng = random.Random(seed)
+        self.loss = loss
+        self.to_robot, self.to_solver = deque(), deque()
+        self.drop_to_robot = 0 # ทิ้ง N ข้อความถัดไปที่ส่งหาหุ่น (จำลองหายแน่ๆ)
+        self.stream = CommandStream(self._sender(self.to_robot, True), window)
+        self.robot = RobotQueue(self._sender(self.to_solver, False), window)
+        self.sent_log = []
+        self.executed = []
+        self.t = 0.0
+
+    def _sender(self, box, to_robot):
+        def send(payload):
+            if to_robot:
+                self.sent_log.append(json.loads(payload))
+                if self.drop_to_robot:
+                    self.drop_to_robot -= 1
+                    return
+            if self.rng.random() >= self.loss: box.append(payload)
+        return send
+
+    def deliver(self):
+        while self.to_robot: self.robot.on_message(self.to_robot.popleft())
+        while self.to_solver: self.stream.on_ack(self.to_solver.popleft(), now=self.t)
+
+    def step(self):
+        self.t += DT
+        self.deliver()
+        if self.robot.current is not None: self.robot.complete()
+        item = self.robot.next_command()
+        if item: self.executed.append(item[1])
+        self.stream.poll(now=self.t)
+
+    def run(self, until, limit=120.0):
+        while self.t < limit and not until(): self.step()
+
+def test_in_order_delivery_with_loss():
+    link = Link(loss=0.3)
+    commands = [f"FORWARD:{i}" for i in range(200)]
+    link.stream.extend(commands, now=0.0)
+    link.run(lambda: len(link.executed) >= len(commands))
+    assert link.executed == commands
+    assert link.stream.retransmits > 0
+
+def test_window_bounds_outstanding_commands():
+    link = Link()
+    link.stream.extend([f"FORWARD:{i}" for i in range(20)], now=0.0)
+    assert link.stream.in_flight() == command_queue.WINDOW
+    assert link.stream.pending() == 20
+    assert [m["seq"] for m in link.sent_log] == [1, 2, 3, 4]
+
+def test_duplicate_acks_are_idempotent():
+    link = Link()
+    link.stream.extend(["A", "B", "C", "D", "E", "F"], now=0.0)
+    link.deliver()
+    ack = json.dumps({"ack": 4, "done": 2, "free": 2})
+    link.stream.on_ack(ack, now=0.1)
+    state = (link.stream.acked, link.stream.done, sorted(link.stream.sent), link.stream.in_flight())
+    sent_before = len(link.sent_log)
+    for _ in range(5): link.stream.on_ack(ack, now=0.1)
+    assert (link.stream.acked, link.stream.done, sorted(link.stream.sent), link.stream.in_flight()) == state
+    assert len(link.sent_log) == sent_before
+    assert link.stream.retransmits == 0
+
+def test_robot_reacks_duplicates_without_executing_twice():
+    acks = []
+    robot = RobotQueue(acks.append)
+    msg = command_queue.encode({"seq": 1, "cmd": "LEFT"})
+    robot.on_message(msg); robot.on_message(msg)
+    robot.on_message(command_queue.encode({"seq": 3, "cmd": "RIGHT"})) # gap -> ไม่รับ
+    assert list(robot.buffer) == [(1, "LEFT")]
+    assert [json.loads(a)["ack"] for a in acks] == [1, 1, 1]
+
+def test_replace_during_retransmit():
+    link = Link()
+    link.drop_to_robot = 4 # window แรกหายหมด
+    link.stream.extend(["OLD1", "OLD2", "OLD3", "OLD4", "OLD5"], now=0.0)
+    link.t = command_queue.RETRY_TIMEOUT + DT
+    link.stream.poll(now=link.t)
+    assert link.stream.retransmits == 4 # กำลังส่งซ้ำ
+    first = link.stream.replace(["NEW1", "NEW2"], now=link.t)
+    assert first == 6
+    assert not link.stream.settled()
+    link.run(lambda: len(link.executed) >= 2 and link.stream.pending() == 0, limit=10.0)
+    assert link.executed == ["NEW1", "NEW2"] # คำสั่งเก่าที่ส่งซ้ำค้างอยู่ถูกทิ้งทั้งหมด
+
+def test_cancel_stops_current_command():
+    aborted = []
+    link = Link()
+    link.robot.on_abort = lambda: aborted.append(True)
+    link.stream.extend(["A", "B", "C"], now=0.0)
+    link.deliver()
+    assert link.robot.next_command() == (1, "A")
+    link.stream.cancel(stop=True, now=0.0)
+    link.deliver()
+    assert aborted == [True]
+    assert link.robot.current is None and not link.robot.buffer
+    assert link.stream.pending() == 0
+
+def test_settled_waits_for_cancel_ack():
+    link = Link()
+    assert link.stream.settled()
+    link.stream.extend(["A", "B"], now=0.0)
+    link.drop_to_robot = 1 # cancel ครั้งแรกหาย
+    link.stream.cancel(now=0.0)
+    assert not link.stream.settled()
+    link.deliver()
+    assert not link.stream.settled()
+    link.t = command_queue.RETRY_TIMEOUT + DT
+    link.stream.poll(now=link.t) # ส่ง cancel ซ้ำ
+    link.deliver()
+    assert link.stream.settled()
+    assert link.sent_log[-1]["cancel"] == 1
+
+def test_self_test_lossy_link():
+    assert command_queue.self_test(count=50, loss=0.3)
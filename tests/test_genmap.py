@@ -0,0 +1,25 @@
+import os
+
+import maze_format
+
+import genmap
+
+def test_save_skips_unchanged_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(genmap, "saved_text", {})
+    genmap.reset_map()
+    genmap.save_to_csv()
+    files = ["maze_grid.csv", "horizontal_walls.csv", "vertical_walls.csv", maze_format.FILE_MAZE_BIN]
+    for name in files: os.utime(name, ns=(0, 0))
+
+    genmap.save_to_csv() # ไม่มีอะไรเปลี่ยน -> ไม่เขียนไฟล์ไหนเลย
+    assert [os.stat(name).st_mtime_ns for name in files] == [0, 0, 0, 0]
+
+    genmap.horizontal_walls[1][2] = maze_format.WALL
+    genmap.save_to_csv()
+    assert os.stat("horizontal_walls.csv").st_mtime_ns != 0
+    assert os.stat(maze_format.FILE_MAZE_BIN).st_mtime_ns != 0
+    assert os.stat("vertical_walls.csv").st_mtime_ns == 0
+    with maze_format.MazeFile(maze_format.FILE_MAZE_BIN) as maze:
+        grid, h_walls, v_walls = maze.to_lists()
+    assert h_walls == genmap.horizontal_walls.tolist() and v_walls == genmap.vertical_walls.tolist()
@@ -0,0 +1,30 @@
+import numpy as np
+
+import lidar_filter
+from lidar_filter import LidarFilter
+
+def feed(f, front, count):
+    for value in front[:count]: f.process([[value, 2000.0, 2000.0, 2000.0]])
+
+def test_needs_nearly_full_window():
+    f = LidarFilter()
+    feed(f, [500.0] * 20, lidar_filter.CONFIRM_SAMPLES - 1)
+    assert not f.confident_below(0, 900)
+    feed(f, [500.0] * 20, 1)
+    assert f.confident_below(0, 900)
+
+def test_requires_margin_in_mm():
+    f = LidarFilter()
+    feed(f, [880.0] * 20, 20) # ค่าคงที่ (std = 0) แต่ต่ำกว่า threshold แค่ 20 mm
+    assert not f.confident_below(0, 900)
+    assert f.confident_below(0, 900, margin=10.0)
+
+def test_uses_per_sample_spread():
+    # ค่าเฉลี่ย ~800 แต่กระจาย +-150 -> standard error ผ่าน แต่ sample จำนวนมากเกิน threshold
+    rng = np.random.default_rng(0)
+    f = LidarFilter()
+    feed(f, list(800.0 + rng.normal(0.0, 150.0, 20)), 20)
+    assert not f.confident_below(0, 900)
+    quiet = LidarFilter()
+    feed(quiet, list(700.0 + rng.normal(0.0, 10.0, 20)), 20)
+    assert quiet.confident_below(0, 900)
@@ -0,0 +1,110 @@
+import numpy as np
+
+import genmap
+import maze_edit
+import maze_model
+from maze_model import WALL, OPEN
+
+W, H = 12, 9
+
+def snapshot(editor):
+    return tuple(plane.tobytes() for plane in editor.planes)
+
+def make_editor(log=None):
+    h_walls, v_walls = maze_model.reset_walls(W, H, add_border=True)
+    return maze_edit.MazeEditor(h_walls, v_walls, log)
+
+def run_edits(editor):
+    """ ทุกชนิดการแก้ -> คืนค่า snapshot ก่อน/หลังแต่ละครั้ง """
+    states = [snapshot(editor)]
+    editor.toggle(0, 3, 2); states.append(snapshot(editor))
+    editor.begin("Stroke")
+    for y in range(H): editor.set(1, y, 4, WALL)
+    editor.set(1, 2, 4, OPEN); editor.set(1, 2, 4, WALL) # ลากกลับทับ -> นับครั้งเดียว
+    editor.commit(); states.append(snapshot(editor))
+    editor.fill_rect(8, 6, 6, 2); states.append(snapshot(editor))
+    editor.clear_rect(0, 0, W - 1, H - 1); states.append(snapshot(editor))
+    h_walls, v_walls = genmap.generate_maze(W, H, "kruskal", 3)
+    editor.replace("kruskal", h_walls, v_walls); states.append(snapshot(editor))
+    clip = editor.copy(1, 1, 4, 3)
+    editor.paste(clip, 6, 5); states.append(snapshot(editor))
+    return states
+
+def test_apply_undo_redo_is_byte_identical():
+    editor = make_editor()
+    states = run_edits(editor)
+    assert len(editor.undo_stack) == len(states) - 1
+    for i in range(len(states) - 1, 0, -1):
+        editor.undo()
+        assert snapshot(editor) == states[i - 1]
+    assert editor.undo() is None
+    for i in range(1, len(states)):
+        editor.redo()
+        assert snapshot(editor) == states[i]
+    assert editor.redo() is None
+
+def test_new_edit_clears_redo():
+    editor = make_editor()
+    run_edits(editor)
+    editor.undo(); editor.undo()
+    editor.toggle(0, 1, 1)
+    assert editor.redo_stack == []
+
+def test_paste_copies_region_and_keeps_border():
+    editor = make_editor()
+    editor.clear_rect(0, 0, W - 1, H - 1)
+    editor.fill_rect(1, 1, 2, 2)
+    clip = editor.copy(0, 0, 3, 3)
+    editor.paste(clip, 4, 3)
+    h, v = editor.planes
+    assert (h[3:8, 4:8] == clip[0]).all() and (v[3:7, 4:9] == clip[1]).all()
+    inner = editor.copy(1, 1, 2, 2) # ขอบของ clip ที่ตกบนขอบแผนที่ต้องยังเป็นกำแพง
+    editor.clear_rect(0, 0, W - 1, H - 1)
+    open_clip = (np.full_like(inner[0], OPEN), np.full_like(inner[1], OPEN))
+    editor.paste(open_clip, W - 2, H - 2)
+    editor.paste(open_clip, -1, -1)
+    assert (h[0] == WALL).all() and (h[-1] == WALL).all()
+    assert (v[:, 0] == WALL).all() and (v[:, -1] == WALL).all()
+
+def test_log_replay_matches_editor(tmp_path):
+    path = str(tmp_path / "edit.mzedit")
+    log = maze_edit.OpLog(path)
+    editor = make_editor(log)
+    log.compact(editor.planes)
+    run_edits(editor)
+    editor.undo(); editor.undo(); editor.redo()
+    final = snapshot(editor)
+    log.close()
+    h_walls, v_walls, count = maze_edit.OpLog(path).load()
+    assert (h_walls.tobytes(), v_walls.tobytes()) == final
+    assert count > 0
+
+def test_reload_after_compact(tmp_path):
+    path = str(tmp_path / "edit.mzedit")
+    log = maze_edit.OpLog(path, compact_ops=10)
+    editor = make_editor(log)
+    log.compact(editor.planes)
+    for i in range(25): editor.toggle(0, 1 + i % (H - 1), i % W)
+    assert log.ops == 5 # compact ไปแล้ว 2 ครั้ง เหลือ 5 record ต่อท้าย base ใหม่
+    final = snapshot(editor)
+    log.close()
+    h_walls, v_walls, count = maze_edit.OpLog(path).load()
+    assert (h_walls.tobytes(), v_walls.tobytes()) == final and count == 5
+
+    log = maze_edit.OpLog(path)
+    log.compact((h_walls, v_walls)) # compact ตรงๆ -> ไม่มี record เหลือ
+    log.close()
+    h_again, v_again, count = maze_edit.OpLog(path).load()
+    assert (h_again.tobytes(), v_again.tobytes()) == final and count == 0
+
+def test_truncated_record_is_skipped(tmp_path):
+    path = str(tmp_path / "edit.mzedit")
+    log = maze_edit.OpLog(path)
+    editor = make_editor(log)
+    log.compact(editor.planes)
+    editor.toggle(1, 2, 3)
+    final = snapshot(editor)
+    log.close()
+    with open(path, "ab") as f: f.write(maze_edit.RECORD.pack(0, 4) + b"\x01\x00")
+    h_walls, v_walls, count = maze_edit.OpLog(path).load()
+    assert (h_walls.tobytes(), v_walls.tobytes()) == final and count == 1
@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+import pytest
+
+import maze_format
+import maze_model
+from maze_format import MazeFile
+
+WIDTH, HEIGHT = 7, 13 # ไม่ใช่ square และจำนวน bit ต่อ plane ไม่ลงตัว 8
+
+def random_walls(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    h_walls = rng.choice([maze_format.WALL, maze_format.OPEN], size=(height + 1, width)).astype(np.uint8)
+    v_walls = rng.choice([maze_format.WALL, maze_format.OPEN], size=(height, width + 1)).astype(np.uint8)
+    grid = rng.choice([maze_format.WALL, maze_format.OPEN], size=(height, width)).astype(np.uint8)
+    return h_walls, v_walls, grid
+
+@pytest.fixture
+def csv_files(tmp_path):
+    h_walls, v_walls, grid = random_walls(WIDTH, HEIGHT)
+    files = {name: str(tmp_path / f"{name}.csv") for name in ("grid", "h", "v")}
+    maze_format.write_csv(files["grid"], grid.tolist())
+    maze_format.write_csv(files["h"], h_walls.tolist())
+    maze_format.write_csv(files["v"], v_walls.tolist())
+    return files, (grid, h_walls, v_walls)
+
+def test_csv_bin_csv_round_trip(tmp_path, csv_files):
+    files, expected = csv_files
+    mzb = str(tmp_path / "maze.mzb")
+    maze_format.csv_to_bin(mzb, files["grid"], files["h"], files["v"])
+    out = {name: str(tmp_path / f"out_{name}.csv") for name in ("grid", "h", "v")}
+    maze_format.bin_to_csv(mzb, out["grid"], out["h"], out["v"])
+    for name in ("grid", "h", "v"):
+        with open(files[name]) as a, open(out[name]) as b:
+            assert a.read() == b.read()
+    with MazeFile(mzb) as maze:
+        assert (maze.width, maze.height) == (WIDTH, HEIGHT)
+        assert maze.h_wall(WIDTH - 1, HEIGHT) == expected[1][HEIGHT][WIDTH - 1]
+        assert maze.v_wall(WIDTH, HEIGHT - 1) == expected[2][HEIGHT - 1][WIDTH]
+
+def test_numpy_writer_matches_list_writer(tmp_path):
+    h_walls, v_walls, grid = random_walls(WIDTH, HEIGHT, seed=1)
+    a, b = str(tmp_path / "a.mzb"), str(tmp_path / "b.mzb")
+    maze_format.save_maze_bin(a, h_walls.tolist(), v_walls.tolist(), grid.tolist())
+    maze_model.save_maze_file(b, h_walls, v_walls, grid)
+    with open(a, "rb") as fa, open(b, "rb") as fb:
+        assert fa.read() == fb.read()
+    loaded = maze_model.load_maze_file(b)
+    for got, want in zip(loaded, (grid, h_walls, v_walls)):
+        assert got.shape == want.shape and (got == want).all()
+
+def test_pack_unpack_plane(tmp_path):
+    plane = random_walls(WIDTH, HEIGHT, seed=2)[0]
+    packed = maze_model.pack_plane(plane)
+    assert len(packed) == ((HEIGHT + 1) * WIDTH + 7) // 8
+    assert packed == maze_format.pack_plane(plane.tolist())
+    assert (maze_model.unpack_plane(packed, HEIGHT + 1, WIDTH) == plane).all()
+
+def test_failed_save_keeps_old_file(tmp_path, monkeypatch):
+    path, data = _saved(tmp_path)
+    h_walls, v_walls, grid = random_walls(WIDTH, HEIGHT, seed=4)
+    def interrupted(src, dst): raise KeyboardInterrupt
+    monkeypatch.setattr(maze_format.os, "replace", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        maze_model.save_maze_file(path, h_walls, v_walls, grid)
+    with open(path, "rb") as f: assert f.read() == data
+    assert os.listdir(tmp_path) == ["maze.mzb"] # ไม่เหลือ .tmp
+
+def _saved(tmp_path):
+    path = str(tmp_path / "maze.mzb")
+    h_walls, v_walls, grid = random_walls(WIDTH, HEIGHT, seed=3)
+    maze_model.save_maze_file(path, h_walls, v_walls, grid)
+    with open(path, "rb") as f: return path, bytearray(f.read())
+
+def test_bad_crc_rejected(tmp_path):
+    path, data = _saved(tmp_path)
+    data[-1] ^= 0xFF
+    with open(path, "wb") as f: f.write(data)
+    with pytest.raises(ValueError, match="checksum"):
+        MazeFile(path)
+    MazeFile(path, verify=False).close() # ปิด verify -> เปิดได้
+
+def test_bad_magic_rejected(tmp_path):
+    path, data = _saved(tmp_path)
+    data[:4] = b"NOPE"
+    with open(path, "wb") as f: f.write(data)
+    with pytest.raises(ValueError, match="not a maze file"):
+        maze_model.load_maze_file(path)
+
+@pytest.mark.parametrize("keep", [0, 10, None])
+def test_truncated_file_rejected(tmp_path, keep):
+    path, data = _saved(tmp_path)
+    with open(path, "wb") as f: f.write(data[:len(data) - 1 if keep is None else keep])
+    with pytest.raises(ValueError):
+        MazeFile(path)
+
+def test_close_releases_mmap(tmp_path):
+    path, _ = _saved(tmp_path)
+    maze = MazeFile(path)
+    plane = maze.plane("h")
+    plane.release()
+    maze.close()
+    assert maze._map.closed and maze._file.closed
+    with pytest.raises(ValueError):
+        maze.view[0]
+    os.replace(path, path + ".moved") # ไม่มี handle ค้าง
+    with maze_format.MazeFile(path + ".moved") as again:
+        assert again.width == WIDTH
+    assert again._map.closed
@@ -0,0 +1,35 @@
+import time
+
+import maze_sim
+from mqtt_transport import FakeBroker, MqttTransport
+
+def open_maze(width=4, height=4):
+    h_walls = [[1] * width] + [[2] * width for _ in range(height - 1)] + [[1] * width]
+    v_walls = [[1] + [2] * (width - 1) + [1] for _ in range(height)]
+    return h_walls, v_walls
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline: time.sleep(0.01)
+    return predicate()
+
+def test_commands_reach_sim_only_on_sim_thread():
+    broker = FakeBroker()
+    sim = maze_sim.MazeSim(*open_maze(), noise_mm=0.0, seed=1)
+    node_transport = MqttTransport("fake", client_factory=broker.client).start()
+    node = maze_sim.SimNode(sim, node_transport)
+    solver = MqttTransport("fake", client_factory=broker.client).start()
+    try:
+        assert wait_for(lambda: node_transport.is_connected() and solver.is_connected())
+        solver.publish(maze_sim.TOPIC_SOLVER_COMMAND, "FORWARD:2", qos=1)
+        solver.publish(maze_sim.TOPIC_ROBOT_COMMAND, '{"vx": 0, "vy": 0}', qos=1) # คำสั่ง mapper = ล้างคำสั่ง solver
+        solver.publish(maze_sim.TOPIC_SOLVER_COMMAND, "{bad json", qos=1)
+        solver.publish(maze_sim.TOPIC_SOLVER_COMMAND, "LEFT", qos=1)
+        assert wait_for(lambda: node.inbox.qsize() >= 4)
+        assert sim.idle() and not sim.moves # thread ของ transport ไม่แตะ sim
+        node.process_inbox()                 # ข้อความเสียไม่ทำให้ loop ตาย
+        assert list(sim.moves) == [("LEFT", 1)]
+        node.run(duration=2.0, speed=0)
+        assert sim.idle() and round(sim.yaw) % 360 == 90
+    finally:
+        solver.stop(); node_transport.stop()
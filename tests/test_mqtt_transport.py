@@ -0,0 +1,30 @@
+import time
+
+from mqtt_transport import FakeBroker, MqttTransport
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline: time.sleep(0.01)
+    return predicate()
+
+def test_prefix_isolates_instances():
+    broker = FakeBroker()
+    sim0 = MqttTransport("fake", client_factory=broker.client, prefix="sim0/")
+    sim1 = MqttTransport("fake", client_factory=broker.client, prefix="sim1/")
+    seen = {0: [], 1: []}
+    sim0.subscribe("robot/state", lambda msg: seen[0].append((msg.topic, msg.payload)))
+    sim1.subscribe("robot/state", lambda msg: seen[1].append((msg.topic, msg.payload)))
+    latency = []
+    sim1.on_latency = lambda direction, topic, ms: latency.append((direction, topic))
+    for transport in (sim0, sim1): transport.start()
+    try:
+        assert wait_for(lambda: sim0.is_connected() and sim1.is_connected())
+        sim1.publish("robot/state", "CHECK", qos=1)
+        assert wait_for(lambda: seen[1])
+        time.sleep(0.05)
+        assert [topic for topic, payload, qos in broker.published] == ["sim1/robot/state"]
+        assert seen == {0: [], 1: [("robot/state", b"CHECK")]} # handler เห็น topic แบบไม่มี prefix
+        assert wait_for(lambda: ("tx", "robot/state") in latency)
+        assert ("rx", "robot/state") in latency
+    finally:
+        sim0.stop(); sim1.stop()
@@ -0,0 +1,21 @@
+import session_log
+
+import maze_mapper
+
+T0 = 1_700_000_000.0 # เวลาใน log (คนละวันกับตอน replay)
+
+def test_replay_stamps_samples_with_record_time(tmp_path):
+    filename = str(tmp_path / "session.mzlog")
+    recorder = session_log.SessionRecorder(filename)
+    times = [T0 + i * 0.02 for i in range(10)]
+    for t in times:
+        recorder.record(maze_mapper.TOPIC_LIDAR_DATA, '{"F": 300, "L": 2000, "R": 2000, "B": 2000}', t=t)
+    recorder.record(maze_mapper.TOPIC_ANGLE_DATA, "180.0", t=times[-1] + 0.01)
+    recorder.close()
+
+    result = maze_mapper.replay_session(filename)
+    assert result["messages"] == 11
+    seq, rows = maze_mapper.lidar_ring.read_since(0)
+    assert [row[0] for row in rows] == times
+    assert maze_mapper.yaw_ring.latest()[0] == times[-1] + 0.01
+    assert maze_mapper.last_lidar_rx == times[-1]
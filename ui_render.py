@@ -0,0 +1,116 @@
+import numpy as np
+import maze_model
+try:
+    import pygame
+except ImportError: # replay / sim แบบ headless ไม่ต้องมี pygame
+    pygame = None
+
+"""
+UI RENDER CACHE (pygame)
+ใช้ร่วมกันใน maze_mapper / maze_solver / genmap -> ไม่ต้องวาดทั้งจอใหม่ทุกเฟรม
+
+- grid_layer : พื้น grid + label "x,y" ทุกช่อง วาดครั้งเดียวเป็น Surface
+- WallLayer  : Surface (โปร่งใส) ของกำแพง วาดใหม่เฉพาะตอน array กำแพงเปลี่ยน
+- TextCache  : เก็บ Surface ของข้อความที่ render แล้ว (ข้อความเดิม ไม่ต้อง render ใหม่)
+- DirtyZones : แบ่งจอเป็นโซน โซนไหน key (ทุกอย่างที่วาดในโซนนั้น) ไม่เปลี่ยน -> ไม่วาด / ไม่ส่งขึ้นจอ
+               แล้วส่งเฉพาะโซนที่เปลี่ยนด้วย pygame.display.update(rects)
+"""
+
+# --- 1. Static Layers ---
+
+def grid_layer(width, height, cell, bg, line=None, point=None, font=None, label_color=None, cell_color=None):
+    """
+    Surface ของพื้นตาราง (สี bg + เส้นช่อง + จุดกลาง + label) -> blit ทีเดียวต่อเฟรม
+    cell_color(x, y): สีพื้นแยกต่อช่อง (เช่น heatmap) -> สร้าง layer ใหม่เฉพาะตอนสีเปลี่ยน
+    """
+    surface = pygame.Surface((width * cell, height * cell))
+    surface.fill(bg)
+    for y in range(height):
+        for x in range(width):
+            if cell_color: pygame.draw.rect(surface, cell_color(x, y), (x * cell, y * cell, cell, cell))
+            if line: pygame.draw.rect(surface, line, (x * cell, y * cell, cell, cell), 1)
+            if point: pygame.draw.circle(surface, point, (x * cell + cell // 2, y * cell + cell // 2), 3)
+            if font: surface.blit(font.render(f"{x},{y}", True, label_color), (x * cell + 3, y * cell + 3))
+    return surface
+
+class WallLayer:
+    """ กำแพง (value) ทั้งแผนที่บน Surface โปร่งใส -> update() วาดใหม่เฉพาะตอน h/v เปลี่ยน """
+    def __init__(self, width, height, cell, color, thickness, value=maze_model.WALL):
+        self.cell = cell; self.color = color; self.thickness = thickness; self.value = value
+        self.surface = pygame.Surface((width * cell + thickness, height * cell + thickness), pygame.SRCALPHA)
+        self.offset = thickness // 2 # กำแพงขอบนอกสุดไม่โดนตัด
+        self.version = 0             # เพิ่มทุกครั้งที่วาดใหม่ (ใช้เป็น key ของ DirtyZones)
+        self._key = None
+
+    def update(self, h_walls, v_walls):
+        h = np.asarray(h_walls); v = np.asarray(v_walls)
+        key = (h.tobytes(), v.tobytes())
+        if key == self._key: return False
+        self._key = key
+        self.version += 1
+        c, o = self.cell, self.offset
+        self.surface.fill((0, 0, 0, 0))
+        h_segs, v_segs = maze_model.wall_segments(h, v, self.value)
+        for y, x in h_segs: pygame.draw.line(self.surface, self.color, (x*c + o, y*c + o), ((x+1)*c + o, y*c + o), self.thickness)
+        for y, x in v_segs: pygame.draw.line(self.surface, self.color, (x*c + o, y*c + o), (x*c + o, (y+1)*c + o), self.thickness)
+        return True
+
+    def draw(self, screen, origin=(0, 0)):
+        screen.blit(self.surface, (origin[0] - self.offset, origin[1] - self.offset))
+
+# --- 2. Text ---
+
+class TextCache:
+    def __init__(self, limit=512):
+        self.limit = limit
+        self._cache = {}
+
+    def render(self, font, text, color):
+        key = (id(font), text, color)
+        surface = self._cache.get(key)
+        if surface is None:
+            if len(self._cache) >= self.limit: self._cache.clear() # ข้อความที่เปลี่ยนตลอด (ตัวเลข sensor) ไม่ให้โตไม่จำกัด
+            surface = self._cache[key] = font.render(text, True, color)
+        return surface
+
+# --- 3. Dirty Zones ---
+
+class DirtyZones:
+    def __init__(self):
+        self._keys = {}
+        self._rects = []
+        self._screen = None
+        self.full = True # เฟรมแรก / หน้าต่างถูกบัง -> วาดพื้นหลังทั้งจอ + flip
+
+    def changed(self, name, rect, key):
+        """ True = ต้องวาดโซนนี้ใหม่ (และจะถูกส่งขึ้นจอตอน flush) """
+        if not self.full and self._keys.get(name) == key: return False
+        self._keys[name] = key
+        self._rects.append(pygame.Rect(rect))
+        return True
+
+    def begin(self, screen, name, rect, key, bg=None):
+        """ changed() + ตั้ง clip ให้วาดได้แค่ในโซน (และลบพื้นด้วย bg) """
+        screen.set_clip(None)
+        if not self.changed(name, rect, key): return False
+        screen.set_clip(rect)
+        if bg is not None: screen.fill(bg, rect)
+        self._screen = screen
+        return True
+
+    def invalidate(self):
+        self.full = True
+        self._keys.clear()
+
+    def handle_event(self, event):
+        if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED): self.invalidate()
+
+    def flush(self):
+        """ ส่งเฉพาะโซนที่เปลี่ยนขึ้นจอ คืนค่า จำนวนโซน """
+        count = len(self._rects)
+        if self._screen is not None: self._screen.set_clip(None)
+        if self.full: pygame.display.flip()
+        elif self._rects: pygame.display.update(self._rects)
+        self._rects = []
+        self.full = False
+        return count
@@ -0,0 +1,132 @@
+import json
+import math
+import struct
+
+"""
+WIRE FORMAT (Binary / JSON)
+payload ของ MQTT แบบ struct-pack แทน JSON string -> ลด CPU ตอน parse และขนาดบน Wi-Fi ของหุ่น
+
+Layout (little-endian) : version (u8) | type (u8) | ข้อมูล
+    LIDAR   : F, L, R, B                  float32 x4   (18 bytes, JSON ~50 bytes)
+    YAW     : yaw                         float32      (6 bytes, text ~5 bytes -> auto ใช้ text, ดู maze_mapper)
+    ARUCO   : grid_x, grid_y              float32 x2
+    COMMAND : vx, vy, wz, target_yaw      float32 x4   (NaN = ไม่มีค่า)
+
+- byte แรกของ JSON / ตัวเลขแบบ text เป็นตัวอักษรเสมอ (>= 0x09) -> แยกได้จาก byte แรก (version < 0x09)
+  ฝั่งรับจึง decode ได้ทั้ง 2 แบบเสมอ
+- ฝั่งส่งเลือกแบบต่อ topic ผ่าน WireNegotiator (ส่ง binary เฉพาะ topic ที่อีกฝั่งประกาศว่าอ่านได้)
+"""
+
+WIRE_VERSION = 1
+_MAX_BINARY_VERSION = 0x08
+
+MSG_LIDAR = 1
+MSG_YAW = 2
+MSG_ARUCO = 3
+MSG_COMMAND = 4
+
+_LIDAR = struct.Struct("<BB4f")
+_YAW = struct.Struct("<BBf")
+_ARUCO = struct.Struct("<BB2f")
+_COMMAND = struct.Struct("<BB4f")
+
+NAN = float("nan")
+MODES = ("json", "binary", "auto")
+
+# --- 1. Helper ---
+
+def is_binary(payload):
+    return len(payload) > 0 and payload[0] <= _MAX_BINARY_VERSION
+
+def _unpack(fmt, payload, msg_type):
+    if payload[0] != WIRE_VERSION: raise ValueError(f"Unsupported wire version {payload[0]}")
+    values = fmt.unpack(payload)
+    if values[1] != msg_type: raise ValueError(f"Expected message type {msg_type}, got {values[1]}")
+    return values[2:]
+
+def _json(payload):
+    return json.loads(payload.decode("utf-8") if isinstance(payload, (bytes, bytearray)) else payload)
+
+# --- 2. Encode / Decode ---
+
+def encode_lidar(f, l, r, b, binary=False):
+    if binary: return _LIDAR.pack(WIRE_VERSION, MSG_LIDAR, f, l, r, b)
+    return json.dumps({"F": f, "L": l, "R": r, "B": b})
+
+def decode_lidar(payload):
+    """ -> (F, L, R, B) (key ที่ไม่มีใน JSON = 2000 แบบเดิม) """
+    if is_binary(payload): return _unpack(_LIDAR, payload, MSG_LIDAR)
+    data = _json(payload)
+    return (float(data.get("F", 2000)), float(data.get("L", 2000)),
+            float(data.get("R", 2000)), float(data.get("B", 2000)))
+
+def encode_yaw(yaw, binary=False):
+    if binary: return _YAW.pack(WIRE_VERSION, MSG_YAW, yaw)
+    return str(yaw)
+
+def decode_yaw(payload):
+    if is_binary(payload): return _unpack(_YAW, payload, MSG_YAW)[0]
+    return float(payload)
+
+def encode_aruco(grid_x, grid_y, binary=False):
+    if binary: return _ARUCO.pack(WIRE_VERSION, MSG_ARUCO, grid_x, grid_y)
+    return json.dumps({"grid_x": grid_x, "grid_y": grid_y})
+
+def decode_aruco(payload):
+    """ -> (grid_x, grid_y) (NaN = ไม่มีค่า) """
+    if is_binary(payload): return _unpack(_ARUCO, payload, MSG_ARUCO)
+    data = _json(payload)
+    return float(data.get("grid_x", NAN)), float(data.get("grid_y", NAN))
+
+def encode_command(vx, vy, wz=None, target_yaw=None, binary=False):
+    """ None = ไม่ส่ง field นั้น (JSON ไม่มี key / binary เป็น NaN) """
+    if binary:
+        return _COMMAND.pack(WIRE_VERSION, MSG_COMMAND, vx, vy,
+                             NAN if wz is None else wz, NAN if target_yaw is None else target_yaw)
+    data = {"vx": vx, "vy": vy}
+    if wz is not None: data["wz"] = wz
+    if target_yaw is not None: data["target_yaw"] = target_yaw
+    return json.dumps(data)
+
+def decode_command(payload):
+    """ -> dict แบบเดียวกับ JSON เดิม (ไม่มี key ที่เป็น NaN) """
+    if not is_binary(payload): return _json(payload)
+    vx, vy, wz, target_yaw = _unpack(_COMMAND, payload, MSG_COMMAND)
+    data = {"vx": vx, "vy": vy}
+    if not math.isnan(wz): data["wz"] = wz
+    if not math.isnan(target_yaw): data["target_yaw"] = target_yaw
+    return data
+
+# --- 3. Negotiation (ต่อ topic) ---
+
+class WireNegotiator:
+    """
+    แต่ละฝั่ง publish capability บน topic กลาง: {"node": ชื่อ, "version": 1, "binary": [topic ที่ decode ได้]}
+    - mode "json"   : ส่ง JSON เสมอ
+    - mode "binary" : ส่ง binary เสมอ
+    - mode "auto"   : ส่ง binary เฉพาะ topic ที่อีกฝั่งประกาศไว้ (version ต้องตรงกัน)
+    """
+    def __init__(self, node, decodable_topics, mode="auto"):
+        if mode not in MODES: raise ValueError(f"Unknown wire mode '{mode}'")
+        self.node = node
+        self.decodable = list(decodable_topics)
+        self.mode = mode
+        self.peer_binary = set()
+        self.peers = set()
+
+    def caps_payload(self):
+        return json.dumps({"node": self.node, "version": WIRE_VERSION, "binary": self.decodable})
+
+    def on_caps(self, payload):
+        """ อัปเดตจาก capability ของอีกฝั่ง -> True ถ้าเพิ่งเจอ node นี้ครั้งแรก (ควรตอบ caps ของเรากลับ) """
+        data = _json(payload)
+        node = data.get("node")
+        if node == self.node: return False
+        if data.get("version") == WIRE_VERSION: self.peer_binary.update(data.get("binary", []))
+        is_new = node not in self.peers
+        self.peers.add(node)
+        return is_new
+
+    def binary_for(self, topic):
+        if self.mode == "auto": return topic in self.peer_binary
+        return self.mode == "binary"